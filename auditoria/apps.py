@@ -6,4 +6,5 @@ class AuditoriaConfig(AppConfig):
     name = 'auditoria'
 
     def ready(self):
-        import auditoria.signals # Carga las señales al iniciar
\ No newline at end of file
+        from auditoria.signals import preparar_auditoria
+        preparar_auditoria() # Plan de campos y señales, una sola vez al iniciar
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Retención de la auditoría: los eventos viejos salen de la tabla a archivos
+JSONL comprimidos, agrupados por mes (AAAA-MM/eventos-<primer id>-<último id>.jsonl.gz).
+
+Cada lote se escribe en un archivo temporal, se sincroniza a disco y recién
+ahí se renombra a su nombre final, antes de borrarlo de la base: un corte a
+mitad de escritura deja a lo sumo un .tmp que nadie lee. Si el proceso se
+corta entre el renombrado y el borrado, la próxima corrida vuelve a archivar
+esos eventos: la lectura descarta los ids repetidos.
+"""
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import EventoAuditoria
+
+AUDITORIA_RETENCION_DIAS = getattr(settings, 'AUDITORIA_RETENCION_DIAS', 365)
+AUDITORIA_DIRECTORIO_ARCHIVO = Path(getattr(settings, 'AUDITORIA_DIRECTORIO_ARCHIVO', settings.BASE_DIR / 'archivo_auditoria'))
+
+
+def _directorio_del_mes(periodo):
+    return AUDITORIA_DIRECTORIO_ARCHIVO / f"{periodo:%Y-%m}"
+
+
+def _escribir_lote(periodo, lineas):
+    """Un archivo por lote y mes, escrito de forma atómica (temporal + fsync + rename)."""
+    directorio = _directorio_del_mes(periodo)
+    directorio.mkdir(parents=True, exist_ok=True)
+    final = directorio / f"eventos-{lineas[0]['id']}-{lineas[-1]['id']}.jsonl.gz"
+    temporal = final.with_name(final.name + '.tmp')
+
+    datos = gzip.compress(''.join(json.dumps(linea, ensure_ascii=False) + '\n' for linea in lineas).encode('utf-8'))
+    with open(temporal, 'wb') as archivo:
+        archivo.write(datos)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, final)
+
+    # El rename también tiene que llegar a disco antes de borrar las filas
+    if hasattr(os, 'O_DIRECTORY'):
+        descriptor = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+def _a_linea(evento):
+    # Lo necesario para mostrarlo sin la base: usuario y modelo van por nombre además del id
+    return {
+        'id': evento.id,
+        'fecha': evento.fecha.isoformat(),
+        'usuario_id': evento.usuario_id,
+        'usuario': evento.usuario.username if evento.usuario else None,
+        'ip_origen': evento.ip_origen,
+        'modulo': evento.modulo,
+        'accion': evento.accion,
+        'content_type_id': evento.content_type_id,
+        'modelo': f"{evento.content_type.app_label}.{evento.content_type.model}",
+        'object_id': evento.object_id,
+        'estado_anterior': evento.estado_anterior,
+        'estado_nuevo': evento.estado_nuevo,
+        'cambios': evento.cambios,
+        'observacion': evento.observacion,
+    }
+
+
+def archivar_eventos(dias=AUDITORIA_RETENCION_DIAS, lote=2000):
+    """
+    Pasa al archivo los eventos con más de `dias` de antigüedad y los borra de
+    la tabla, de a `lote` por vez. Devuelve cuántos se archivaron.
+    """
+    corte = timezone.now() - timedelta(days=dias)
+    AUDITORIA_DIRECTORIO_ARCHIVO.mkdir(parents=True, exist_ok=True)
+    pendientes = (
+        EventoAuditoria.objects.filter(fecha__lt=corte)
+        .select_related('usuario', 'content_type')
+        .order_by('fecha', 'id')
+    )
+
+    archivados = 0
+    while True:
+        eventos = list(pendientes[:lote])
+        if not eventos:
+            break
+
+        por_mes = {}
+        for evento in eventos:
+            mes = timezone.localtime(evento.fecha).date().replace(day=1)
+            por_mes.setdefault(mes, []).append(_a_linea(evento))
+
+        for mes, lineas in por_mes.items():
+            _escribir_lote(mes, lineas)
+
+        EventoAuditoria.objects.filter(pk__in=[evento.pk for evento in eventos]).delete()
+        archivados += len(eventos)
+
+    return archivados
+
+
+def _meses(desde, hasta):
+    """Meses archivados entre las dos fechas, del más reciente al más viejo."""
+    meses = []
+    for directorio in AUDITORIA_DIRECTORIO_ARCHIVO.glob('????-??'):
+        try:
+            mes = datetime.strptime(directorio.name, '%Y-%m').date()
+        except ValueError:
+            continue
+        if (desde is None or mes >= desde.replace(day=1)) and (hasta is None or mes <= hasta):
+            meses.append(mes)
+    return sorted(meses, reverse=True)
+
+
+def _leer_eventos(ruta):
+    """
+    Renglones de un archivo del archivo. Si está dañado (gzip truncado o
+    corrupto) se devuelve lo que se pudo leer en vez de fallar toda la búsqueda.
+    """
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+            for renglon in archivo:
+                try:
+                    yield json.loads(renglon)
+                except json.JSONDecodeError:
+                    continue # último renglón cortado
+    except (EOFError, gzip.BadGzipFile, zlib.error, UnicodeDecodeError):
+        return
+
+
+def buscar_archivados(desde=None, hasta=None, usuario=None, accion=None, content_type=None, object_id=None, limite=None):
+    """
+    Busca en los archivos con los mismos filtros que el buscador de eventos
+    (fechas locales inclusive, ids de usuario y de content_type). Solo abre
+    los meses del rango y devuelve los eventos del más nuevo al más viejo.
+    """
+    encontrados = []
+    for mes in _meses(desde, hasta):
+        vistos, del_mes = set(), []
+        for ruta in sorted(_directorio_del_mes(mes).glob('eventos-*.jsonl.gz')):
+            for evento in _leer_eventos(ruta):
+                if evento['id'] in vistos:
+                    continue
+                vistos.add(evento['id'])
+
+                if usuario is not None and evento['usuario_id'] != usuario:
+                    continue
+                if accion and evento['accion'] != accion:
+                    continue
+                if content_type is not None and evento['content_type_id'] != content_type:
+                    continue
+                if object_id is not None and evento['object_id'] != str(object_id):
+                    continue
+
+                evento['fecha'] = datetime.fromisoformat(evento['fecha'])
+                dia = timezone.localtime(evento['fecha']).date()
+                if (desde and dia < desde) or (hasta and dia > hasta):
+                    continue
+                del_mes.append(evento)
+
+        del_mes.sort(key=lambda evento: (evento['fecha'], evento['id']), reverse=True)
+        encontrados.extend(del_mes)
+        if limite and len(encontrados) >= limite:
+            return encontrados[:limite]
+    return encontrados
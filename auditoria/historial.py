@@ -0,0 +1,79 @@
+"""
+Reconstrucción del estado de un objeto a partir de la auditoría.
+
+Con AUDITORIA_SOLO_CAMBIOS los UPDATE guardan solo `cambios` y cada tanto una
+foto completa en estado_nuevo (también la tienen los CREATE y todos los UPDATE
+sin ese modo). El estado en un momento dado es la última foto anterior más
+los cambios posteriores, aplicados en orden.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from .archivo import buscar_archivados
+from .models import EventoAuditoria
+from .signals import PLANES
+
+# Los AJUSTE manuales guardan un estado parcial (solo stock_actual, que no se reconstruye)
+ACCIONES_DE_ESTADO = ('CREATE', 'UPDATE', 'DELETE')
+
+
+def _aplicar(estado, accion, estado_nuevo, cambios):
+    if accion == 'DELETE':
+        return None
+    if estado_nuevo is not None:
+        return dict(estado_nuevo)
+    estado = dict(estado or {})
+    estado.update((campo, cambio['despues']) for campo, cambio in (cambios or {}).items())
+    return estado
+
+
+def reconstruir_estado(modelo, pk, momento=None):
+    """
+    Estado auditado (dict como estado_nuevo) del objeto `pk` de `modelo` en
+    `momento` (por defecto, ahora). None si no existía o ya estaba borrado.
+    No incluye los campos de CAMPOS_SIN_SEGUIMIENTO (stock, contadores de
+    caja): cambian por UPDATE sin eventos y el valor reconstruido sería falso.
+
+    Si la foto de partida ya se archivó, se completa con los archivos. Si no
+    hay ninguna foto (historia anterior al archivo perdida), el resultado
+    tiene solo los campos que cambiaron desde el primer evento disponible.
+    """
+    momento = momento or timezone.now()
+    content_type = ContentType.objects.get_for_model(modelo)
+    eventos = EventoAuditoria.objects.filter(
+        content_type=content_type, object_id=str(pk), accion__in=ACCIONES_DE_ESTADO, fecha__lte=momento,
+    )
+
+    # Una consulta para la foto más cercana y otra para lo que vino después
+    foto = (
+        eventos.filter(estado_nuevo__isnull=False)
+        .order_by('-fecha', '-id')
+        .values('fecha', 'id', 'accion', 'estado_nuevo')
+        .first()
+    )
+    estado = None
+    if foto:
+        estado = dict(foto['estado_nuevo'])
+        eventos = eventos.filter(fecha__gte=foto['fecha']).exclude(fecha=foto['fecha'], id__lte=foto['id'])
+    else:
+        # La foto (si hay) quedó en el archivo: se arranca desde ahí
+        archivados = buscar_archivados(
+            hasta=timezone.localtime(momento).date(), content_type=content_type.pk, object_id=pk,
+        )
+        desde_foto = []
+        for evento in archivados: # del más nuevo al más viejo
+            if evento['accion'] not in ACCIONES_DE_ESTADO or evento['fecha'] > momento:
+                continue
+            desde_foto.append(evento)
+            if evento['estado_nuevo'] is not None:
+                break
+        for evento in reversed(desde_foto):
+            estado = _aplicar(estado, evento['accion'], evento['estado_nuevo'], evento['cambios'])
+
+    for accion, estado_nuevo, cambios in eventos.order_by('fecha', 'id').values_list('accion', 'estado_nuevo', 'cambios'):
+        estado = _aplicar(estado, accion, estado_nuevo, cambios)
+
+    if estado is not None:
+        for campo in PLANES[modelo].sin_seguimiento:
+            estado.pop(campo, None)
+    return estado
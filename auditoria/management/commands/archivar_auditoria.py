@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from auditoria.archivo import archivar_eventos, AUDITORIA_RETENCION_DIAS, AUDITORIA_DIRECTORIO_ARCHIVO
+
+
+class Command(BaseCommand):
+    help = "Mueve los eventos de auditoría viejos a archivos JSONL comprimidos por mes y los borra de la tabla."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=AUDITORIA_RETENCION_DIAS, help="Antigüedad a partir de la cual se archiva")
+        parser.add_argument('--lote', type=int, default=2000, help="Eventos por vuelta: se escriben en su archivo y después se borran de la tabla")
+        parser.add_argument('--vacuum', action='store_true', help="Compacta la base al terminar (SQLite no achica el archivo al borrar)")
+
+    def handle(self, *args, **options):
+        archivados = archivar_eventos(dias=options['dias'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Eventos archivados: {archivados} en {AUDITORIA_DIRECTORIO_ARCHIVO}"))
+
+        if archivados and options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
@@ -23,5 +23,9 @@ class AuditMiddleware:
             ip = request.META.get('REMOTE_ADDR')
         _thread_locals.ip = ip
 
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        try:
+            return self.get_response(request)
+        finally:
+            # Lo que corra después en este hilo fuera de un request no hereda el usuario
+            _thread_locals.user = None
+            _thread_locals.ip = None
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventoauditoria',
+            name='fecha',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
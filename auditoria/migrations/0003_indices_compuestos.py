@@ -0,0 +1,40 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0002_alter_eventoauditoria_fecha'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='eventoauditoria',
+            name='auditoria_e_content_4e349f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='eventoauditoria',
+            name='auditoria_e_usuario_feee63_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='eventoauditoria',
+            name='auditoria_e_accion_739d33_idx',
+        ),
+        migrations.AddIndex(
+            model_name='eventoauditoria',
+            index=models.Index(fields=['content_type', 'object_id', 'fecha'], name='auditoria_objeto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoauditoria',
+            index=models.Index(fields=['usuario', 'fecha'], name='auditoria_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoauditoria',
+            index=models.Index(fields=['accion', 'fecha'], name='auditoria_accion_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+import weakref
+
+from django.db import transaction
+
+
+class _BasePendiente:
+    """
+    Valores de un save() cuya transacción sigue abierta. La única referencia
+    fuerte la tiene su callback de on_commit: si Django lo descarta (rollback
+    de la transacción o del savepoint) el objeto se libera y la instancia
+    vuelve a su base confirmada.
+    """
+
+    def __init__(self, instance, valores):
+        self.instance = instance
+        self.valores = valores
+
+    def confirmar(self):
+        self.instance._auditoria_base = self.valores
+        self.instance.__dict__.pop('_auditoria_pendiente', None)
+
+
+class AuditoriaMixin:
+    """
+    Para los modelos de MODELOS_AUDITADOS (auditoria/signals.py). Guarda en
+    la instancia los valores tal como vinieron de la base (_auditoria_base):
+    el diff del post_save se hace contra eso, sin volver a leer la fila antes
+    de cada save(). Se guardan crudos: la conversión a JSON solo se paga si la
+    instancia se llega a guardar.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._auditoria_base = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Copia los valores sin pasar por from_db en esta instancia: la base pasa a ser lo recién leído
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        campos = self._meta.concrete_fields if fields is None else [self._meta.get_field(nombre) for nombre in fields]
+        diferidos = self.get_deferred_fields()
+        leidos = {
+            campo.attname: getattr(self, campo.attname)
+            for campo in campos if campo.concrete and campo.attname not in diferidos
+        }
+        self._auditoria_base = {**self.base_auditoria(), **leidos}
+        self.__dict__.pop('_auditoria_pendiente', None)
+
+    def base_auditoria(self):
+        """Valores contra los que se compara el próximo save()."""
+        pendiente = self.__dict__.get('_auditoria_pendiente')
+        if pendiente is not None:
+            base = pendiente()
+            if base is not None:
+                return base.valores
+            del self._auditoria_pendiente  # Se revirtió: queda la base confirmada
+        return self.__dict__.get('_auditoria_base', {})
+
+    def fijar_base_auditoria(self, valores):
+        """
+        Lo recién guardado pasa a ser la base del próximo diff. Dentro de una
+        transacción queda pendiente hasta el commit (sin transacción,
+        on_commit lo confirma en el acto): si se revierte, la base sigue
+        siendo lo que la base de datos tiene de verdad.
+        """
+        pendiente = _BasePendiente(self, valores)
+        self._auditoria_pendiente = weakref.ref(pendiente)
+        transaction.on_commit(pendiente.confirmar)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -14,7 +15,7 @@ class EventoAuditoria(models.Model):
     ]
 
     # 1. Identificación
-    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+    fecha = models.DateTimeField(default=timezone.now, db_index=True) # default (no auto_now_add): los eventos diferidos conservan su hora
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     ip_origen = models.GenericIPAddressField(null=True, blank=True)
     modulo = models.CharField(max_length=50) # Ej: inventario, sales
@@ -37,10 +38,11 @@ class EventoAuditoria(models.Model):
 
     class Meta:
         ordering = ['-fecha']
+        # Compuestos con la fecha: la historia de un objeto o de un usuario sale ordenada del índice
         indexes = [
-            models.Index(fields=['content_type', 'object_id']), # Búsqueda rápida por entidad
-            models.Index(fields=['usuario']),
-            models.Index(fields=['accion']),
+            models.Index(fields=['content_type', 'object_id', 'fecha'], name='auditoria_objeto_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='auditoria_usuario_fecha_idx'),
+            models.Index(fields=['accion', 'fecha'], name='auditoria_accion_fecha_idx'),
         ]
 
     def __str__(self):
@@ -1,112 +1,309 @@
-from django.db import models # <--- ### NUEVO: Importar models base
+from django.db import models, transaction
 from django.db.models.signals import pre_save, post_save, post_delete
-from django.dispatch import receiver
-from django.forms.models import model_to_dict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.fields.files import FieldFile 
+from django.utils import timezone
 
 # Importamos modelos que queremos auditar
 from inventario.models import Producto, Venta, Compra, Asiento, CajaDiaria, Proveedor, Cliente
+from inventario.outbox import en_lote, encolar, manejador
+from .mixins import AuditoriaMixin
 from .models import EventoAuditoria
 from .middleware import get_current_user, get_current_ip
-import json
-from decimal import Decimal
-from datetime import date, datetime
+from datetime import date, datetime, time
+import threading
+import weakref
 
 # Modelos a auditar
 MODELOS_AUDITADOS = [Producto, Venta, Compra, Asiento, CajaDiaria, Proveedor, Cliente]
 
-# Helper para serializar CUALQUIER COSA a JSON
-class AuditEncoder(json.JSONEncoder):
-    def default(self, obj):
-        # 1. Decimales (dinero)
-        if isinstance(obj, Decimal):
-            return float(obj)
-        # 2. Fechas
-        if isinstance(obj, (date, datetime)):
-            return obj.isoformat()
-        # 3. Imágenes/Archivos
-        if isinstance(obj, FieldFile):
-            return obj.name if obj else None
-        # 4. ### NUEVO: Modelos relacionados (Categoria, Marca, etc)
-        if isinstance(obj, models.Model):
-            return str(obj) # Devuelve el nombre (ej: "Bebidas") en lugar del objeto error
-        # ---------------------------------------------------------
-        return super().default(obj)
-
-@receiver(pre_save)
+# Campos que se mueven con QuerySet.update() (sin señales): la auditoría no ve esos
+# cambios, así que no se pueden reconstruir desde los eventos (ver historial.py)
+CAMPOS_SIN_SEGUIMIENTO = {
+    Producto: ['stock_actual'],  # descontar_stock(), compras y ajustes manuales
+    CajaDiaria: [  # contadores del turno (ventas, registrar_asientos y ?verificar)
+        'total_efectivo', 'total_mercadopago', 'total_transferencia', 'total_unidades',
+        'debe_caja', 'haber_caja',
+    ],
+}
+
+# Tope de eventos en memoria por transacción (comandos largos): al llegar se escriben ahí mismo
+AUDITORIA_LOTE_MAXIMO = getattr(settings, 'AUDITORIA_LOTE_MAXIMO', 500)
+
+class BufferAuditoria:
+    """
+    Eventos de un tramo de transacción (entre savepoints) que se escriben con
+    un solo bulk_create en el on_commit. Si el tramo se revierte, Django
+    descarta el callback y los eventos no se graban nunca. El callback es
+    robust: si el bulk_create falla, la transacción ya está confirmada, así
+    que el error se registra en el log en vez de devolverle un 500 al usuario.
+    """
+
+    def __init__(self):
+        self.eventos = []
+
+    def agregar(self, evento):
+        self.eventos.append(evento)
+        if len(self.eventos) >= AUDITORIA_LOTE_MAXIMO:
+            # Se escriben dentro de la transacción: si después se revierte, se van con ella
+            self.vaciar()
+
+    def vaciar(self):
+        eventos, self.eventos = self.eventos, []
+        if eventos:
+            EventoAuditoria.objects.bulk_create(eventos)
+
+_local = threading.local()
+
+def _buffer_actual():
+    """
+    Buffer del tramo actual: uno por pila de savepoints abierta. La única
+    referencia fuerte a cada buffer es su callback de on_commit; acá se
+    guarda una débil. Cuando Django ejecuta el callback (commit) o lo
+    descarta (rollback de la transacción o del savepoint), el buffer se
+    libera y el próximo evento abre uno nuevo.
+    """
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = weakref.WeakValueDictionary()
+
+    clave = tuple(transaction.get_connection().savepoint_ids)
+    buffer = buffers.get(clave)
+    if buffer is None:
+        buffer = buffers[clave] = BufferAuditoria()
+        transaction.on_commit(buffer.vaciar, robust=True)
+    return buffer
+
+def registrar_evento(usuario, content_type, **campos):
+    """
+    Graba el evento. Dentro de un outbox.lote() (ej: una venta) lo deja en la
+    misma fila del outbox; dentro de cualquier otra transacción lo junta en
+    memoria hasta el commit. Sin transacción abierta se graba en el momento.
+    """
+    if en_lote():
+        encolar('auditoria', {
+            'fecha': timezone.now().isoformat(),
+            'usuario': usuario.pk if usuario else None,
+            'content_type': content_type.pk,
+            **campos,
+        })
+    elif transaction.get_connection().in_atomic_block:
+        _buffer_actual().agregar(EventoAuditoria(usuario=usuario, content_type=content_type, **campos))
+    else:
+        EventoAuditoria.objects.create(usuario=usuario, content_type=content_type, **campos)
+
+@manejador('auditoria')
+def escribir_eventos(eventos):
+    # Sin modificar los dicts: si el lote falla, el outbox los reintenta fila por fila
+    EventoAuditoria.objects.bulk_create([
+        EventoAuditoria(
+            fecha=datetime.fromisoformat(evento['fecha']),
+            usuario_id=evento['usuario'],
+            content_type_id=evento['content_type'],
+            **{clave: valor for clave, valor in evento.items() if clave not in ('fecha', 'usuario', 'content_type')}
+        )
+        for evento in eventos
+    ])
+
+# Los M2M cuestan una consulta por relación al leerlos: solo se auditan si se pide
+AUDITAR_M2M = getattr(settings, 'AUDITAR_M2M', False)
+
+# ==========================================
+# PLAN DE AUDITORÍA POR MODELO
+# ==========================================
+
+def _a_json(valor):
+    # Campos sin conversión propia (texto, números, booleanos, FK como id)
+    if valor is None or isinstance(valor, (str, int, float, bool, list, dict)):
+        return valor
+    return str(valor)
+
+def _decimal(valor):
+    return float(valor) if valor is not None else None
+
+def _fecha(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime, time)) else _a_json(valor)
+
+def _uuid(valor):
+    return str(valor) if valor is not None else None
+
+def _archivo(valor):
+    # Desde la base llega el nombre; desde la instancia, un FieldFile
+    return getattr(valor, 'name', valor) or None
+
+def _conversor(campo):
+    if isinstance(campo, models.FileField):
+        return _archivo
+    if isinstance(campo, models.DecimalField):
+        return _decimal
+    if isinstance(campo, (models.DateField, models.TimeField)): # DateTimeField hereda de DateField
+        return _fecha
+    if isinstance(campo, models.UUIDField):
+        return _uuid
+    return _a_json
+
+class PlanAuditoria:
+    """
+    Qué campos de un modelo se auditan y cómo pasa cada uno a JSON. Se arma una
+    vez al iniciar (ver preparar_auditoria) para no recorrer _meta ni pasar por
+    json.dumps/loads en cada save().
+    """
+
+    def __init__(self, modelo):
+        # Los mismos campos que tomaba model_to_dict: concretos y editables (FK por id)
+        self.campos = [
+            (campo.name, campo.attname, _conversor(campo))
+            for campo in modelo._meta.concrete_fields if campo.editable
+        ]
+        self.m2m = [campo.name for campo in modelo._meta.many_to_many] if AUDITAR_M2M else []
+        self.sin_seguimiento = set(CAMPOS_SIN_SEGUIMIENTO.get(modelo, []))
+
+    def valores(self, instance):
+        """Valores crudos por attname, sin los campos diferidos (no se leen solo para auditarlos)."""
+        diferidos = instance.get_deferred_fields()
+        return {
+            attname: getattr(instance, attname)
+            for _, attname, _ in self.campos if attname not in diferidos
+        }
+
+    def estado(self, valores):
+        return {nombre: convertir(valores[attname]) for nombre, attname, convertir in self.campos if attname in valores}
+
+    def m2m_actual(self, instance):
+        return {nombre: [str(obj) for obj in getattr(instance, nombre).all()] for nombre in self.m2m}
+
+    def comparar(self, anteriores, actuales):
+        """
+        Una sola pasada: arma el estado anterior, el nuevo y los cambios ya
+        listos para el JSONField. Se comparan los valores convertidos, así un
+        FieldFile y su nombre cuentan como iguales.
+        """
+        estado_anterior, estado_nuevo, cambios = {}, {}, {}
+        for nombre, attname, convertir in self.campos:
+            if attname not in actuales:
+                continue
+            nuevo = estado_nuevo[nombre] = convertir(actuales[attname])
+            anterior = estado_anterior[nombre] = convertir(anteriores[attname]) if attname in anteriores else None
+            if nuevo != anterior:
+                cambios[nombre] = {'antes': anterior, 'despues': nuevo}
+        return estado_anterior, estado_nuevo, cambios
+
+PLANES = {}
+
+# ==========================================
+# MODO SOLO CAMBIOS
+# ==========================================
+# Un UPDATE guarda solo `cambios`; cada AUDITORIA_FOTO_CADA cambios de un mismo
+# objeto se guarda además el estado completo en estado_nuevo (la "foto") para
+# que reconstruir no tenga que recorrer toda la historia.
+AUDITORIA_SOLO_CAMBIOS = getattr(settings, 'AUDITORIA_SOLO_CAMBIOS', False)
+AUDITORIA_FOTO_CADA = getattr(settings, 'AUDITORIA_FOTO_CADA', 20)
+
+def _toca_foto(content_type, pk):
+    """
+    True si este cambio completa AUDITORIA_FOTO_CADA desde la última foto
+    guardada del objeto (o si no hay ninguna en la base). Se cuenta sobre los
+    eventos grabados, con el índice (content_type, object_id, fecha): vale con
+    varios procesos y una foto revertida no cuenta. Los eventos de la
+    transacción en curso que siguen en el buffer o en el outbox todavía no se
+    ven, así que una transacción que cambia muchas veces el mismo objeto
+    puede pasarse del intervalo; la foto llega en el primer cambio posterior.
+    """
+    eventos = EventoAuditoria.objects.filter(content_type=content_type, object_id=str(pk))
+    foto = eventos.filter(estado_nuevo__isnull=False).order_by('-fecha', '-id').values_list('fecha', 'id').first()
+    if foto is None:
+        return True
+    fecha, foto_id = foto
+    sin_foto = eventos.filter(fecha__gte=fecha).exclude(fecha=fecha, id__lte=foto_id).count()
+    return sin_foto + 1 >= AUDITORIA_FOTO_CADA
+
 def auditar_pre_save(sender, instance, **kwargs):
-    if sender in MODELOS_AUDITADOS and instance.pk:
+    if instance.pk is None:
+        instance._auditoria_base = {}
+    elif not hasattr(instance, '_auditoria_base'):
+        # Instancia armada a mano con pk (no vino de la base): única vez que se lee la fila
         try:
-            old_instance = sender.objects.get(pk=instance.pk)
-            instance._old_state = model_to_dict(old_instance)
+            instance._auditoria_base = sender.objects.get(pk=instance.pk)._auditoria_base
         except sender.DoesNotExist:
-            instance._old_state = {}
-    else:
-        instance._old_state = {}
+            instance._auditoria_base = {}
 
-@receiver(post_save)
-def auditar_post_save(sender, instance, created, **kwargs):
-    if sender not in MODELOS_AUDITADOS:
-        return
+    if AUDITAR_M2M and instance.base_auditoria():
+        # Los M2M todavía tienen los valores anteriores: se guardan después del save()
+        instance._m2m_anterior = PLANES[sender].m2m_actual(instance)
 
+def auditar_post_save(sender, instance, created, **kwargs):
     usuario = get_current_user()
     ip = get_current_ip()
-    new_state = model_to_dict(instance)
-    
+    plan = PLANES[sender]
+    actuales = plan.valores(instance)
+    anteriores = instance.base_auditoria()
+    # Lo que se acaba de guardar pasa a ser el estado "anterior" del próximo save()
+    instance.fijar_base_auditoria(actuales)
+
+    estado_anterior, estado_nuevo, cambios = plan.comparar(anteriores, actuales)
+    if AUDITAR_M2M:
+        m2m_anterior = getattr(instance, '_m2m_anterior', {})
+        for nombre, nuevo in plan.m2m_actual(instance).items():
+            anterior = estado_anterior[nombre] = m2m_anterior.get(nombre)
+            estado_nuevo[nombre] = nuevo
+            if nuevo != anterior:
+                cambios[nombre] = {'antes': anterior, 'despues': nuevo}
+
+    content_type = ContentType.objects.get_for_model(instance)
     accion = 'CREATE' if created else 'UPDATE'
-    cambios = {}
-
-    if not created and hasattr(instance, '_old_state'):
-        for key, value in new_state.items():
-            old_value = instance._old_state.get(key)
-            
-            # Comparación robusta (maneja archivos y modelos)
-            val_comp = value.name if isinstance(value, FieldFile) else str(value) if isinstance(value, models.Model) else value
-            old_comp = old_value.name if isinstance(old_value, FieldFile) else str(old_value) if isinstance(old_value, models.Model) else old_value
-
-            if val_comp != old_comp:
-                cambios[key] = {'antes': old_value, 'despues': value}
-        
-        if not cambios:
-            return
-            
-    # Usamos el encoder superpoderoso
-    old_json = json.loads(json.dumps(instance._old_state, cls=AuditEncoder)) if not created else None
-    new_json = json.loads(json.dumps(new_state, cls=AuditEncoder))
-    cambios_json = json.loads(json.dumps(cambios, cls=AuditEncoder)) if cambios else None
-
-    EventoAuditoria.objects.create(
+    if created:
+        estado_anterior, cambios = None, None
+    elif not cambios:
+        return
+    elif AUDITORIA_SOLO_CAMBIOS:
+        # El estado anterior sale de reconstruir (historial.reconstruir_estado); el nuevo solo cada tanto
+        estado_anterior = None
+        if instance.get_deferred_fields() or not _toca_foto(content_type, instance.pk):
+            estado_nuevo = None
+
+    registrar_evento(
         usuario=usuario,
         ip_origen=ip,
         modulo=sender._meta.app_label,
         accion=accion,
-        content_type=ContentType.objects.get_for_model(instance),
+        content_type=content_type,
         object_id=str(instance.pk),
-        estado_anterior=old_json,
-        estado_nuevo=new_json,
-        cambios=cambios_json,
+        estado_anterior=estado_anterior,
+        estado_nuevo=estado_nuevo,
+        cambios=cambios,
         observacion=f"Movimiento automático en {sender.__name__}"
     )
 
-@receiver(post_delete)
 def auditar_delete(sender, instance, **kwargs):
-    if sender not in MODELOS_AUDITADOS:
-        return
-
     usuario = get_current_user()
     ip = get_current_ip()
-    old_state = model_to_dict(instance)
-    
-    old_json = json.loads(json.dumps(old_state, cls=AuditEncoder))
+    plan = PLANES[sender]
+    estado_anterior = plan.estado(plan.valores(instance)) # los M2M ya se borraron junto con la fila
 
-    EventoAuditoria.objects.create(
+    registrar_evento(
         usuario=usuario,
         ip_origen=ip,
         modulo=sender._meta.app_label,
         accion='DELETE',
         content_type=ContentType.objects.get_for_model(instance),
         object_id=str(instance.pk),
-        estado_anterior=old_json,
+        estado_anterior=estado_anterior,
         observacion=f"Registro eliminado: {str(instance)}"
-    )
\ No newline at end of file
+    )
+
+def preparar_auditoria():
+    """
+    Arma el plan de cada modelo auditado y conecta los receptores solo para
+    ellos (no se ejecutan en cada save() del proyecto). Se llama desde
+    AuditoriaConfig.ready().
+    """
+    for modelo in MODELOS_AUDITADOS:
+        if modelo in PLANES:
+            continue
+        if not issubclass(modelo, AuditoriaMixin):
+            raise ImproperlyConfigured(f"{modelo.__name__} se audita pero no hereda de AuditoriaMixin")
+        PLANES[modelo] = PlanAuditoria(modelo)
+        pre_save.connect(auditar_pre_save, sender=modelo, dispatch_uid=f'auditoria_pre_{modelo.__name__}')
+        post_save.connect(auditar_post_save, sender=modelo, dispatch_uid=f'auditoria_post_{modelo.__name__}')
+        post_delete.connect(auditar_delete, sender=modelo, dispatch_uid=f'auditoria_delete_{modelo.__name__}')
@@ -1,3 +1,487 @@
-from django.test import TestCase
+import gzip
+import json
+import shutil
+import uuid
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.query import QuerySet
+from django.forms.models import model_to_dict
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventario.models import Producto, Categoria, Cliente, Venta, Asiento, CajaDiaria
+from . import archivo, signals
+from .historial import reconstruir_estado
+from .models import EventoAuditoria
+
+
+# TransactionTestCase: los eventos se escriben en el on_commit de cada transacción
+@mock.patch.object(signals, 'AUDITORIA_FOTO_CADA', 3)
+@mock.patch.object(signals, 'AUDITORIA_SOLO_CAMBIOS', True)
+class ReconstruirEstadoSoloCambiosTests(TransactionTestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Cuaderno', marca='Rivadavia', precio=Decimal('10'), stock_actual=5)
+        self.content_type = ContentType.objects.get_for_model(Producto)
+
+    def cambiar_precio(self, precio):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.precio = precio
+        producto.save()
+        return timezone.now()
+
+    def eventos(self):
+        return EventoAuditoria.objects.filter(content_type=self.content_type, object_id=str(self.producto.pk)).order_by('id')
+
+    def test_solo_cambios_con_una_foto_cada_tanto(self):
+        for precio in range(11, 18):
+            self.cambiar_precio(precio)
+
+        updates = self.eventos().filter(accion='UPDATE')
+        self.assertEqual(updates.count(), 7)
+        self.assertFalse(updates.filter(estado_anterior__isnull=False).exists())
+        # El CREATE es la primera foto; después una cada 3 cambios
+        self.assertEqual([e.estado_nuevo is not None for e in self.eventos()], [True, False, False, True, False, False, True, False])
+
+    def test_reconstruye_el_estado_en_cada_momento(self):
+        antes_de_crear = self.producto.fecha_creacion - timedelta(seconds=1)
+        momentos = [(self.cambiar_precio(precio), precio) for precio in range(11, 19)]
+
+        for momento, precio in momentos:
+            estado = reconstruir_estado(Producto, self.producto.pk, momento)
+            self.assertEqual((estado['precio'], estado['nombre']), (float(precio), 'Cuaderno'))
+        self.assertIsNone(reconstruir_estado(Producto, self.producto.pk, antes_de_crear))
+
+    def test_no_incluye_los_campos_que_se_mueven_con_update(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock_actual=1)
+        self.cambiar_precio(20)
+        self.assertNotIn('stock_actual', reconstruir_estado(Producto, self.producto.pk))
+
+    def test_borrado_es_none(self):
+        self.cambiar_precio(11)
+        Producto.objects.get(pk=self.producto.pk).delete()
+        self.assertIsNone(reconstruir_estado(Producto, self.producto.pk))
+
+    def test_una_foto_revertida_no_cuenta(self):
+        self.cambiar_precio(11)
+        self.cambiar_precio(12)
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.cambiar_precio(13)  # le tocaba la foto
+            raise ValueError
+        self.cambiar_precio(14)
+
+        self.assertIsNotNone(self.eventos().last().estado_nuevo)
+        self.assertEqual(reconstruir_estado(Producto, self.producto.pk)['precio'], 14.0)
+
+    def test_completa_con_la_foto_archivada(self):
+        for precio in range(11, 16):
+            self.cambiar_precio(precio)
+        directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directorio)
+
+        # Todo al archivo menos el último cambio (sin foto): la foto de partida hay que leerla de ahí
+        ultimo = self.eventos().last()
+        self.assertIsNone(ultimo.estado_nuevo)
+        self.eventos().exclude(pk=ultimo.pk).update(fecha=timezone.now() - timedelta(days=400))
+        with mock.patch.object(archivo, 'AUDITORIA_DIRECTORIO_ARCHIVO', directorio):
+            self.assertEqual(archivo.archivar_eventos(dias=365), 5)
+            estado = reconstruir_estado(Producto, self.producto.pk)
+
+        self.assertEqual(list(self.eventos()), [ultimo])
+        self.assertEqual((estado['precio'], estado['marca']), (15.0, 'Rivadavia'))
+
+
+class BufferAuditoriaTests(TransactionTestCase):
+    def setUp(self):
+        self.content_type = ContentType.objects.get_for_model(Producto)
+
+    def eventos(self):
+        return EventoAuditoria.objects.filter(content_type=self.content_type)
+
+    def crear(self, nombre):
+        return Producto.objects.create(nombre=nombre, precio=Decimal('10'))
+
+    def test_savepoints_confirmados_se_escriben_al_commit(self):
+        with transaction.atomic():
+            producto = self.crear('Cuaderno')
+            with transaction.atomic():
+                producto.precio = Decimal('12')
+                producto.save()
+                with transaction.atomic():
+                    self.crear('Regla')
+            self.assertFalse(self.eventos().exists())  # todo en memoria hasta el commit
+
+        self.assertEqual(sorted(self.eventos().values_list('accion', flat=True)), ['CREATE', 'CREATE', 'UPDATE'])
+
+    def test_savepoint_revertido_descarta_sus_eventos(self):
+        with transaction.atomic():
+            self.crear('Cuaderno')
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.crear('Regla')
+                raise ValueError
+            self.crear('Goma')
+
+        self.assertEqual(
+            sorted(estado['nombre'] for estado in self.eventos().values_list('estado_nuevo', flat=True)),
+            ['Cuaderno', 'Goma'],
+        )
+
+    @mock.patch.object(signals, 'AUDITORIA_LOTE_MAXIMO', 2)
+    def test_al_llegar_al_tope_se_escriben_dentro_de_la_transaccion(self):
+        with transaction.atomic():
+            for nombre in ('A', 'B', 'C'):
+                self.crear(nombre)
+            self.assertEqual(self.eventos().count(), 2)
+        self.assertEqual(self.eventos().count(), 3)
+
+        # Escritos antes del commit pero dentro de la transacción: si se revierte se van con ella
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.crear('D')
+            self.crear('E')
+            raise ValueError
+        self.assertEqual(self.eventos().count(), 3)
+
+    def test_si_falla_la_escritura_la_transaccion_igual_queda_confirmada(self):
+        with mock.patch.object(EventoAuditoria.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertLogs('django.db.backends.base', 'ERROR'):
+            with transaction.atomic():
+                self.crear('Cuaderno')
+
+        self.assertTrue(Producto.objects.filter(nombre='Cuaderno').exists())
+        self.assertFalse(self.eventos().exists())
+
+    def test_m2m_solo_si_se_pide(self):
+        categoria = Categoria.objects.create(nombre='Librería')
+        producto = self.crear('Cuaderno')
+        producto.categorias.add(categoria)
+
+        producto.precio = Decimal('11')
+        producto.save()
+        with mock.patch.object(signals, 'AUDITAR_M2M', True), \
+                mock.patch.dict(signals.PLANES, {Producto: signals.PlanAuditoria(Producto)}):
+            producto.precio = Decimal('12')
+            producto.save()
+
+        sin_m2m, con_m2m = self.eventos().filter(accion='UPDATE').order_by('id').values_list('estado_nuevo', flat=True)
+        self.assertNotIn('categorias', sin_m2m)
+        self.assertEqual(con_m2m['categorias'], ['Librería'])
+
+
+class BaseAuditoriaTests(TransactionTestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Cuaderno', precio=Decimal('10'))
+        self.content_type = ContentType.objects.get_for_model(Producto)
+
+    def cambios(self):
+        return list(
+            EventoAuditoria.objects.filter(content_type=self.content_type, accion='UPDATE')
+            .order_by('id').values_list('cambios', flat=True)
+        )
+
+    def test_dos_saves_en_la_misma_transaccion(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        with transaction.atomic():
+            producto.precio = Decimal('11')
+            producto.save()
+            producto.precio = Decimal('12')
+            producto.save()
+
+        self.assertEqual([c['precio'] for c in self.cambios()], [
+            {'antes': 10.0, 'despues': 11.0},
+            {'antes': 11.0, 'despues': 12.0},  # contra el primer save, no contra lo leído
+        ])
+
+    def test_save_en_un_savepoint_revertido(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        with transaction.atomic():
+            with self.assertRaises(ValueError), transaction.atomic():
+                producto.precio = Decimal('11')
+                producto.save()
+                raise ValueError
+            producto.precio = Decimal('12')
+            producto.save()
+
+        # El primer save no existió: el diff es contra lo que la base tiene de verdad
+        self.assertEqual([c['precio'] for c in self.cambios()], [{'antes': 10.0, 'despues': 12.0}])
+
+    def test_instancia_armada_a_mano_lee_la_fila_una_vez(self):
+        producto = Producto(pk=self.producto.pk, nombre='Cuaderno', precio=Decimal('15'),
+                            fecha_creacion=self.producto.fecha_creacion)
+        with CaptureQueriesContext(connection) as consultas:
+            producto.save()
+
+        selects = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(self.cambios(), [{'precio': {'antes': 10.0, 'despues': 15.0}}])
+
+    def test_una_consulta_menos_que_leyendo_la_fila(self):
+        leido = Producto.objects.get(pk=self.producto.pk)
+        a_mano = Producto(pk=self.producto.pk, nombre='Cuaderno', precio=Decimal('10'),
+                          fecha_creacion=self.producto.fecha_creacion)
+
+        leido.precio = Decimal('11')
+        with self.assertNumQueries(2):  # UPDATE y el INSERT del evento
+            leido.save()
+        a_mano.precio = Decimal('12')
+        with self.assertNumQueries(3):  # además el SELECT de la fila
+            a_mano.save()
+
+
+class _EncoderAnterior(json.JSONEncoder):
+    # El AuditEncoder de antes del plan precompilado (más los UUID, que no manejaba)
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        if isinstance(obj, date):
+            return obj.isoformat()
+        if isinstance(obj, FieldFile):
+            return obj.name if obj else None
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        return super().default(obj)
+
+
+def _por_introspeccion(instance):
+    """Estado como se armaba en cada save(): model_to_dict y la vuelta por JSON (sin M2M)."""
+    return model_to_dict(instance, exclude=[campo.name for campo in instance._meta.many_to_many])
+
+
+def _a_json(valor):
+    return json.loads(json.dumps(valor, cls=_EncoderAnterior))
+
+
+class PlanAuditoriaTests(TestCase):
+    def setUp(self):
+        self.caja = CajaDiaria.objects.create(saldo_inicial=Decimal('100'))
+        self.cliente = Cliente.objects.create(nombre='Ana', apellido='Paz', fecha_nacimiento=date(1990, 5, 2))
+        self.venta = Venta.objects.create(cliente=self.cliente, caja=self.caja, total=Decimal('150.50'),
+                                          monto_efectivo=Decimal('200'), vuelto=Decimal('49.50'),
+                                          clave_idempotencia=uuid.uuid4())
+        self.asiento = Asiento.objects.create(fecha=date(2025, 3, 1), descripcion='Apertura', caja=self.caja)
+
+    def test_mismo_estado_que_la_introspeccion(self):
+        for objeto in (self.venta, self.asiento, self.cliente, self.caja):
+            leido = type(objeto).objects.get(pk=objeto.pk)
+            plan = signals.PLANES[type(objeto)]
+            with self.subTest(modelo=type(objeto).__name__):
+                self.assertEqual(plan.estado(plan.valores(leido)), _a_json(_por_introspeccion(leido)))
+
+        estado = signals.PLANES[Venta].estado(signals.PLANES[Venta].valores(self.venta))
+        self.assertNotIn('fecha', estado)  # no editable: model_to_dict tampoco la tomaba
+        self.assertEqual((estado['cliente'], estado['caja'], estado['total']), (self.cliente.pk, self.caja.pk, 150.5))
+
+    def test_mismos_cambios_que_la_introspeccion(self):
+        otro = Cliente.objects.create(nombre='Luis', apellido='Sosa')
+        venta = Venta.objects.get(pk=self.venta.pk)
+        antes = _por_introspeccion(venta)
+        venta.cliente = otro
+        venta.monto_efectivo = Decimal('300')
+        venta.clave_idempotencia = uuid.uuid4()
+        despues = _por_introspeccion(venta)
+
+        plan = signals.PLANES[Venta]
+        estado_anterior, estado_nuevo, cambios = plan.comparar(venta.base_auditoria(), plan.valores(venta))
+
+        esperados = {
+            campo: {'antes': antes[campo], 'despues': valor}
+            for campo, valor in despues.items() if antes[campo] != valor
+        }
+        self.assertEqual(cambios, _a_json(esperados))
+        self.assertEqual(set(cambios), {'cliente', 'monto_efectivo', 'clave_idempotencia'})
+        self.assertEqual((estado_anterior, estado_nuevo), (_a_json(antes), _a_json(despues)))
+
+
+@mock.patch('auditoria.views.EVENTOS_POR_PAGINA', 2)
+class EventosAuditoriaTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.luis = User.objects.create_user('luis', password='x')
+        self.client.force_login(self.ana)
+        self.producto = ContentType.objects.get_for_model(Producto)
+        self.cliente = ContentType.objects.get_for_model(Cliente)
+        base = timezone.make_aware(datetime(2025, 3, 10, 12))
+        self.eventos = [
+            EventoAuditoria.objects.create(fecha=base + timedelta(days=dias), usuario=usuario, accion=accion,
+                                           content_type=ct, object_id=objeto, modulo='inventario')
+            for dias, usuario, accion, ct, objeto in [
+                (0, self.ana, 'CREATE', self.producto, '1'),
+                (1, self.luis, 'UPDATE', self.producto, '1'),
+                (1, self.ana, 'UPDATE', self.producto, '2'),  # mismo instante: desempata el id
+                (1, self.ana, 'UPDATE', self.cliente, '1'),
+                (5, self.luis, 'DELETE', self.producto, '1'),
+            ]
+        ]
+
+    def ids(self, **filtros):
+        """Ids de todas las páginas siguiendo el cursor."""
+        ids, url = [], reverse('auditoria_eventos')
+        respuesta = self.client.get(url, filtros)
+        while True:
+            ids.extend(e.pk for e in respuesta.context['eventos'])
+            if not respuesta.context['pagina_siguiente']:
+                return ids
+            respuesta = self.client.get(f"{url}?{respuesta.context['pagina_siguiente']}")
+
+    def esperados(self, *indices):
+        return [self.eventos[i].pk for i in indices]
+
+    def test_el_cursor_recorre_todo_de_lo_mas_nuevo_a_lo_mas_viejo(self):
+        self.assertEqual(self.ids(), self.esperados(4, 3, 2, 1, 0))
+
+    def test_filtros(self):
+        self.assertEqual(self.ids(usuario=self.luis.pk), self.esperados(4, 1))
+        self.assertEqual(self.ids(accion='UPDATE'), self.esperados(3, 2, 1))
+        self.assertEqual(self.ids(modelo=self.producto.pk, objeto='1'), self.esperados(4, 1, 0))
+        self.assertEqual(self.ids(objeto='1'), self.esperados(4, 3, 2, 1, 0))  # sin modelo el objeto no filtra
+        self.assertEqual(self.ids(fecha_inicio='2025-03-11', fecha_fin='2025-03-11'), self.esperados(3, 2, 1))
+
+    def test_cursor_o_fechas_invalidas_no_rompen(self):
+        respuesta = self.client.get(reverse('auditoria_eventos'), {'cursor': 'basura'})
+        self.assertEqual([e.pk for e in respuesta.context['eventos']], self.esperados(4, 3))
+        self.assertContains(respuesta, 'El enlace de paginación no es válido')
+
+        respuesta = self.client.get(reverse('auditoria_eventos'), {'fecha_inicio': '2025-13-01'})
+        self.assertEqual(respuesta.context['filtros']['fecha_inicio'], '')
+
+
+class ArchivoAuditoriaTests(TestCase):
+    def setUp(self):
+        self.directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directorio)
+        parche = mock.patch.object(archivo, 'AUDITORIA_DIRECTORIO_ARCHIVO', self.directorio)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        self.ana = User.objects.create_user('ana', password='x')
+        self.luis = User.objects.create_user('luis', password='x')
+        self.client.force_login(self.ana)
+        self.producto = ContentType.objects.get_for_model(Producto)
+        self.cliente = ContentType.objects.get_for_model(Cliente)
+        self.eventos = [
+            EventoAuditoria.objects.create(fecha=fecha, usuario=usuario, accion=accion,
+                                           content_type=ct, object_id=objeto, modulo='inventario')
+            for fecha, usuario, accion, ct, objeto in [
+                (timezone.make_aware(datetime(2025, 1, 10, 12)), self.ana, 'CREATE', self.producto, '1'),
+                (timezone.make_aware(datetime(2025, 1, 20, 12)), self.luis, 'UPDATE', self.producto, '1'),
+                (timezone.make_aware(datetime(2025, 2, 5, 12)), self.ana, 'UPDATE', self.cliente, '1'),
+                (timezone.make_aware(datetime(2025, 3, 10, 12)), self.ana, 'UPDATE', self.producto, '2'),
+                (timezone.make_aware(datetime(2025, 3, 11, 12)), self.luis, 'DELETE', self.producto, '1'),
+                (timezone.now() - timedelta(days=1), self.ana, 'UPDATE', self.producto, '1'),  # queda en la base
+            ]
+        ]
+
+    def esperados(self, *indices):
+        return [self.eventos[i].pk for i in indices]
+
+    def archivos(self):
+        """{mes: [nombres]} de lo que quedó en el directorio."""
+        return {
+            directorio.name: sorted(ruta.name for ruta in directorio.iterdir())
+            for directorio in sorted(self.directorio.iterdir())
+        }
+
+    def ids_archivados(self, **filtros):
+        return [evento['id'] for evento in archivo.buscar_archivados(**filtros)]
+
+    def test_archiva_por_lotes_hasta_el_corte_y_borra_de_la_base(self):
+        # Corte a fin de enero: los de febrero en adelante esperan a la próxima corrida
+        dias = (timezone.now() - timezone.make_aware(datetime(2025, 2, 1))).days
+        self.assertEqual(archivo.archivar_eventos(dias=dias, lote=2), 2)
+        self.assertEqual(list(EventoAuditoria.objects.order_by('id').values_list('id', flat=True)), self.esperados(2, 3, 4, 5))
+
+        self.assertEqual(archivo.archivar_eventos(dias=365, lote=2), 3)
+        self.assertEqual(list(EventoAuditoria.objects.values_list('id', flat=True)), self.esperados(5))
+
+        # Un archivo por lote y mes: el segundo lote (febrero y marzo) se parte en dos
+        e = self.esperados(0, 1, 2, 3, 4)
+        self.assertEqual(self.archivos(), {
+            '2025-01': [f'eventos-{e[0]}-{e[1]}.jsonl.gz'],
+            '2025-02': [f'eventos-{e[2]}-{e[2]}.jsonl.gz'],
+            '2025-03': sorted([f'eventos-{e[3]}-{e[3]}.jsonl.gz', f'eventos-{e[4]}-{e[4]}.jsonl.gz']),
+        })
+        self.assertEqual(list(self.directorio.rglob('*.tmp')), [])
+        self.assertEqual(self.ids_archivados(), self.esperados(4, 3, 2, 1, 0))
+
+    def test_un_archivo_por_mes(self):
+        self.assertEqual(archivo.archivar_eventos(dias=365), 5)
+
+        archivos = self.archivos()
+        self.assertEqual(sorted(archivos), ['2025-01', '2025-02', '2025-03'])
+        self.assertTrue(all(len(nombres) == 1 for nombres in archivos.values()))
+        self.assertEqual(list(self.directorio.rglob('*.tmp')), [])
+        with gzip.open(next((self.directorio / '2025-01').iterdir()), 'rt', encoding='utf-8') as gz:
+            lineas = [json.loads(renglon) for renglon in gz]
+        self.assertEqual([(linea['id'], linea['usuario'], linea['modelo']) for linea in lineas], [
+            (self.eventos[0].pk, 'ana', 'inventario.producto'),
+            (self.eventos[1].pk, 'luis', 'inventario.producto'),
+        ])
+
+    def test_rearchivar_el_mismo_rango_no_duplica(self):
+        # Corte entre el renombrado y el borrado: el primer evento queda en un archivo y en la base
+        with mock.patch.object(QuerySet, 'delete', side_effect=RuntimeError('corte')):
+            with self.assertRaises(RuntimeError):
+                archivo.archivar_eventos(dias=365, lote=1)
+        self.assertEqual(EventoAuditoria.objects.count(), 6)
+
+        self.assertEqual(archivo.archivar_eventos(dias=365), 5)
+        self.assertEqual(len(self.archivos()['2025-01']), 2)
+        self.assertEqual(self.ids_archivados(), self.esperados(4, 3, 2, 1, 0))
+
+    def test_lee_lo_que_puede_de_un_archivo_danado(self):
+        archivo.archivar_eventos(dias=365)
+        ruta = next((self.directorio / '2025-01').iterdir())
+        completos = list(archivo._leer_eventos(ruta))
+
+        datos = ruta.read_bytes()
+        ruta.write_bytes(datos[:len(datos) // 2])
+        leidos = list(archivo._leer_eventos(ruta))
+        self.assertEqual(leidos, completos[:len(leidos)])
+
+        ruta.write_bytes(b'esto no es gzip')
+        self.assertEqual(list(archivo._leer_eventos(ruta)), [])
+
+        # Último renglón cortado a mitad del JSON: se descarta solo ese
+        ruta.write_bytes(gzip.compress((json.dumps(completos[0]) + '\n{"id": 9').encode()))
+        self.assertEqual(list(archivo._leer_eventos(ruta)), completos[:1])
+
+        # Los otros meses se siguen encontrando
+        self.assertEqual(self.ids_archivados(), self.esperados(4, 3, 2, 0))
+
+    def test_filtros_y_limite(self):
+        archivo.archivar_eventos(dias=365)
+
+        self.assertEqual(self.ids_archivados(usuario=self.luis.pk), self.esperados(4, 1))
+        self.assertEqual(self.ids_archivados(accion='UPDATE'), self.esperados(3, 2, 1))
+        self.assertEqual(self.ids_archivados(content_type=self.producto.pk, object_id='1'), self.esperados(4, 1, 0))
+        self.assertEqual(self.ids_archivados(desde=date(2025, 1, 15), hasta=date(2025, 3, 10)), self.esperados(3, 2, 1))
+        self.assertEqual(self.ids_archivados(hasta=date(2024, 12, 31)), [])
+        self.assertEqual(self.ids_archivados(limite=2), self.esperados(4, 3))
+        self.assertEqual(self.ids_archivados(limite=3), self.esperados(4, 3, 2))  # corta en el mes siguiente
+
+    def test_el_buscador_lee_el_archivo_solo_si_se_pide(self):
+        archivo.archivar_eventos(dias=365)
+        url = reverse('auditoria_eventos')
+
+        respuesta = self.client.get(url, {'usuario': self.luis.pk})
+        self.assertIsNone(respuesta.context['archivados'])
+
+        respuesta = self.client.get(url, {'archivo': '1', 'usuario': self.luis.pk})
+        self.assertEqual([e['id'] for e in respuesta.context['archivados']], self.esperados(4, 1))
+        self.assertEqual(list(respuesta.context['eventos']), [])
+
+        respuesta = self.client.get(url, {'archivo': '1', 'modelo': self.producto.pk, 'objeto': '1',
+                                          'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-01-31'})
+        self.assertEqual([e['id'] for e in respuesta.context['archivados']], self.esperados(1, 0))
+
+        with mock.patch('auditoria.views.EVENTOS_POR_PAGINA', 2):
+            respuesta = self.client.get(url, {'archivo': '1'})
+        self.assertEqual([e['id'] for e in respuesta.context['archivados']], self.esperados(4, 3))
@@ -1,10 +1,20 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from datetime import datetime, time, timedelta
+import json
 from .forms import AjusteStockForm
 from .models import EventoAuditoria
+from .signals import MODELOS_AUDITADOS
+from .archivo import buscar_archivados
 from inventario.models import Producto
+from inventario.views import avisar_pendientes, fecha_param
 
 @login_required
 def ajuste_stock(request):
@@ -15,28 +25,30 @@ def ajuste_stock(request):
             cantidad = form.cleaned_data['cantidad_ajuste']
             motivo = form.cleaned_data['motivo']
 
-            # Guardamos estado anterior para la auditoría manual
-            estado_anterior = {'stock_actual': float(producto.stock_actual)}
-            
-            # --- REGLA DE ORO: EL STOCK SE MUEVE ---
-            producto.stock_actual += cantidad
-            producto.save()
-            
-            estado_nuevo = {'stock_actual': float(producto.stock_actual)}
-
-            # Creamos el evento de auditoría específico (AJUSTE)
-            EventoAuditoria.objects.create(
-                usuario=request.user,
-                # ip_origen se obtendrá si usamos el middleware, o lo pasamos aquí si es crítico
-                modulo='inventario',
-                accion='AJUSTE',
-                content_type=ContentType.objects.get_for_model(producto),
-                object_id=str(producto.pk),
-                estado_anterior=estado_anterior,
-                estado_nuevo=estado_nuevo,
-                cambios={'stock': {'delta': cantidad, 'motivo': motivo}},
-                observacion=f"AJUSTE MANUAL: {motivo}"
-            )
+            with transaction.atomic():
+                # --- REGLA DE ORO: EL STOCK SE MUEVE ---
+                # UPDATE relativo, como las ventas (ver inventario/stock.py): un save() de la fila
+                # entera escribiría un stock leído antes y pisaría los descuentos concurrentes
+                Producto.objects.filter(pk=producto.pk).update(stock_actual=F('stock_actual') + cantidad)
+                producto.refresh_from_db(fields=['stock_actual'])
+
+                # Estado anterior y nuevo para la auditoría manual (dentro de la transacción, exactos)
+                estado_anterior = {'stock_actual': float(producto.stock_actual - cantidad)}
+                estado_nuevo = {'stock_actual': float(producto.stock_actual)}
+
+                # Creamos el evento de auditoría específico (AJUSTE)
+                EventoAuditoria.objects.create(
+                    usuario=request.user,
+                    # ip_origen se obtendrá si usamos el middleware, o lo pasamos aquí si es crítico
+                    modulo='inventario',
+                    accion='AJUSTE',
+                    content_type=ContentType.objects.get_for_model(producto),
+                    object_id=str(producto.pk),
+                    estado_anterior=estado_anterior,
+                    estado_nuevo=estado_nuevo,
+                    cambios={'stock': {'delta': cantidad, 'motivo': motivo}},
+                    observacion=f"AJUSTE MANUAL: {motivo}"
+                )
 
             messages.success(request, f"Stock ajustado. Nuevo saldo: {producto.stock_actual}")
             return redirect('auditoria_panel') 
@@ -44,6 +56,99 @@ def ajuste_stock(request):
         form = AjusteStockForm()
 
     # --- LISTA DE AUDITORÍA (CONSULTA Y REPORTES) ---
-    eventos = EventoAuditoria.objects.all()[:50] # Últimos 50 eventos
+    avisar_pendientes(request) # los eventos de esas ventas también siguen en el outbox
+    eventos = EventoAuditoria.objects.select_related('usuario', 'content_type')[:50] # Últimos 50 eventos
     
-    return render(request, 'auditoria/panel_control.html', {'form': form, 'eventos': eventos})
\ No newline at end of file
+    return render(request, 'auditoria/panel_control.html', {'form': form, 'eventos': eventos})
+
+EVENTOS_POR_PAGINA = 50
+
+@login_required
+def eventos_auditoria(request):
+    """
+    Buscador de eventos: filtros por usuario, acción, modelo, objeto y fechas,
+    paginado por cursor (fecha, id) sobre los índices compuestos del modelo.
+    """
+    avisar_pendientes(request) # los eventos de esas ventas también siguen en el outbox
+    eventos = EventoAuditoria.objects.order_by('-fecha', '-id')
+
+    usuario = request.GET.get('usuario')
+    accion = request.GET.get('accion')
+    modelo = request.GET.get('modelo')
+    objeto = request.GET.get('objeto', '').strip()
+    fecha_inicio = fecha_param(request, 'fecha_inicio')
+    fecha_fin = fecha_param(request, 'fecha_fin')
+
+    if usuario and usuario.isdigit():
+        eventos = eventos.filter(usuario_id=usuario)
+    if accion:
+        eventos = eventos.filter(accion=accion)
+    if modelo and modelo.isdigit():
+        eventos = eventos.filter(content_type_id=modelo)
+        if objeto:
+            eventos = eventos.filter(object_id=objeto) # solo junto al modelo: así usa el índice (content_type, object_id, fecha)
+    # Límites como datetime (sin __date) para que el rango use el índice
+    if fecha_inicio:
+        eventos = eventos.filter(fecha__gte=timezone.make_aware(datetime.combine(fecha_inicio, time.min)))
+    if fecha_fin:
+        eventos = eventos.filter(fecha__lt=timezone.make_aware(datetime.combine(fecha_fin + timedelta(days=1), time.min)))
+
+    # Paginado por cursor, igual que el listado de ventas
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            fecha, pk = json.loads(urlsafe_base64_decode(cursor))
+            fecha, pk = datetime.fromisoformat(fecha), int(pk)
+        except (ValueError, TypeError):
+            messages.warning(request, "El enlace de paginación no es válido; se muestra la primera página.")
+            cursor = None
+        else:
+            eventos = eventos.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk))
+
+    # content_object se resuelve con una consulta por tipo de modelo, no por fila
+    pagina = list(
+        eventos.select_related('usuario', 'content_type')
+        .prefetch_related('content_object')[:EVENTOS_POR_PAGINA + 1]
+    )
+    siguiente = None
+    if len(pagina) > EVENTOS_POR_PAGINA:
+        pagina = pagina[:EVENTOS_POR_PAGINA]
+        ultimo = pagina[-1]
+        parametros = request.GET.copy()
+        parametros['cursor'] = urlsafe_base64_encode(json.dumps([ultimo.fecha.isoformat(), ultimo.id]).encode())
+        siguiente = parametros.urlencode()
+
+    primera = request.GET.copy()
+    primera.pop('cursor', None)
+
+    # Los eventos viejos viven en los archivos comprimidos: solo se leen si se pide
+    archivados = None
+    if request.GET.get('archivo'):
+        archivados = buscar_archivados(
+            desde=fecha_inicio,
+            hasta=fecha_fin,
+            usuario=int(usuario) if usuario and usuario.isdigit() else None,
+            accion=accion or None,
+            content_type=int(modelo) if modelo and modelo.isdigit() else None,
+            object_id=objeto if objeto and modelo else None,
+            limite=EVENTOS_POR_PAGINA,
+        )
+
+    return render(request, 'auditoria/eventos.html', {
+        'eventos': pagina,
+        'usuarios': User.objects.order_by('username').only('id', 'username'),
+        'acciones': EventoAuditoria.ACCION_CHOICES,
+        'modelos': sorted(ContentType.objects.get_for_models(*MODELOS_AUDITADOS).values(), key=lambda ct: ct.model),
+        'filtros': {
+            'usuario': usuario or '',
+            'accion': accion or '',
+            'modelo': modelo or '',
+            'objeto': objeto,
+            'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else '',
+            'fecha_fin': fecha_fin.isoformat() if fecha_fin else '',
+            'archivo': bool(request.GET.get('archivo')),
+        },
+        'pagina_siguiente': siguiente,
+        'pagina_primera': primera.urlencode() if cursor else None,
+        'archivados': archivados,
+    })
@@ -37,6 +37,9 @@ urlpatterns = [
     path('productos/nuevo/', views.producto_crear, name='producto_crear'),
     # 6. Editar producto existente
     path('productos/editar/<int:pk>/', views.producto_editar, name='producto_editar'),
+    path('productos/codigo/<str:codigo>/', views.producto_por_codigo, name='producto_por_codigo'),
+    path('productos/precios/', views.catalogo_precios, name='catalogo_precios'),
+    path('productos/buscar/', views.producto_buscar, name='producto_buscar'),
     # 7. Lista de clientes
     path('clientes/', views.cliente_lista, name='cliente_lista'),
     path('clientes/nuevo/', views.cliente_crear, name='cliente_crear'),
@@ -44,6 +47,7 @@ urlpatterns = [
     # 8. Ventas
     path('ventas/', views.venta_list, name='venta_list'),
     path('ventas/nueva/', views.nueva_venta, name='nueva_venta'),
+    path('ventas/lote/', views.ventas_lote, name='ventas_lote'),
     path('ventas/ticket/<int:pk>/', views.ticket_venta, name='ticket_venta'),
     #8. Presupuestos
     path('presupuestos/nuevo/', views.nuevo_presupuesto, name='nuevo_presupuesto'),
@@ -52,9 +56,15 @@ urlpatterns = [
     #9. Refundicion de cuentas
     path('contabilidad/libro-diario/', views.libro_diario, name='libro_diario'),
     path('contabilidad/cierre/', views.generar_cierre_contable, name='generar_cierre'),
+    path('contabilidad/balance/', views.balance_sumas_saldos, name='balance_sumas_saldos'),
+    path('contabilidad/mayor/<int:pk>/', views.libro_mayor, name='libro_mayor'),
+    path('exportar/asientos/', views.exportar_asientos, name='exportar_asientos'),
+    path('exportar/ventas/', views.exportar_ventas, name='exportar_ventas'),
+    path('exportar/compras/', views.exportar_compras, name='exportar_compras'),
     path('caja/gestion/', views.gestion_caja, name='gestion_caja'),
     path('caja/abrir/', views.abrir_caja, name='abrir_caja'),
     path('caja/cerrar/', views.cerrar_caja, name='cerrar_caja'),
+    path('caja/<int:pk>/', views.caja_detalle, name='caja_detalle'),
     #Proveedores
     path('proveedores/', views.proveedor_list, name='proveedor_list'),
     path('proveedores/nuevo/', views.proveedor_crear, name='proveedor_crear'),
@@ -63,4 +73,5 @@ urlpatterns = [
     path('compras/nueva/', views.nueva_compra, name='nueva_compra'),
     #auditorias
     path('auditoria/panel/', audit_views.ajuste_stock, name='auditoria_panel'),
+    path('auditoria/eventos/', audit_views.eventos_auditoria, name='auditoria_eventos'),
 ]
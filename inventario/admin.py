@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Categoria, Producto
+from .models import Categoria, Producto, VentaDiaria, SaldoCuenta, TareaPendiente
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -10,4 +10,19 @@ class ProductoAdmin(admin.ModelAdmin):
     # Esto define las columnas que verás en la lista de productos
     list_display = ('nombre', 'precio', 'stock_actual', 'codigo_barras', 'fecha_actualizacion')
     list_filter = ('categorias', 'fecha_creacion') # Filtros laterales
-    search_fields = ('nombre', 'codigo_barras') # Barra de búsqueda
\ No newline at end of file
+    search_fields = ('nombre', 'codigo_barras') # Barra de búsqueda
+
+@admin.register(VentaDiaria)
+class VentaDiariaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'cantidad_tickets', 'unidades', 'total', 'costo', 'efectivo', 'mercadopago', 'transferencia')
+    date_hierarchy = 'fecha'
+
+@admin.register(SaldoCuenta)
+class SaldoCuentaAdmin(admin.ModelAdmin):
+    list_display = ('cuenta', 'periodo', 'debe', 'haber', 'saldo')
+    list_filter = ('cuenta__tipo', 'periodo')
+
+@admin.register(TareaPendiente)
+class TareaPendienteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'creada', 'intentos', 'tomada', 'ultimo_error')
+    list_filter = ('intentos',)
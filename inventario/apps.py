@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 
 class InventarioConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventario'
+
+    def ready(self):
+        import inventario.signals # Carga las señales al iniciar
+        import inventario.ventas # Registra los manejadores del outbox (asientos de venta)
@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+from .models import DetalleVenta
+from .stock import agrupar_cantidades
+
+
+class CarritoInvalido(Exception):
+    pass
+
+
+class LineaCarrito:
+    def __init__(self, producto, cantidad, descuento_porcentaje=Decimal(0)):
+        self.producto = producto
+        self.cantidad = cantidad
+        self.descuento_porcentaje = descuento_porcentaje or Decimal(0)
+        self.precio_unitario = producto.precio
+
+        bruto = cantidad * self.precio_unitario
+        self.subtotal = bruto - bruto * (self.descuento_porcentaje / Decimal(100))
+        self.costo = (producto.precio_costo or Decimal(0)) * cantidad
+
+
+class Carrito:
+    """
+    Líneas de una venta ya resueltas contra los productos precargados del
+    formset (ver ProductosPrecargadosFormSet): precio, subtotal con descuento
+    por ítem y costo se calculan una sola vez y los usa el guardado.
+    """
+
+    def __init__(self, lineas):
+        self.lineas = lineas
+
+    @classmethod
+    def desde_formset(cls, formset):
+        lineas = []
+        for form in formset.forms:
+            datos = form.cleaned_data
+            if not datos or datos.get('DELETE') or not form.has_changed():
+                continue
+            lineas.append(LineaCarrito(datos['producto'], datos['cantidad'], datos.get('descuento_porcentaje')))
+        return cls(lineas)
+
+    @property
+    def subtotal(self):
+        return sum((linea.subtotal for linea in self.lineas), Decimal(0))
+
+    @property
+    def costo(self):
+        return sum((linea.costo for linea in self.lineas), Decimal(0))
+
+    @property
+    def unidades(self):
+        return sum(linea.cantidad for linea in self.lineas)
+
+    def cantidades(self):
+        return agrupar_cantidades((linea.producto.pk, linea.cantidad) for linea in self.lineas)
+
+    def validar(self):
+        """
+        Chequeo previo contra el stock leído al precargar. El control que vale
+        es el UPDATE condicional de descontar_stock(); esto solo evita abrir la
+        transacción cuando ya se sabe que no alcanza.
+        """
+        if not self.lineas:
+            raise CarritoInvalido("La venta no tiene productos.")
+
+        productos = {linea.producto.pk: linea.producto for linea in self.lineas}
+        faltantes = [
+            f"{productos[pk].nombre} (quedan {productos[pk].stock_actual})"
+            for pk, cantidad in self.cantidades().items()
+            if productos[pk].stock_actual < cantidad
+        ]
+        if faltantes:
+            raise CarritoInvalido(f"No hay stock suficiente de {', '.join(faltantes)}")
+
+    def total(self, descuento_global_porcentaje=Decimal(0), descuento_global=Decimal(0)):
+        total = self.subtotal
+
+        # 1️⃣ Descuento global PORCENTAJE
+        if descuento_global_porcentaje and descuento_global_porcentaje > 0:
+            total -= total * (descuento_global_porcentaje / Decimal(100))
+
+        # 2️⃣ Descuento global FIJO ($)
+        total -= descuento_global or Decimal(0)
+
+        return max(total, Decimal(0))
+
+    def detalles(self, venta):
+        return [
+            DetalleVenta(
+                venta=venta,
+                producto=linea.producto,
+                cantidad=linea.cantidad,
+                precio_unitario=linea.precio_unitario,
+                descuento_porcentaje=linea.descuento_porcentaje,
+                subtotal=linea.subtotal,
+            )
+            for linea in self.lineas
+        ]
@@ -0,0 +1,392 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_save
+
+from .models import Cuenta, Asiento, ItemAsiento, CajaDiaria, SaldoCuenta
+
+CODIGO_CAJA = '1.01'
+
+# Segundos que un proceso usa su copia del plan de cuentas antes de volver a leerlo
+# (lo editado en otro proceso no le llega por señales)
+PLAN_CUENTAS_VIGENCIA = getattr(settings, 'PLAN_CUENTAS_VIGENCIA', 60)
+
+
+class AsientoDesbalanceado(ValueError):
+    pass
+
+
+class PlanDeCuentas:
+    """
+    Plan de cuentas en memoria del proceso.
+
+    Las cuentas casi nunca cambian, así que se cargan una vez y después se
+    buscan por código, nombre o tipo sin ir a la base. En este proceso las
+    señales de Cuenta (inventario/signals.py) llaman a invalidar() al guardar
+    o borrar. Lo editado en otro proceso (otro worker, el admin, un comando)
+    no dispara esas señales: para eso la copia vence a los
+    PLAN_CUENTAS_VIGENCIA segundos, una búsqueda que no encuentra la cuenta
+    recarga antes de fallar, y lo que no puede esperar (el cierre de
+    ejercicio) llama a recargar().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indices = None
+        self._cargado = 0.0
+
+    def _cargar(self):
+        por_codigo, por_nombre, por_tipo = {}, {}, {}
+        for cuenta in Cuenta.objects.all().order_by('codigo'):
+            por_codigo[cuenta.codigo] = cuenta
+            por_nombre[cuenta.nombre] = cuenta
+            por_tipo.setdefault(cuenta.tipo, []).append(cuenta)
+        return {'codigo': por_codigo, 'nombre': por_nombre, 'tipo': por_tipo}
+
+    def _obtener_indices(self, recargar=False):
+        indices = self._indices
+        vencido = time.monotonic() - self._cargado > PLAN_CUENTAS_VIGENCIA
+        if indices is None or recargar or vencido:
+            with self._lock:
+                # Si otro hilo ya lo recargó mientras esperábamos el lock, sirve ese
+                if self._indices is None or self._indices is indices:
+                    self._indices = self._cargar()
+                    self._cargado = time.monotonic()
+                indices = self._indices
+        return indices
+
+    def _buscar(self, indice, clave):
+        cuenta = self._obtener_indices()[indice].get(clave)
+        if cuenta is None:
+            cuenta = self._obtener_indices(recargar=True)[indice].get(clave)
+        if cuenta is None:
+            raise Cuenta.DoesNotExist(f"No existe la cuenta con {indice} '{clave}'")
+        return cuenta
+
+    def por_codigo(self, codigo):
+        return self._buscar('codigo', codigo)
+
+    def por_nombre(self, nombre):
+        return self._buscar('nombre', nombre)
+
+    def por_tipo(self, tipo):
+        return list(self._obtener_indices()['tipo'].get(tipo, []))
+
+    def todas(self):
+        # Ordenadas por código (así se cargan)
+        return list(self._obtener_indices()['codigo'].values())
+
+    def recargar(self):
+        """Lee el plan de la base ahora, con lo que hayan cambiado otros procesos."""
+        self._obtener_indices(recargar=True)
+
+    def invalidar(self):
+        self._indices = None
+
+
+plan_cuentas = PlanDeCuentas()
+
+
+# =====================================================
+# REGISTRO DE ASIENTOS EN LOTE
+# =====================================================
+
+def armar_asiento(descripcion, items, tipo='NORMAL', fecha=None, caja_id=None):
+    """
+    Arma un asiento SIN guardarlo. `items` es una lista de (cuenta, debe, haber).
+    Devuelve (Asiento, [ItemAsiento, ...]) listo para registrar_asientos().
+    `caja_id` es el turno al que se imputa si mueve Caja (por defecto, el abierto).
+    """
+    asiento = Asiento(fecha=fecha or date.today(), descripcion=descripcion, tipo=tipo, caja_id=caja_id)
+    lineas = [ItemAsiento(cuenta=cuenta, debe=debe, haber=haber) for cuenta, debe, haber in items]
+    return asiento, lineas
+
+
+def registrar_asientos(asientos):
+    """
+    Graba una lista de asientos armados con armar_asiento() usando un
+    bulk_create para Asiento y otro para ItemAsiento, sin importar cuántos
+    asientos o líneas haya.
+
+    Antes de escribir nada verifica en memoria que cada asiento tenga líneas
+    y que Debe == Haber; si alguno no cierra lanza AsientoDesbalanceado.
+    """
+    for asiento, lineas in asientos:
+        debe = sum(linea.debe for linea in lineas)
+        haber = sum(linea.haber for linea in lineas)
+        if not lineas or debe != haber:
+            raise AsientoDesbalanceado(
+                f"El asiento '{asiento.descripcion}' no balancea (Debe {debe} / Haber {haber})"
+            )
+
+    if not asientos:
+        return []
+
+    with transaction.atomic():
+        # Los que mueven Caja sin turno indicado van al abierto ahora (una consulta, solo si hace falta)
+        sin_caja = [
+            asiento for asiento, lineas in asientos
+            if asiento.caja_id is None and any(linea.cuenta.codigo == CODIGO_CAJA for linea in lineas)
+        ]
+        if sin_caja:
+            caja_abierta = CajaDiaria.objects.filter(estado=True).values_list('pk', flat=True).last()
+            for asiento in sin_caja:
+                asiento.caja_id = caja_abierta
+
+        creados = Asiento.objects.bulk_create([asiento for asiento, _ in asientos])
+
+        items = []
+        for asiento, lineas in asientos:
+            for linea in lineas:
+                linea.asiento = asiento
+                items.append(linea)
+        ItemAsiento.objects.bulk_create(items)
+
+        acumular_saldos(items)
+
+        # Movimientos de la cuenta Caja: se suman a los contadores del turno de cada asiento
+        por_caja = {}
+        for item in items:
+            if item.cuenta.codigo == CODIGO_CAJA and item.asiento.caja_id:
+                debe, haber = por_caja.get(item.asiento.caja_id, (0, 0))
+                por_caja[item.asiento.caja_id] = (debe + item.debe, haber + item.haber)
+        for caja_id, (debe, haber) in por_caja.items():
+            CajaDiaria.objects.filter(pk=caja_id).update(
+                debe_caja=F('debe_caja') + debe,
+                haber_caja=F('haber_caja') + haber,
+            )
+
+        # bulk_create no dispara señales: avisamos igual para que la auditoría registre el alta
+        for asiento in creados:
+            post_save.send(sender=Asiento, instance=asiento, created=True,
+                           update_fields=None, raw=False, using=asiento._state.db)
+
+    return creados
+
+
+# =====================================================
+# SALDOS POR CUENTA Y MES
+# =====================================================
+
+def acumular_saldos(items):
+    """Suma los renglones (ya con su asiento) a SaldoCuenta: un UPDATE por cuenta y mes tocados."""
+    movimientos = {}
+    for item in items:
+        clave = (item.cuenta_id, item.asiento.fecha.replace(day=1))
+        debe, haber = movimientos.get(clave, (0, 0))
+        movimientos[clave] = (debe + item.debe, haber + item.haber)
+
+    for (cuenta_id, periodo), (debe, haber) in movimientos.items():
+        filtro = SaldoCuenta.objects.filter(cuenta_id=cuenta_id, periodo=periodo)
+        incrementos = dict(debe=F('debe') + debe, haber=F('haber') + haber)
+        if filtro.update(**incrementos):
+            continue
+        try:
+            # Primer movimiento del mes para la cuenta; si otro lo crea a la vez sumamos encima
+            with transaction.atomic():
+                SaldoCuenta.objects.create(cuenta_id=cuenta_id, periodo=periodo, debe=debe, haber=haber)
+        except IntegrityError:
+            filtro.update(**incrementos)
+
+
+def saldos_por_cuenta(cuentas=None, desde=None, hasta=None):
+    """
+    {cuenta_id: (debe, haber)} sumando los meses de SaldoCuenta en una sola
+    consulta. `desde`/`hasta` son fechas y se toman por mes completo.
+    """
+    saldos = SaldoCuenta.objects.all()
+    if cuentas is not None:
+        saldos = saldos.filter(cuenta__in=cuentas)
+    if desde:
+        saldos = saldos.filter(periodo__gte=desde.replace(day=1))
+    if hasta:
+        saldos = saldos.filter(periodo__lte=hasta.replace(day=1))
+
+    return {
+        fila['cuenta']: (fila['debe'] or 0, fila['haber'] or 0)
+        for fila in saldos.values('cuenta').annotate(debe=Sum('debe'), haber=Sum('haber')).order_by()
+    }
+
+
+def reconstruir_saldos():
+    """Rehace SaldoCuenta completo desde los renglones de asiento. Devuelve las filas escritas."""
+    filas = [
+        SaldoCuenta(cuenta_id=fila['cuenta'], periodo=fila['periodo'], debe=fila['debe'], haber=fila['haber'])
+        for fila in ItemAsiento.objects.annotate(periodo=TruncMonth('asiento__fecha'))
+        .values('cuenta', 'periodo').annotate(debe=Sum('debe'), haber=Sum('haber')).order_by()
+    ]
+    with transaction.atomic():
+        SaldoCuenta.objects.all().delete()
+        SaldoCuenta.objects.bulk_create(filas)
+    return len(filas)
+
+
+# =====================================================
+# CIERRE DE EJERCICIO
+# =====================================================
+
+def armar_cierre_ejercicio(fecha=None):
+    """
+    Arma (sin grabar) los asientos de cierre: refundición de las cuentas de
+    INGRESO y EGRESO contra "Resultado del Ejercicio" y traslado a
+    "Resultados Acumulados". Los saldos salen de una sola consulta agrupada
+    (saldos_por_cuenta). Devuelve la lista para registrar_asientos(); vacía
+    si no hay nada que cerrar.
+    """
+    fecha = fecha or date.today()
+    # Qué cuentas son de resultado se lee de la base: una copia vieja dejaría alguna sin refundir
+    plan_cuentas.recargar()
+    cuentas_ingreso = plan_cuentas.por_tipo('INGRESO')
+    cuentas_egreso = plan_cuentas.por_tipo('EGRESO')
+    saldos = saldos_por_cuenta(cuentas_ingreso + cuentas_egreso)
+
+    items_refundicion = []
+    total_ingresos = 0
+    total_egresos = 0
+
+    # Debitamos los ingresos para dejarlos en 0
+    for c in cuentas_ingreso:
+        debe, haber = saldos.get(c.id, (0, 0))
+        saldo_neto = haber - debe  # Saldo acreedor
+        if saldo_neto > 0:
+            items_refundicion.append((c, saldo_neto, 0))
+            total_ingresos += saldo_neto
+
+    # Acreditamos los egresos para dejarlos en 0
+    for c in cuentas_egreso:
+        debe, haber = saldos.get(c.id, (0, 0))
+        saldo_neto = debe - haber  # Saldo deudor
+        if saldo_neto > 0:
+            items_refundicion.append((c, 0, saldo_neto))
+            total_egresos += saldo_neto
+
+    if not items_refundicion:
+        return []
+
+    # La diferencia va a Resultado del Ejercicio
+    resultado = total_ingresos - total_egresos
+    cuenta_resultado = plan_cuentas.por_nombre('Resultado del Ejercicio')
+    asientos = []
+
+    if resultado > 0:  # Ganancia (Acreditar PN)
+        items_refundicion.append((cuenta_resultado, 0, resultado))
+    elif resultado < 0:  # Pérdida (Debitar PN)
+        items_refundicion.append((cuenta_resultado, abs(resultado), 0))
+    asientos.append(armar_asiento("Refundición de Cuentas de Resultado", items_refundicion,
+                                  tipo='REFUNDICION', fecha=fecha))
+
+    # Pasamos el Resultado del Ejercicio a Resultados Acumulados para iniciar el nuevo periodo limpio
+    if resultado:
+        cuenta_acumulados = plan_cuentas.por_nombre('Resultados Acumulados')
+        if resultado > 0:
+            # Debito el ejercicio (para cancelarlo) y Acredito Acumulados
+            items_traslado = [(cuenta_resultado, resultado, 0), (cuenta_acumulados, 0, resultado)]
+        else:
+            # Inverso
+            items_traslado = [(cuenta_resultado, 0, abs(resultado)), (cuenta_acumulados, abs(resultado), 0)]
+        asientos.append(armar_asiento("Traslado a Resultados Acumulados", items_traslado,
+                                      tipo='NORMAL', fecha=fecha))
+
+    return asientos
+
+
+# =====================================================
+# BALANCE DE SUMAS Y SALDOS / LIBRO MAYOR
+# =====================================================
+
+def sumas_por_cuenta(desde=None, hasta=None, filtro=None):
+    """{cuenta_id: (debe, haber)} de los renglones en el rango de fechas, con un solo GROUP BY."""
+    items = ItemAsiento.objects.all()
+    if desde:
+        items = items.filter(asiento__fecha__gte=desde)
+    if hasta:
+        items = items.filter(asiento__fecha__lte=hasta)
+    if filtro is not None:
+        items = items.filter(filtro)
+    return {
+        fila['cuenta']: (fila['debe'] or 0, fila['haber'] or 0)
+        for fila in items.values('cuenta').annotate(debe=Sum('debe'), haber=Sum('haber')).order_by()
+    }
+
+
+def _fin_de_mes(mes):
+    return (mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def _sumas_por_meses(desde, hasta):
+    """
+    Igual que sumas_por_cuenta() pero los meses que el rango cubre completos
+    se leen de SaldoCuenta (que registrar_asientos mantiene en la misma
+    transacción de cada asiento, así que no hay nada que invalidar). Solo las
+    puntas de mes sueltas se suman desde los renglones.
+    """
+    primero = desde.replace(day=1) if desde.day == 1 else _fin_de_mes(desde) + timedelta(days=1)
+    ultimo = None
+    mes = primero
+    while _fin_de_mes(mes) <= hasta:
+        ultimo = mes
+        mes = _fin_de_mes(mes) + timedelta(days=1)
+
+    if ultimo is None:
+        return sumas_por_cuenta(desde, hasta)
+
+    partes = [
+        saldos_por_cuenta(desde=primero, hasta=ultimo),
+        # Lo que queda fuera de los meses completos: una sola consulta
+        sumas_por_cuenta(desde, hasta, filtro=Q(asiento__fecha__lt=primero) | Q(asiento__fecha__gt=_fin_de_mes(ultimo))),
+    ]
+    sumas = {}
+    for parte in partes:
+        for cuenta_id, (debe, haber) in parte.items():
+            d, h = sumas.get(cuenta_id, (0, 0))
+            sumas[cuenta_id] = (d + debe, h + haber)
+    return sumas
+
+
+def balance_sumas_y_saldos(desde, hasta):
+    """
+    Filas del balance de sumas y saldos entre dos fechas (inclusive), una por
+    cuenta con movimientos, ordenadas por código, y los totales.
+    """
+    sumas = _sumas_por_meses(desde, hasta)
+    filas = []
+    totales = {'debe': 0, 'haber': 0, 'deudor': 0, 'acreedor': 0}
+    for cuenta in plan_cuentas.todas():
+        if cuenta.id not in sumas:
+            continue
+        debe, haber = sumas[cuenta.id]
+        fila = {
+            'cuenta': cuenta,
+            'debe': debe,
+            'haber': haber,
+            'deudor': max(debe - haber, 0),
+            'acreedor': max(haber - debe, 0),
+        }
+        for campo in totales:
+            totales[campo] += fila[campo]
+        filas.append(fila)
+    return filas, totales
+
+
+def movimientos_mayor(cuenta, desde, hasta):
+    """
+    Libro mayor de una cuenta: saldo anterior a `desde` y los renglones del
+    rango con el saldo acumulado (deudor positivo) en cada uno.
+    """
+    anterior = ItemAsiento.objects.filter(cuenta=cuenta, asiento__fecha__lt=desde).aggregate(
+        debe=Sum('debe'), haber=Sum('haber')
+    )
+    saldo = (anterior['debe'] or 0) - (anterior['haber'] or 0)
+    saldo_anterior = saldo
+
+    movimientos = []
+    for item in (ItemAsiento.objects.filter(cuenta=cuenta, asiento__fecha__range=[desde, hasta])
+                 .select_related('asiento').order_by('asiento__fecha', 'asiento_id', 'id')):
+        saldo += item.debe - item.haber
+        movimientos.append({'item': item, 'asiento': item.asiento, 'saldo': saldo})
+    return saldo_anterior, movimientos
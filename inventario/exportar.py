@@ -0,0 +1,84 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ItemAsiento, DetalleVenta, DetalleCompra
+
+# Filas que trae cada ida a la base: la memoria queda fija sin importar el tamaño del export
+TAMANO_LOTE = 2000
+
+
+class Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _rango_datetime(desde, hasta):
+    # Límites como datetime (local) para que el filtro por fecha use el índice, sin __date
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    return inicio, fin
+
+
+def _fecha_hora(valor):
+    return timezone.localtime(valor).strftime('%d/%m/%Y %H:%M')
+
+
+def respuesta_csv(nombre_archivo, encabezado, filas):
+    """StreamingHttpResponse que va escribiendo el CSV a medida que el generador `filas` avanza."""
+    escritor = csv.writer(Eco())
+
+    def lineas():
+        yield '\ufeff'  # BOM: Excel abre bien los acentos
+        yield escritor.writerow(encabezado)
+        for fila in filas:
+            yield escritor.writerow(fila)
+
+    response = StreamingHttpResponse(lineas(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def filas_asientos(desde, hasta):
+    # Un renglón por ItemAsiento con los datos de su asiento y cuenta (JOIN, sin consultas por fila)
+    items = (
+        ItemAsiento.objects.filter(asiento__fecha__range=[desde, hasta])
+        .order_by('asiento__fecha', 'asiento_id', 'id')
+        .values_list('asiento__fecha', 'asiento_id', 'asiento__tipo', 'asiento__descripcion',
+                     'cuenta__codigo', 'cuenta__nombre', 'debe', 'haber')
+    )
+    for fecha, asiento, tipo, descripcion, codigo, cuenta, debe, haber in items.iterator(chunk_size=TAMANO_LOTE):
+        yield [fecha.strftime('%d/%m/%Y'), asiento, tipo, descripcion, codigo, cuenta, debe, haber]
+
+
+def filas_ventas(desde, hasta):
+    inicio, fin = _rango_datetime(desde, hasta)
+    detalles = (
+        DetalleVenta.objects.filter(venta__fecha__gte=inicio, venta__fecha__lt=fin)
+        .order_by('venta__fecha', 'venta_id', 'id')
+        .values_list('venta__fecha', 'venta_id', 'venta__cliente__nombre', 'venta__cliente__apellido',
+                     'producto__codigo_barras', 'producto__nombre', 'cantidad', 'precio_unitario',
+                     'descuento_porcentaje', 'subtotal', 'venta__total', 'venta__monto_efectivo',
+                     'venta__monto_mercadopago', 'venta__monto_transferencia')
+    )
+    for fila in detalles.iterator(chunk_size=TAMANO_LOTE):
+        fecha, venta, nombre, apellido, *resto = fila
+        cliente = f"{nombre} {apellido or ''}".strip() if nombre else 'Consumidor Final'
+        yield [_fecha_hora(fecha), venta, cliente, *resto]
+
+
+def filas_compras(desde, hasta):
+    inicio, fin = _rango_datetime(desde, hasta)
+    detalles = (
+        DetalleCompra.objects.filter(compra__fecha__gte=inicio, compra__fecha__lt=fin)
+        .order_by('compra__fecha', 'compra_id', 'id')
+        .values_list('compra__fecha', 'compra_id', 'compra__proveedor__razon_social', 'compra__proveedor__cuit',
+                     'compra__comprobante', 'producto__codigo_barras', 'producto__nombre', 'cantidad',
+                     'precio_costo', 'subtotal', 'compra__total')
+    )
+    for fecha, *resto in detalles.iterator(chunk_size=TAMANO_LOTE):
+        yield [_fecha_hora(fecha), *resto]
@@ -1,10 +1,44 @@
+import uuid
+
 from django import forms
+from django.core.exceptions import ValidationError
 
-from django.forms import inlineformset_factory 
+from django.forms import inlineformset_factory, BaseInlineFormSet
+from django.urls import reverse_lazy
 
 from .models import Producto, Cliente, Venta, DetalleVenta, Presupuesto, DetallePresupuesto, CajaDiaria, Proveedor, Compra, DetalleCompra
 
 # --- PRODUCTOS ---
+class ProductoAutocomplete(forms.Select):
+    """
+    Select de producto que solo renderiza la opción elegida (si hay una).
+    El resto de las opciones las trae Select2 por AJAX desde 'producto_buscar',
+    así cada fila del formset no repite el catálogo entero como <option>.
+    """
+    def __init__(self, attrs=None):
+        base = {'class': 'form-select', 'data-url': reverse_lazy('producto_buscar')}
+        super().__init__(attrs={**base, **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        todas = self.choices
+        campo_pk = todas.queryset.model._meta.pk
+        seleccionados = []
+        for v in value:
+            # Lo posteado puede no ser un id (p. ej. 'abc'): el campo ya muestra su error, acá se ignora
+            try:
+                pk = campo_pk.to_python(v)
+            except ValidationError:
+                continue
+            if pk is not None:
+                seleccionados.append(pk)
+        queryset = todas.queryset.filter(pk__in=seleccionados) if seleccionados else todas.queryset.none()
+        opciones = [('', todas.field.empty_label)] if todas.field.empty_label is not None else []
+        self.choices = opciones + [todas.choice(obj) for obj in queryset]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
+
 class ProductoForm(forms.ModelForm):
     class Meta:
         model = Producto
@@ -35,6 +69,52 @@ class ProductoForm(forms.ModelForm):
             'categorias': 'Categorías (Ctrl + Click para varias)'
         }
 
+class ProductoChoiceField(forms.ModelChoiceField):
+    """Usa los productos precargados por el formset en lugar de un SELECT por fila."""
+    precargados = None
+
+    def to_python(self, value):
+        if self.precargados and value not in self.empty_values:
+            try:
+                return self.precargados[int(value)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_python(value)
+
+
+class ProductosPrecargadosFormSet(BaseInlineFormSet):
+    """
+    Formset de detalles que trae todos los productos del POST con un solo
+    in_bulk() y se los pasa a cada fila, en vez de una consulta por fila.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.productos = Producto.objects.in_bulk(self._ids_productos()) if self.is_bound else {}
+
+    def _ids_productos(self):
+        ids = set()
+        for i in range(self.total_form_count()):
+            valor = self.data.get(f"{self.add_prefix(i)}-producto")
+            if valor and str(valor).isdigit():
+                ids.add(int(valor))
+        return ids
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        form.fields['producto'].precargados = self.productos
+
+
+class ConProductoPrecargadoMixin:
+    def _get_validation_exclusions(self):
+        # ForeignKey.validate() haría otro SELECT para confirmar que el producto
+        # existe; si salió de los precargados ya lo sabemos.
+        exclusiones = super()._get_validation_exclusions()
+        precargados = self.fields['producto'].precargados or {}
+        producto = self.cleaned_data.get('producto')
+        if producto is not None and precargados.get(producto.pk) is producto:
+            exclusiones.add('producto')
+        return exclusiones
+
 # --- CLIENTES ---
 class ClienteForm(forms.ModelForm):
     class Meta:
@@ -53,6 +133,10 @@ class ClienteForm(forms.ModelForm):
 # --- VENTAS ---
 
 class VentaForm(forms.ModelForm):
+    # Fuera de Meta.fields a propósito: la unicidad la controla la vista
+    # (y la restricción UNIQUE), así no se hace un SELECT extra al validar
+    clave_idempotencia = forms.UUIDField(required=False, widget=forms.HiddenInput())
+
     class Meta:
         model = Venta
         fields = ['cliente', 'monto_efectivo', 'monto_mercadopago', 'monto_transferencia', 'descuento_global', 'descuento_global_porcentaje']
@@ -69,14 +153,18 @@ class VentaForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['cliente'].required = False # Asegura que sea opcional
         self.fields['cliente'].label = "Cliente (Dejar vacío para Consumidor Final)"
+        if not self.is_bound:
+            # Una clave nueva por cada formulario que se muestra
+            self.initial.setdefault('clave_idempotencia', uuid.uuid4())
 
 # Primero definir este formulario...
-class DetalleVentaForm(forms.ModelForm):
+class DetalleVentaForm(ConProductoPrecargadoMixin, forms.ModelForm):
     class Meta:
         model = DetalleVenta
         fields = ['producto', 'cantidad', 'descuento_porcentaje']
+        field_classes = {'producto': ProductoChoiceField}
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-select'}),
+            'producto': ProductoAutocomplete(),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'value': '1'}),
             'descuento_porcentaje': forms.NumberInput(attrs={'class': 'form-control', 'min': '0', 'max': '100', 'value': '0'}),
         }
@@ -85,6 +173,7 @@ DetalleVentaFormSet = inlineformset_factory(
     Venta, 
     DetalleVenta, 
     form=DetalleVentaForm,
+    formset=ProductosPrecargadosFormSet,
     extra=1,
     can_delete=True
 )
@@ -102,12 +191,13 @@ class PresupuestoForm(forms.ModelForm):
             'descuento': 'Descuento Global (%)'
         }
 
-class DetallePresupuestoForm(forms.ModelForm):
+class DetallePresupuestoForm(ConProductoPrecargadoMixin, forms.ModelForm):
     class Meta:
         model = DetallePresupuesto
         fields = ['producto', 'cantidad']
+        field_classes = {'producto': ProductoChoiceField}
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-select'}),
+            'producto': ProductoAutocomplete(),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'value': '1'}),
         }
 
@@ -115,6 +205,7 @@ DetallePresupuestoFormSet = inlineformset_factory(
     Presupuesto, 
     DetallePresupuesto, 
     form=DetallePresupuestoForm,
+    formset=ProductosPrecargadosFormSet,
     extra=1,
     can_delete=True
 )
@@ -162,12 +253,13 @@ class CompraForm(forms.ModelForm):
             'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
 
-class DetalleCompraForm(forms.ModelForm):
+class DetalleCompraForm(ConProductoPrecargadoMixin, forms.ModelForm):
     class Meta:
         model = DetalleCompra
         fields = ['producto', 'cantidad', 'precio_costo']
+        field_classes = {'producto': ProductoChoiceField}
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-select'}),
+            'producto': ProductoAutocomplete(),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
             'precio_costo': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
         }
@@ -176,6 +268,7 @@ DetalleCompraFormSet = inlineformset_factory(
     Compra,
     DetalleCompra,
     form=DetalleCompraForm,
+    formset=ProductosPrecargadosFormSet,
     extra=1,
     can_delete=True
 )
\ No newline at end of file
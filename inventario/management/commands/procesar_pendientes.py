@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario.outbox import procesar_pendientes, contar_pendientes, reencolar_trabadas, MAX_INTENTOS
+
+
+class Command(BaseCommand):
+    """
+    En producción tiene que quedar corriendo junto al servidor web, como un
+    servicio más (systemd, supervisor, un proceso del Procfile):
+
+        python manage.py procesar_pendientes --continuo
+
+    o, si no se puede dejar un proceso aparte, por cron cada minuto:
+
+        * * * * * cd /ruta/al/proyecto && python manage.py procesar_pendientes
+
+    Sin él los reportes muestran las ventas sin asentar hasta el próximo
+    cierre de caja o de ejercicio, que procesan el outbox antes de cerrar.
+    """
+    help = ("Procesa el outbox (TareaPendiente): asientos y auditoría diferidos de las ventas. "
+            "Dejarlo corriendo con --continuo (o por cron cada minuto) junto al servidor web.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help="Queda corriendo y revisa cada --intervalo segundos")
+        parser.add_argument('--intervalo', type=float, default=2.0)
+        parser.add_argument('--lote', type=int, default=500, help="Filas por transacción")
+        parser.add_argument('--reencolar', action='store_true',
+                            help=f"Antes de procesar, vuelve a intentar las tareas que superaron {MAX_INTENTOS} intentos")
+
+    def handle(self, *args, **options):
+        if options['reencolar']:
+            self.stdout.write(f"Reencoladas: {reencolar_trabadas()}")
+
+        while True:
+            procesadas, fallidas = procesar_pendientes(limite=options['lote'])
+            if procesadas or fallidas:
+                self.stdout.write(f"Procesadas: {procesadas} · Con error: {fallidas}")
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+
+        _, trabadas = contar_pendientes()
+        if trabadas:
+            self.stderr.write(self.style.WARNING(
+                f"{trabadas} tarea(s) superaron {MAX_INTENTOS} intentos: revisar 'ultimo_error' en el admin "
+                "y, corregida la causa, correr con --reencolar."
+            ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventario.contabilidad import reconstruir_saldos
+
+
+class Command(BaseCommand):
+    help = "Rehace los saldos por cuenta y mes (SaldoCuenta) a partir de los renglones de asiento."
+
+    def handle(self, *args, **options):
+        filas = reconstruir_saldos()
+        self.stdout.write(self.style.SUCCESS(f"Saldos reconstruidos: {filas} cuenta(s)/mes."))
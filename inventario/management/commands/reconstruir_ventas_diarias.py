@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventario.ventas import reconstruir_ventas_diarias
+
+
+class Command(BaseCommand):
+    help = "Rehace el acumulado diario de ventas (VentaDiaria) a partir de las ventas registradas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Fecha inicial AAAA-MM-DD (inclusive)")
+        parser.add_argument('--hasta', help="Fecha final AAAA-MM-DD (inclusive)")
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for opcion in ('desde', 'hasta'):
+            valor = options[opcion]
+            if valor:
+                try:
+                    fechas[opcion] = parse_date(valor)
+                except ValueError:  # bien formada pero inexistente (ej: mes 13)
+                    fechas[opcion] = None
+                if fechas[opcion] is None:
+                    raise CommandError(f"Fecha inválida para --{opcion}: {valor}")
+
+        dias = reconstruir_ventas_diarias(**fechas)
+        self.stdout.write(self.style.SUCCESS(f"Acumulado reconstruido: {dias} día(s)."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_producto_fecha_actualizacion_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
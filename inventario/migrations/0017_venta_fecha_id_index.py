@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['-fecha', '-id'], name='venta_fecha_id_idx'),
+        ),
+    ]
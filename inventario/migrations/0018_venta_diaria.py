@@ -0,0 +1,63 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:38
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def cargar_ventas_diarias(apps, schema_editor):
+    # Carga inicial del acumulado con las ventas que ya existen
+    Venta = apps.get_model('inventario', 'Venta')
+    DetalleVenta = apps.get_model('inventario', 'DetalleVenta')
+    ItemAsiento = apps.get_model('inventario', 'ItemAsiento')
+    VentaDiaria = apps.get_model('inventario', 'VentaDiaria')
+
+    dias = {}
+    for fila in Venta.objects.annotate(dia=TruncDate('fecha')).values('dia').annotate(
+        cantidad_tickets=Count('id'), total=Sum('total'), efectivo=Sum('monto_efectivo'),
+        mercadopago=Sum('monto_mercadopago'), transferencia=Sum('monto_transferencia'), vuelto=Sum('vuelto'),
+    ).order_by():
+        dia = fila.pop('dia')
+        dias[dia] = VentaDiaria(fecha=dia, **fila)
+    for fila in DetalleVenta.objects.annotate(dia=TruncDate('venta__fecha')).values('dia').annotate(
+        unidades=Sum('cantidad')
+    ).order_by():
+        dias[fila['dia']].unidades = fila['unidades']
+    for fila in ItemAsiento.objects.filter(
+        cuenta__codigo='5.01', asiento__descripcion__startswith='Costo por Venta #'
+    ).values('asiento__fecha').annotate(costo=Sum('debe')).order_by():
+        if fila['asiento__fecha'] in dias:
+            dias[fila['asiento__fecha']].costo = fila['costo']
+
+    VentaDiaria.objects.bulk_create(dias.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_venta_fecha_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('cantidad_tickets', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('efectivo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mercadopago', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transferencia', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vuelto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venta diaria',
+                'verbose_name_plural': 'Ventas diarias',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.RunPython(cargar_ventas_diarias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:39
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def cargar_contadores_cajas_abiertas(apps, schema_editor):
+    # Las cajas cerradas no se vuelven a mirar; las abiertas necesitan arrancar con lo ya vendido
+    CajaDiaria = apps.get_model('inventario', 'CajaDiaria')
+    Venta = apps.get_model('inventario', 'Venta')
+    DetalleVenta = apps.get_model('inventario', 'DetalleVenta')
+    ItemAsiento = apps.get_model('inventario', 'ItemAsiento')
+
+    for caja in CajaDiaria.objects.filter(estado=True):
+        ventas = Venta.objects.filter(fecha__gte=caja.fecha_apertura)
+        pagos = ventas.aggregate(
+            efectivo=Sum('monto_efectivo'), mp=Sum('monto_mercadopago'), transf=Sum('monto_transferencia')
+        )
+        unidades = DetalleVenta.objects.filter(venta__in=ventas).aggregate(total=Sum('cantidad'))['total']
+        movimientos = ItemAsiento.objects.filter(
+            cuenta__codigo='1.01', asiento__creado_at__gte=caja.fecha_apertura
+        ).aggregate(debe=Sum('debe'), haber=Sum('haber'))
+
+        caja.total_efectivo = pagos['efectivo'] or 0
+        caja.total_mercadopago = pagos['mp'] or 0
+        caja.total_transferencia = pagos['transf'] or 0
+        caja.total_unidades = unidades or 0
+        caja.debe_caja = movimientos['debe'] or 0
+        caja.haber_caja = movimientos['haber'] or 0
+        caja.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0018_venta_diaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='debe_caja',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='haber_caja',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='total_efectivo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='total_mercadopago',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='total_transferencia',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='total_unidades',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(cargar_contadores_cajas_abiertas, migrations.RunPython.noop),
+    ]
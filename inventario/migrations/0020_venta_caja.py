@@ -0,0 +1,32 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def asignar_cajas(apps, schema_editor):
+    # Cada venta existente va a la caja en cuyo turno (apertura → cierre) se registró
+    CajaDiaria = apps.get_model('inventario', 'CajaDiaria')
+    Venta = apps.get_model('inventario', 'Venta')
+
+    for caja in CajaDiaria.objects.order_by('fecha_apertura'):
+        ventas = Venta.objects.filter(caja__isnull=True, fecha__gte=caja.fecha_apertura)
+        if caja.fecha_cierre:
+            ventas = ventas.filter(fecha__lte=caja.fecha_cierre)
+        ventas.update(caja=caja)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0019_caja_contadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='caja',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ventas', to='inventario.cajadiaria'),
+        ),
+        migrations.RunPython(asignar_cajas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def cargar_saldos(apps, schema_editor):
+    ItemAsiento = apps.get_model('inventario', 'ItemAsiento')
+    SaldoCuenta = apps.get_model('inventario', 'SaldoCuenta')
+
+    SaldoCuenta.objects.bulk_create([
+        SaldoCuenta(cuenta_id=fila['cuenta'], periodo=fila['periodo'], debe=fila['debe'], haber=fila['haber'])
+        for fila in ItemAsiento.objects.annotate(periodo=TruncMonth('asiento__fecha'))
+        .values('cuenta', 'periodo').annotate(debe=Sum('debe'), haber=Sum('haber')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0020_venta_caja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoCuenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField()),
+                ('debe', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('haber', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='inventario.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Saldo de cuenta',
+                'verbose_name_plural': 'Saldos de cuentas',
+                'ordering': ['periodo', 'cuenta__codigo'],
+                'unique_together': {('cuenta', 'periodo')},
+            },
+        ),
+        migrations.RunPython(cargar_saldos, migrations.RunPython.noop),
+    ]
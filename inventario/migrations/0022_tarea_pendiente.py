@@ -0,0 +1,30 @@
+# Generated by Django 5.2.10 on 2026-10-16 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0021_saldo_cuenta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('tareas', models.JSONField()),
+                ('token', models.UUIDField(blank=True, db_index=True, null=True)),
+                ('tomada', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea pendiente',
+                'verbose_name_plural': 'Tareas pendientes',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.10 on 2026-10-16 21:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def asignar_cajas(apps, schema_editor):
+    # Asientos que mueven Caja: al turno en que se crearon (como se verificaba hasta ahora)
+    # y los de venta, al turno de su venta aunque el outbox los haya asentado más tarde
+    CajaDiaria = apps.get_model('inventario', 'CajaDiaria')
+    Asiento = apps.get_model('inventario', 'Asiento')
+    Venta = apps.get_model('inventario', 'Venta')
+
+    con_caja = Asiento.objects.filter(caja__isnull=True, items__cuenta__codigo='1.01')
+    for caja in CajaDiaria.objects.order_by('fecha_apertura'):
+        asientos = con_caja.filter(creado_at__gte=caja.fecha_apertura)
+        if caja.fecha_cierre:
+            asientos = asientos.filter(creado_at__lte=caja.fecha_cierre)
+        Asiento.objects.filter(pk__in=list(asientos.values_list('pk', flat=True))).update(caja=caja)
+
+    cajas_por_venta = dict(Venta.objects.filter(caja__isnull=False).values_list('pk', 'caja_id'))
+    for asiento in Asiento.objects.filter(descripcion__startswith='Venta #', items__cuenta__codigo='1.01'):
+        numero = asiento.descripcion[len('Venta #'):].split(' ', 1)[0]
+        caja_id = cajas_por_venta.get(int(numero)) if numero.isdigit() else None
+        if caja_id and caja_id != asiento.caja_id:
+            Asiento.objects.filter(pk=asiento.pk).update(caja_id=caja_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0022_tarea_pendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asiento',
+            name='caja',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='asientos', to='inventario.cajadiaria'),
+        ),
+        migrations.RunPython(asignar_cajas, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
+from decimal import Decimal
+
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from auditoria.mixins import AuditoriaMixin
+
 # Mantenemos Categoría casi igual, es muy útil para separar 
 # cosas de "Librería" (cuadernos) de "Mercería" (hilos, agujas).
 class Categoria(models.Model):
@@ -14,7 +18,7 @@ class Categoria(models.Model):
         return self.nombre
 
 
-class Producto(models.Model):
+class Producto(AuditoriaMixin, models.Model):
     # Identificación básica
     nombre = models.CharField(max_length=200, verbose_name="Nombre del Producto")
     marca = models.CharField(max_length=50, blank=True, null=True)
@@ -37,7 +41,7 @@ class Producto(models.Model):
     
     # Auditoría (Cuándo se creó o modificó el producto)
     fecha_creacion = models.DateTimeField(default=timezone.now)
-    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True) # Versión del catálogo de precios
     
     # Opcional: Usuario que creó el producto (si tienes empleados)
     usuario_creador = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="productos_creados")
@@ -53,7 +57,7 @@ class Producto(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.marca})" if self.marca else self.nombre
     
-class Cliente(models.Model):
+class Cliente(AuditoriaMixin, models.Model):
     nombre = models.CharField(max_length=100)
     apellido = models.CharField(max_length=100)
     # Campos opcionales (blank=True, null=True)
@@ -66,10 +70,10 @@ class Cliente(models.Model):
     def __str__(self):
         return f"{self.apellido}, {self.nombre}"
     
-class Venta(models.Model):
+class Venta(AuditoriaMixin, models.Model):
     # Cliente ya permite nulos (blank=True, null=True), así que soporta anónimo
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(default=timezone.now, editable=False) # no auto_now_add: las ventas cargadas en lote traen su hora
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     descuento_global = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     descuento_global_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, default=0)
@@ -78,10 +82,44 @@ class Venta(models.Model):
     monto_mercadopago = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     monto_transferencia = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     vuelto = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Token que genera el formulario: si el mismo envío llega dos veces (doble clic,
+    # reintento del navegador) la restricción UNIQUE impide registrar otra venta
+    clave_idempotencia = models.UUIDField(unique=True, null=True, blank=True)
+    # Turno de caja en el que se cobró (indexado: cierre y detalle de caja buscan por acá)
+    caja = models.ForeignKey('CajaDiaria', on_delete=models.PROTECT, null=True, blank=True, related_name='ventas')
+
+    class Meta:
+        # Historial y paginado por cursor recorren (fecha, id) de la más nueva a la más vieja
+        indexes = [models.Index(fields=['-fecha', '-id'], name='venta_fecha_id_idx')]
 
     def __str__(self):
         return f"Venta #{self.id} - {self.cliente or 'Consumidor Final'}"
 
+class VentaDiaria(models.Model):
+    """
+    Acumulado de ventas por día (fecha local). Lo suma registrar_venta() dentro
+    de la misma transacción de la venta; si se desfasa se rehace con
+    `manage.py reconstruir_ventas_diarias`.
+    """
+    fecha = models.DateField(unique=True)
+    cantidad_tickets = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Cobrado por medio de pago (lo que se cargó en cada monto de la venta)
+    efectivo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mercadopago = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transferencia = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vuelto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = "Venta diaria"
+        verbose_name_plural = "Ventas diarias"
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y}: {self.cantidad_tickets} ventas (${self.total})"
+
 class DetalleVenta(models.Model):
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='detalles')
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT) # No permitir borrar productos si ya se vendieron
@@ -90,8 +128,10 @@ class DetalleVenta(models.Model):
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
     descuento_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     def save(self, *args, **kwargs):
-        # Calculamos subtotal automáticamente antes de guardar
-        self.subtotal = self.cantidad * self.precio_unitario
+        # Calculamos subtotal automáticamente antes de guardar (con el descuento del ítem,
+        # igual que carrito.LineaCarrito, que es lo que se usa al vender)
+        bruto = self.cantidad * self.precio_unitario
+        self.subtotal = bruto - bruto * (Decimal(self.descuento_porcentaje or 0) / Decimal(100))
         super().save(*args, **kwargs)
 
 class Presupuesto(models.Model):
@@ -130,7 +170,7 @@ class Cuenta(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
 
-class Asiento(models.Model):
+class Asiento(AuditoriaMixin, models.Model):
     TIPO_ASIENTO = [
         ('APERTURA', 'Apertura / Saldos Iniciales'),
         ('NORMAL', 'Movimiento Normal'),
@@ -141,12 +181,24 @@ class Asiento(models.Model):
     descripcion = models.CharField(max_length=200)
     tipo = models.CharField(max_length=20, choices=TIPO_ASIENTO, default='NORMAL')
     creado_at = models.DateTimeField(auto_now_add=True)
+    # Turno al que se imputan sus movimientos de Caja (las ventas se asientan después, desde el outbox)
+    caja = models.ForeignKey('CajaDiaria', on_delete=models.PROTECT, null=True, blank=True, related_name='asientos')
+
+    def _total(self, campo):
+        # 1) anotado por la consulta (suma_debe / suma_haber), 2) items ya precargados,
+        # 3) una sola consulta de suma en la base
+        anotado = getattr(self, f'suma_{campo}', None)
+        if anotado is not None:
+            return anotado
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum((getattr(item, campo) for item in self.items.all()), Decimal(0))
+        return self.items.aggregate(total=models.Sum(campo))['total'] or Decimal(0)
 
     def total_debe(self):
-        return sum(item.debe for item in self.items.all())
+        return self._total('debe')
 
     def total_haber(self):
-        return sum(item.haber for item in self.items.all())
+        return self._total('haber')
 
     def esta_balanceado(self):
         return self.total_debe() == self.total_haber()
@@ -157,20 +209,61 @@ class ItemAsiento(models.Model):
     debe = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     haber = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
-class CajaDiaria(models.Model):
+class SaldoCuenta(models.Model):
+    """
+    Debe y Haber acumulados de una cuenta en un mes (periodo = día 1 del mes).
+    Lo suma registrar_asientos() en la misma transacción de cada asiento; se
+    rehace con `manage.py reconstruir_saldos`.
+    """
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='saldos')
+    periodo = models.DateField()
+    debe = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    haber = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('cuenta', 'periodo')
+        ordering = ['periodo', 'cuenta__codigo']
+        verbose_name = "Saldo de cuenta"
+        verbose_name_plural = "Saldos de cuentas"
+
+    @property
+    def saldo(self):
+        # Saldo deudor positivo, acreedor negativo
+        return self.debe - self.haber
+
+    def __str__(self):
+        return f"{self.cuenta} {self.periodo:%m/%Y}: D {self.debe} / H {self.haber}"
+
+class CajaDiaria(AuditoriaMixin, models.Model):
     fecha_apertura = models.DateTimeField(auto_now_add=True)
     fecha_cierre = models.DateTimeField(null=True, blank=True)
     saldo_inicial = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     saldo_final = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     estado = models.BooleanField(default=True) # True = Abierta, False = Cerrada
+    # Contadores del turno: los suma cada venta/asiento mientras la caja está abierta,
+    # así el cierre lee esta fila en vez de recorrer ventas y asientos
+    total_efectivo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_mercadopago = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_transferencia = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_unidades = models.PositiveIntegerField(default=0)
+    debe_caja = models.DecimalField(max_digits=15, decimal_places=2, default=0)   # cuenta 1.01
+    haber_caja = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     # Opcional: Usuario que abrió la caja
     # usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
     def __str__(self):
         estado_str = "ABIERTA" if self.estado else "CERRADA"
         return f"Caja {self.id} - {self.fecha_apertura.strftime('%d/%m/%Y')} ({estado_str})"
+
+    @property
+    def total_vendido(self):
+        return self.total_efectivo + self.total_mercadopago + self.total_transferencia
+
+    @property
+    def saldo_sistema(self):
+        return self.debe_caja - self.haber_caja
     
-class Proveedor(models.Model):
+class Proveedor(AuditoriaMixin, models.Model):
     razon_social = models.CharField(max_length=150, verbose_name="Razón Social / Nombre")
     cuit = models.CharField(max_length=13, unique=True, verbose_name="CUIT/DNI")
     telefono = models.CharField(max_length=50, blank=True, null=True)
@@ -189,7 +282,7 @@ class Proveedor(models.Model):
     class Meta:
         verbose_name_plural = "Proveedores"
 
-class Compra(models.Model):
+class Compra(AuditoriaMixin, models.Model):
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)
     fecha = models.DateTimeField(auto_now_add=True)
     comprobante = models.CharField(max_length=50, blank=True, null=True, verbose_name="N° Factura/Remito")
@@ -208,4 +301,31 @@ class DetalleCompra(models.Model):
 
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_costo
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class TareaPendiente(models.Model):
+    """
+    Outbox: trabajo diferido (asientos, auditoría) que se graba en la misma
+    transacción que lo origina y después procesa outbox.procesar_pendientes()
+    en lote: el comando `procesar_pendientes --continuo`, que corre como servicio
+    junto al servidor web, y los cierres de caja y de ejercicio antes de cerrar
+    (los reportes solo avisan cuántas faltan).
+    """
+    creada = models.DateTimeField(auto_now_add=True)
+    # [{'tipo': 'asientos_venta', 'datos': {...}}, ...]
+    tareas = models.JSONField()
+    # Quién y cuándo la tomó para procesarla (evita que dos procesos la ejecuten)
+    token = models.UUIDField(null=True, blank=True, db_index=True)
+    tomada = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Tarea pendiente"
+        verbose_name_plural = "Tareas pendientes"
+
+    def __str__(self):
+        tipos = ", ".join(sorted({tarea['tipo'] for tarea in self.tareas}))
+        return f"Tarea #{self.id} ({tipos})"
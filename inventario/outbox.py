@@ -0,0 +1,153 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import TareaPendiente
+
+# Una tarea tomada que no terminó en este tiempo (proceso caído) se vuelve a tomar
+TOMADA_VENCE = timedelta(minutes=5)
+# Después de tantos fallos queda en la tabla para revisarla a mano (y reencolarla con --reencolar)
+MAX_INTENTOS = 5
+
+_manejadores = {}
+_local = threading.local()
+
+
+def manejador(tipo):
+    """Registra la función que procesa las tareas de `tipo`. Recibe la lista de `datos` del lote."""
+    def registrar(funcion):
+        _manejadores[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def en_lote():
+    return getattr(_local, 'tareas', None) is not None
+
+
+@contextmanager
+def lote():
+    """
+    Junta todo lo que se encole adentro en UNA sola fila de TareaPendiente,
+    escrita al salir (debe usarse dentro del transaction.atomic() de la
+    operación). Si sale por excepción no se escribe nada. Los lotes anidados
+    se suman al de afuera.
+    """
+    if en_lote():
+        yield
+        return
+
+    _local.tareas = []
+    try:
+        yield
+        tareas = _local.tareas
+    finally:
+        _local.tareas = None
+    if tareas:
+        TareaPendiente.objects.create(tareas=tareas)
+
+
+def encolar(tipo, datos):
+    """Agrega una tarea al lote en curso, o la graba sola si no hay lote. `datos` debe ser JSON."""
+    tarea = {'tipo': tipo, 'datos': datos}
+    if en_lote():
+        _local.tareas.append(tarea)
+    else:
+        TareaPendiente.objects.create(tareas=[tarea])
+
+
+def contar_pendientes():
+    """
+    (pendientes, trabadas) en una consulta: filas que el comando
+    `procesar_pendientes` todavía va a procesar y las que fallaron
+    MAX_INTENTOS veces y ya no se reintentan solas.
+    """
+    conteo = TareaPendiente.objects.aggregate(
+        pendientes=Count('id', filter=Q(intentos__lt=MAX_INTENTOS)),
+        trabadas=Count('id', filter=Q(intentos__gte=MAX_INTENTOS)),
+    )
+    return conteo['pendientes'], conteo['trabadas']
+
+
+def asentar_pendientes():
+    """
+    Antes de cerrar la caja o el ejercicio: procesa en el momento lo que
+    quede en el outbox, así el cierre no depende de que el comando esté
+    corriendo. Devuelve (pendientes, trabadas) que quedaron: tareas trabadas
+    o tomadas por otro proceso que todavía no terminó. Si alguna es distinta
+    de cero, los saldos no incluyen esas ventas.
+    """
+    procesar_pendientes()
+    return contar_pendientes()
+
+
+def reencolar_trabadas():
+    """Devuelve al outbox las tareas que superaron MAX_INTENTOS (ya corregida la causa). Devuelve cuántas."""
+    return TareaPendiente.objects.filter(intentos__gte=MAX_INTENTOS).update(intentos=0, token=None, tomada=None)
+
+
+def _tomar(limite, excluir):
+    ahora = timezone.now()
+    disponibles = TareaPendiente.objects.filter(
+        Q(token__isnull=True) | Q(tomada__lt=ahora - TOMADA_VENCE),
+        intentos__lt=MAX_INTENTOS,
+    ).exclude(pk__in=excluir)
+    ids = list(disponibles.order_by('id').values_list('id', flat=True)[:limite])
+    if not ids:
+        return []
+
+    # El UPDATE es atómico: si otro proceso las tomó antes, no las vuelve a marcar
+    token = uuid.uuid4()
+    disponibles.filter(pk__in=ids).update(token=token, tomada=ahora)
+    return list(TareaPendiente.objects.filter(token=token).order_by('id'))
+
+
+def _ejecutar(filas):
+    # Agrupa por tipo para que cada manejador trabaje en bloque (un bulk_create por tipo)
+    por_tipo = {}
+    for fila in filas:
+        for tarea in fila.tareas:
+            por_tipo.setdefault(tarea['tipo'], []).append(tarea['datos'])
+
+    with transaction.atomic():
+        for tipo, datos in por_tipo.items():
+            if tipo not in _manejadores:
+                raise LookupError(f"No hay manejador para tareas '{tipo}'")
+            _manejadores[tipo](datos)
+        TareaPendiente.objects.filter(pk__in=[fila.pk for fila in filas]).delete()
+
+
+def procesar_pendientes(limite=500):
+    """
+    Procesa las tareas pendientes en lotes de hasta `limite` filas hasta
+    vaciar la tabla. Si un lote falla se reintenta fila por fila para aislar
+    la que da error (queda con el error anotado). Devuelve (procesadas, fallidas).
+    """
+    procesadas = 0
+    fallidas = set()  # no se reintentan en esta misma pasada
+    while True:
+        filas = _tomar(limite, fallidas)
+        if not filas:
+            return procesadas, len(fallidas)
+
+        try:
+            _ejecutar(filas)
+            procesadas += len(filas)
+            continue
+        except Exception:
+            pass
+
+        for fila in filas:
+            try:
+                _ejecutar([fila])
+                procesadas += 1
+            except Exception as e:
+                fallidas.add(fila.pk)
+                TareaPendiente.objects.filter(pk=fila.pk).update(
+                    token=None, tomada=None, intentos=fila.intentos + 1, ultimo_error=str(e)
+                )
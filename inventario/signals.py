@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Cuenta
+from .contabilidad import plan_cuentas
+
+
+@receiver(post_save, sender=Cuenta)
+@receiver(post_delete, sender=Cuenta)
+def invalidar_plan_cuentas(sender, **kwargs):
+    plan_cuentas.invalidar()
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Producto
+
+# Reintentos si el stock cambia entre el UPDATE fallido y la consulta de diagnóstico
+MAX_INTENTOS = 3
+
+
+class _CarritoIncompleto(Exception):
+    pass
+
+
+def agrupar_cantidades(lineas):
+    """Suma las cantidades por producto: [(producto_id, cantidad), ...] -> {producto_id: total}."""
+    cantidades = {}
+    for producto_id, cantidad in lineas:
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def _stock_disponible(ids):
+    """{producto_id: stock_actual} leído de la base, para diagnosticar un UPDATE que no alcanzó."""
+    return dict(Producto.objects.filter(pk__in=ids).values_list('pk', 'stock_actual'))
+
+
+def descontar_stock(cantidades):
+    """
+    Descuenta stock de todo el carrito con UN solo UPDATE condicional:
+
+        UPDATE producto SET stock_actual = stock_actual - <n>
+        WHERE id IN (...) AND stock_actual >= <n>
+
+    `cantidades` es {producto_id: cantidad}. Es todo o nada: si algún producto
+    no alcanza, se deshace el UPDATE y se devuelve {producto_id: stock_disponible}
+    con los que fallaron. Si devuelve un dict vacío, el stock ya quedó descontado.
+
+    Como la resta la hace la base de datos, dos cajas vendiendo el mismo producto
+    a la vez no se pisan (no hay lectura-modificación-escritura en Python).
+    """
+    if not cantidades:
+        return {}
+
+    pedido = Case(
+        *[When(pk=pk, then=Value(cantidad)) for pk, cantidad in cantidades.items()],
+        output_field=IntegerField(),
+    )
+
+    disponibles = {}
+    for _ in range(MAX_INTENTOS):
+        try:
+            with transaction.atomic():
+                actualizados = Producto.objects.filter(
+                    pk__in=cantidades.keys(),
+                    stock_actual__gte=pedido,
+                ).update(stock_actual=F('stock_actual') - pedido)
+
+                if actualizados != len(cantidades):
+                    # Salimos del savepoint para deshacer lo que sí se descontó
+                    raise _CarritoIncompleto
+            return {}
+        except _CarritoIncompleto:
+            disponibles = _stock_disponible(cantidades.keys())
+            fallidos = {
+                pk: disponibles.get(pk, 0)
+                for pk, cantidad in cantidades.items()
+                if disponibles.get(pk, 0) < cantidad
+            }
+            if fallidos:
+                return fallidos
+            # Otra caja repuso stock justo en el medio: volvemos a intentar
+
+    return {pk: disponibles.get(pk, 0) for pk in cantidades}
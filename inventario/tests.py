@@ -1,3 +1,890 @@
+import csv
+import time
+import uuid
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.db import OperationalError, connection
+from django.db.models.signals import post_save
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (Producto, Cuenta, CajaDiaria, Venta, DetalleVenta, Asiento, ItemAsiento, SaldoCuenta, TareaPendiente,
+                     VentaDiaria)
+from .stock import descontar_stock
+from . import outbox
+from . import contabilidad, stock
+from .contabilidad import (plan_cuentas, armar_asiento, registrar_asientos, AsientoDesbalanceado,
+                           saldos_por_cuenta, sumas_por_cuenta, reconstruir_saldos, balance_sumas_y_saldos,
+                           armar_cierre_ejercicio)
+from .outbox import procesar_pendientes, contar_pendientes, MAX_INTENTOS
+from .forms import DetalleVentaFormSet
+from .ventas import registrar_lote, recalcular_contadores_caja
+
+
+PLAN_DE_PRUEBA = [
+    ('1.01', 'Caja', 'ACTIVO'),
+    ('1.02', 'Mercaderías', 'ACTIVO'),
+    ('2.01', 'Proveedores', 'PASIVO'),
+    ('3.01', 'Capital', 'PN'),
+    ('3.02', 'Resultado del Ejercicio', 'PN'),
+    ('3.03', 'Resultados Acumulados', 'PN'),
+    ('4.01', 'Ventas', 'INGRESO'),
+    ('5.01', 'CMV', 'EGRESO'),
+]
+
+
+class VentasTestMixin:
+    """Plan de cuentas, una caja abierta y dos productos para registrar ventas."""
+
+    def setUp(self):
+        for codigo, nombre, tipo in PLAN_DE_PRUEBA:
+            Cuenta.objects.create(codigo=codigo, nombre=nombre, tipo=tipo)
+        self.caja = CajaDiaria.objects.create(saldo_inicial=Decimal('100'))
+        self.lapiz = Producto.objects.create(nombre='Lápiz', precio=Decimal('100'), precio_costo=Decimal('40'), stock_actual=10)
+        self.goma = Producto.objects.create(nombre='Goma', precio=Decimal('50'), precio_costo=Decimal('20'), stock_actual=2)
+
+    def venta(self, *lineas, **cabecera):
+        """Venta en el formato de registrar_lote: lineas = (producto, cantidad), ..."""
+        return {
+            'monto_efectivo': '1000',
+            **cabecera,
+            'lineas': [{'producto': producto.pk, 'cantidad': cantidad} for producto, cantidad in lineas],
+        }
+
+    def stock(self, producto):
+        return Producto.objects.values_list('stock_actual', flat=True).get(pk=producto.pk)
+
+
+class DescontarStockTests(VentasTestMixin, TestCase):
+    def test_descuenta_todo_el_carrito(self):
+        self.assertEqual(descontar_stock({self.lapiz.pk: 3, self.goma.pk: 2}), {})
+        self.assertEqual(self.stock(self.lapiz), 7)
+        self.assertEqual(self.stock(self.goma), 0)
+
+    def test_sin_stock_suficiente_no_descuenta_nada(self):
+        fallidos = descontar_stock({self.lapiz.pk: 3, self.goma.pk: 5})
+
+        self.assertEqual(fallidos, {self.goma.pk: 2})
+        # Todo o nada: el lápiz, que sí alcanzaba, tampoco se descontó
+        self.assertEqual(self.stock(self.lapiz), 10)
+        self.assertEqual(self.stock(self.goma), 2)
+
+    def test_reintenta_si_otra_caja_repone_en_el_medio(self):
+        leer_real = stock._stock_disponible
+
+        def reponer_y_leer(ids):
+            # Entre el UPDATE fallido y la consulta de diagnóstico otra caja repone goma
+            Producto.objects.filter(pk=self.goma.pk).update(stock_actual=5)
+            return leer_real(ids)
+
+        with mock.patch.object(stock, '_stock_disponible', side_effect=reponer_y_leer) as diagnostico:
+            fallidos = descontar_stock({self.goma.pk: 4})
+
+        self.assertEqual(fallidos, {})
+        self.assertEqual(diagnostico.call_count, 1)
+        self.assertEqual(self.stock(self.goma), 1)
+
+    def test_producto_inexistente_falla_con_stock_cero(self):
+        self.assertEqual(descontar_stock({self.lapiz.pk: 1, 999999: 1}), {999999: 0})
+        self.assertEqual(self.stock(self.lapiz), 10)
+
+
+class VentaIdempotenteTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+
+    def post_venta(self, clave):
+        return self.client.post(reverse('nueva_venta'), {
+            'cliente': '', 'monto_efectivo': '300', 'monto_mercadopago': '0', 'monto_transferencia': '0',
+            'descuento_global': '0', 'descuento_global_porcentaje': '0', 'clave_idempotencia': str(clave),
+            'detalles-TOTAL_FORMS': '1', 'detalles-INITIAL_FORMS': '0',
+            'detalles-MIN_NUM_FORMS': '0', 'detalles-MAX_NUM_FORMS': '1000',
+            'detalles-0-producto': str(self.lapiz.pk), 'detalles-0-cantidad': '2', 'detalles-0-descuento_porcentaje': '0',
+        })
+
+    def test_reenvio_del_formulario_devuelve_la_misma_venta(self):
+        clave = uuid.uuid4()
+        primera = self.post_venta(clave)
+        segunda = self.post_venta(clave)
+
+        venta = Venta.objects.get()
+        self.assertRedirects(primera, reverse('ticket_venta', args=[venta.pk]), fetch_redirect_response=False)
+        self.assertRedirects(segunda, reverse('ticket_venta', args=[venta.pk]), fetch_redirect_response=False)
+        self.assertEqual(self.stock(self.lapiz), 8)  # se descontó una sola vez
+
+    def test_claves_distintas_son_ventas_distintas(self):
+        self.post_venta(uuid.uuid4())
+        self.post_venta(uuid.uuid4())
+        self.assertEqual(Venta.objects.count(), 2)
+
+    def test_lote_con_clave_ya_registrada_devuelve_la_venta_existente(self):
+        clave = str(uuid.uuid4())
+        [primera] = registrar_lote([self.venta((self.lapiz, 1), clave_idempotencia=clave)], self.caja)
+        # El mismo lote reenviado y, dentro de un lote, la clave repetida
+        resultados = registrar_lote([
+            self.venta((self.lapiz, 1), clave_idempotencia=clave),
+            self.venta((self.lapiz, 1), clave_idempotencia=clave),
+        ], self.caja)
+
+        self.assertTrue(primera['ok'])
+        for resultado in resultados:
+            self.assertEqual((resultado['venta'], resultado['duplicada']), (primera['venta'], True))
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(self.stock(self.lapiz), 9)
+
+
+class RegistrarLoteTests(VentasTestMixin, TestCase):
+    def test_una_venta_fallida_no_frena_las_demas(self):
+        resultados = registrar_lote([
+            self.venta((self.lapiz, 1)),
+            self.venta((self.lapiz, 1), (self.goma, 5)),  # no hay goma suficiente
+            'no es una venta',
+            self.venta((self.goma, 2)),
+        ], self.caja)
+
+        self.assertEqual([r['ok'] for r in resultados], [True, False, False, True])
+        self.assertEqual([r['indice'] for r in resultados], [0, 1, 2, 3])
+        self.assertIn('Goma', resultados[1]['error'])
+        self.assertEqual(Venta.objects.count(), 2)
+        # La venta fallida se deshizo entera, incluido el lápiz que sí tenía stock
+        self.assertEqual(self.stock(self.lapiz), 9)
+        self.assertEqual(self.stock(self.goma), 0)
+        self.assertEqual(DetalleVenta.objects.count(), 2)
+
+    def test_un_error_del_servidor_revierte_el_lote(self):
+        descontar_real = descontar_stock
+        llamadas = []
+
+        def se_cae_en_la_segunda(cantidades):
+            llamadas.append(cantidades)
+            if len(llamadas) == 2:
+                raise OperationalError("database is locked")
+            return descontar_real(cantidades)
+
+        with mock.patch('inventario.ventas.descontar_stock', side_effect=se_cae_en_la_segunda), \
+                self.assertRaises(OperationalError):
+            registrar_lote([self.venta((self.lapiz, 1)), self.venta((self.lapiz, 1))], self.caja)
+
+        self.assertFalse(Venta.objects.exists())
+        self.assertEqual(self.stock(self.lapiz), 10)
+
+    def test_clave_registrada_a_la_vez_por_otra_terminal(self):
+        clave = str(uuid.uuid4())
+        [primera] = registrar_lote([self.venta((self.lapiz, 1), clave_idempotencia=clave)], self.caja)
+        # Como si la otra terminal la hubiera grabado después de que este lote buscó las claves
+        with mock.patch('inventario.ventas._es_uuid', return_value=False):
+            [resultado] = registrar_lote([self.venta((self.lapiz, 1), clave_idempotencia=clave)], self.caja)
+
+        self.assertEqual((resultado['ok'], resultado['venta'], resultado['duplicada']), (True, primera['venta'], True))
+        self.assertEqual(self.stock(self.lapiz), 9)
+
+    def test_producto_inexistente_se_informa_en_su_venta(self):
+        [resultado] = registrar_lote([{'monto_efectivo': '100', 'lineas': [{'producto': 999999, 'cantidad': 1}]}], self.caja)
+        self.assertFalse(resultado['ok'])
+        self.assertIn('Línea 1', resultado['error'])
+
+    def test_fecha_de_la_venta_va_al_turno_de_ese_momento(self):
+        ahora = timezone.now()
+        CajaDiaria.objects.filter(pk=self.caja.pk).update(fecha_apertura=ahora - timedelta(hours=3))
+        en_papel = ahora - timedelta(hours=2)
+
+        resultados = registrar_lote([
+            self.venta((self.lapiz, 1), fecha=en_papel.isoformat()),
+            self.venta((self.lapiz, 1)),
+            self.venta((self.lapiz, 1), fecha=(ahora + timedelta(hours=1)).isoformat()),
+            self.venta((self.lapiz, 1), fecha=(ahora - timedelta(days=3)).isoformat()),  # sin turno abierto
+        ], self.caja)
+
+        self.assertEqual([r['ok'] for r in resultados], [True, True, False, False])
+        atrasada = Venta.objects.get(pk=resultados[0]['venta'])
+        self.assertEqual((atrasada.fecha, atrasada.caja_id), (en_papel, self.caja.pk))
+        self.assertEqual(Venta.objects.get(pk=resultados[1]['venta']).caja_id, self.caja.pk)
+        self.assertIn('posterior a ahora', resultados[2]['error'])
+        self.assertIn('turno', resultados[3]['error'])
+
+    def test_venta_de_un_turno_ya_cerrado_se_rechaza(self):
+        ahora = timezone.now()
+        anterior = CajaDiaria.objects.create(estado=False, saldo_final=Decimal('500'))
+        CajaDiaria.objects.filter(pk=anterior.pk).update(
+            fecha_apertura=ahora - timedelta(days=1, hours=8), fecha_cierre=ahora - timedelta(days=1),
+        )
+        CajaDiaria.objects.filter(pk=self.caja.pk).update(fecha_apertura=ahora - timedelta(hours=1))
+        arqueo = recalcular_contadores_caja(anterior)
+
+        resultados = registrar_lote([
+            self.venta((self.lapiz, 1), fecha=(ahora - timedelta(days=1, hours=2)).isoformat()),
+            self.venta((self.lapiz, 1)),
+        ], self.caja)
+        procesar_pendientes()
+
+        self.assertEqual([r['ok'] for r in resultados], [False, True])
+        self.assertIn('ya está cerrado', resultados[0]['error'])
+        self.assertFalse(Venta.objects.filter(caja=anterior).exists())
+        anterior.refresh_from_db()
+        self.assertEqual({campo: getattr(anterior, campo) for campo in arqueo}, arqueo)
+        self.assertEqual(anterior.saldo_final, Decimal('500'))
+        self.assertEqual(self.stock(self.lapiz), 9)
+
+
+class ContadoresCajaTests(VentasTestMixin, TestCase):
+    def test_las_ventas_suman_a_los_contadores_del_turno(self):
+        registrar_lote([
+            self.venta((self.lapiz, 2), monto_efectivo='200'),
+            self.venta((self.goma, 1), monto_efectivo='0', monto_mercadopago='50'),
+        ], self.caja)
+        procesar_pendientes()
+
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total_efectivo, Decimal('200'))
+        self.assertEqual(self.caja.total_mercadopago, Decimal('50'))
+        self.assertEqual(self.caja.total_unidades, 3)
+        self.assertEqual(self.caja.total_vendido, Decimal('250'))
+        # La fila coincide con lo que sale de recorrer ventas y asientos
+        recalculado = recalcular_contadores_caja(self.caja)
+        self.assertEqual({campo: getattr(self.caja, campo) for campo in recalculado}, recalculado)
+
+    def test_verificar_corrige_una_fila_desfasada(self):
+        registrar_lote([self.venta((self.lapiz, 1), monto_efectivo='100')], self.caja)
+        procesar_pendientes()
+        CajaDiaria.objects.filter(pk=self.caja.pk).update(total_efectivo=0, total_unidades=7)
+
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        respuesta = self.client.get(reverse('cerrar_caja'), {'verificar': 1})
+
+        self.caja.refresh_from_db()
+        self.assertEqual((self.caja.total_efectivo, self.caja.total_unidades), (Decimal('100'), 1))
+        self.assertContains(respuesta, 'Contadores corregidos')
+
+
+class OutboxTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Manejador de prueba que falla mientras self.falla sea True
+        self.falla = True
+        self.procesadas = []
+
+        def prueba(datos):
+            if self.falla:
+                raise ValueError("falla de prueba")
+            self.procesadas.extend(datos)
+
+        outbox.manejador('prueba')(prueba)
+        self.addCleanup(outbox._manejadores.pop, 'prueba')
+
+    def test_la_venta_deja_sus_asientos_en_el_outbox(self):
+        [resultado] = registrar_lote([self.venta((self.lapiz, 2), monto_efectivo='200')], self.caja)
+
+        self.assertEqual(TareaPendiente.objects.count(), 1)
+        self.assertFalse(Asiento.objects.exists())
+        self.assertEqual(procesar_pendientes(), (1, 0))
+
+        self.assertFalse(TareaPendiente.objects.exists())
+        venta = Asiento.objects.get(descripcion__startswith=f"Venta #{resultado['venta']}")
+        costo = Asiento.objects.get(descripcion__startswith=f"Costo por Venta #{resultado['venta']}")
+        self.assertEqual((venta.total_debe(), venta.total_haber()), (Decimal('200'), Decimal('200')))
+        self.assertEqual(costo.total_debe(), Decimal('80'))
+        self.assertEqual(venta.caja_id, self.caja.pk)
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.saldo_sistema, Decimal('200'))
+
+    def test_una_fila_que_falla_no_frena_al_resto(self):
+        registrar_lote([self.venta((self.lapiz, 1))], self.caja)
+        mala = TareaPendiente.objects.create(tareas=[{'tipo': 'prueba', 'datos': 1}])
+        registrar_lote([self.venta((self.lapiz, 1))], self.caja)
+
+        self.assertEqual(procesar_pendientes(), (2, 1))
+
+        self.assertEqual(list(TareaPendiente.objects.values_list('pk', flat=True)), [mala.pk])
+        mala.refresh_from_db()
+        self.assertEqual((mala.intentos, mala.ultimo_error, mala.token), (1, 'falla de prueba', None))
+        self.assertEqual(Asiento.objects.filter(descripcion__startswith='Venta #').count(), 2)
+
+    def test_trabada_tras_max_intentos_y_reencolada_por_comando(self):
+        trabada = TareaPendiente.objects.create(tareas=[{'tipo': 'prueba', 'datos': 7}])
+        for _ in range(MAX_INTENTOS):
+            procesar_pendientes()
+        self.assertEqual(procesar_pendientes(), (0, 0))  # ya no se reintenta sola
+        self.assertEqual(contar_pendientes(), (0, 1))
+
+        self.falla = False  # corregida la causa
+        call_command('procesar_pendientes', reencolar=True, stdout=StringIO(), stderr=StringIO())
+
+        self.assertFalse(TareaPendiente.objects.filter(pk=trabada.pk).exists())
+        self.assertEqual(self.procesadas, [7])
+
+    def test_los_reportes_avisan_y_no_procesan_el_outbox(self):
+        registrar_lote([self.venta((self.lapiz, 1))], self.caja)
+        TareaPendiente.objects.create(tareas=[{'tipo': 'prueba', 'datos': 1}], intentos=MAX_INTENTOS)
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+
+        for url in (reverse('libro_diario'), reverse('balance_sumas_saldos'), reverse('cerrar_caja')):
+            respuesta = self.client.get(url)
+            self.assertContains(respuesta, '1 venta(s) con asientos pendientes de registrar')
+            self.assertContains(respuesta, 'errores repetidos')
+        self.assertEqual(TareaPendiente.objects.count(), 2)
+        self.assertFalse(Asiento.objects.exists())
+
+        # El cierre asienta la venta pendiente, pero con una trabada el saldo sigue incompleto: no se cierra
+        self.client.post(reverse('cerrar_caja'), {'monto_real': '100'})
+        self.caja.refresh_from_db()
+        self.assertTrue(self.caja.estado)
+        self.assertEqual(TareaPendiente.objects.count(), 1)
+        self.assertEqual(self.caja.saldo_sistema, Decimal('100'))
+
+    def test_el_cierre_de_caja_asienta_lo_pendiente(self):
+        registrar_lote([self.venta((self.lapiz, 2), monto_efectivo='200')], self.caja)
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+
+        respuesta = self.client.post(reverse('cerrar_caja'), {'monto_real': '200'})
+
+        self.assertRedirects(respuesta, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertFalse(TareaPendiente.objects.exists())
+        self.caja.refresh_from_db()
+        self.assertFalse(self.caja.estado)
+        self.assertEqual((self.caja.saldo_sistema, self.caja.saldo_final), (Decimal('200'), Decimal('200')))
+
+    def test_el_cierre_de_ejercicio_espera_a_las_trabadas_pero_la_simulacion_no(self):
+        registrar_lote([self.venta((self.lapiz, 1), monto_efectivo='100')], self.caja)
+        TareaPendiente.objects.create(tareas=[{'tipo': 'prueba', 'datos': 1}], intentos=MAX_INTENTOS)
+        self.client.force_login(User.objects.create_user('contador', password='x'))
+
+        simulacion = self.client.post(reverse('generar_cierre'), {'simular': '1'})
+        self.assertContains(simulacion, 'Todavía no se grabó nada')
+        self.assertContains(simulacion, '1 venta(s) con asientos pendientes de registrar')
+        self.assertEqual(TareaPendiente.objects.count(), 2)
+        self.assertFalse(Asiento.objects.exists())
+
+        self.client.post(reverse('generar_cierre'))
+        # La venta se asentó, pero la trabada frena el cierre
+        self.assertEqual(TareaPendiente.objects.count(), 1)
+        self.assertTrue(Asiento.objects.filter(descripcion__startswith='Venta #').exists())
+        self.assertFalse(Asiento.objects.filter(tipo='REFUNDICION').exists())
+
+        TareaPendiente.objects.all().delete()
+        self.client.post(reverse('generar_cierre'))
+        self.assertTrue(Asiento.objects.filter(tipo='REFUNDICION').exists())
+
+
+class RegistrarAsientosTests(VentasTestMixin, TestCase):
+    def asiento(self, fecha, debe, haber, descripcion='Prueba'):
+        return armar_asiento(descripcion, [
+            (plan_cuentas.por_codigo('1.02'), debe, 0),
+            (plan_cuentas.por_codigo('2.01'), 0, haber),
+        ], fecha=fecha)
+
+    def test_un_asiento_desbalanceado_rechaza_todo_el_lote(self):
+        lote = [self.asiento(date(2025, 3, 1), 100, 100), self.asiento(date(2025, 3, 2), 100, 90, 'Mal')]
+
+        with self.assertRaisesMessage(AsientoDesbalanceado, "'Mal' no balancea"):
+            registrar_asientos(lote)
+        with self.assertRaises(AsientoDesbalanceado):
+            registrar_asientos([armar_asiento('Vacío', [])])
+
+        self.assertFalse(Asiento.objects.exists())
+        self.assertFalse(SaldoCuenta.objects.exists())
+
+    def test_el_lote_cuesta_lo_mismo_sin_importar_cuantos_asientos(self):
+        registrar_asientos([self.asiento(date(2025, 3, 1), 1, 1)])  # crea las filas de SaldoCuenta del mes
+        consultas = []
+        for cantidad in (1, 5):
+            with CaptureQueriesContext(connection) as capturadas:
+                creados = registrar_asientos([self.asiento(date(2025, 3, 2), n, n) for n in range(1, cantidad + 1)])
+            consultas.append(len(capturadas))
+            self.assertTrue(all(asiento.pk for asiento in creados))
+        self.assertEqual(consultas[0], consultas[1])
+
+        ultimos = Asiento.objects.order_by('-id')[:5]
+        self.assertEqual([a.items.count() for a in ultimos], [2] * 5)
+        self.assertEqual(sorted(a.total_debe() for a in ultimos), [1, 2, 3, 4, 5])
+
+    def test_avisa_el_alta_de_cada_asiento_a_los_receptores_de_post_save(self):
+        recibidos = []
+
+        def receptor(sender, instance, created, **kwargs):
+            recibidos.append((instance.pk, created))
+
+        post_save.connect(receptor, sender=Asiento)
+        self.addCleanup(post_save.disconnect, receptor, sender=Asiento)
+        creados = registrar_asientos([self.asiento(date(2025, 3, 1), 5, 5), self.asiento(date(2025, 3, 2), 6, 6)])
+
+        self.assertEqual(recibidos, [(asiento.pk, True) for asiento in creados])
+
+    def test_saldo_cuenta_acompaña_a_los_renglones(self):
+        registrar_asientos([
+            self.asiento(date(2025, 3, 5), 100, 100),
+            self.asiento(date(2025, 3, 28), 40, 40),
+            self.asiento(date(2025, 4, 2), 7, 7),
+        ])
+        registrar_asientos([self.asiento(date(2025, 4, 30), 3, 3)])
+
+        mercaderias = plan_cuentas.por_codigo('1.02')
+        marzo = SaldoCuenta.objects.get(cuenta=mercaderias, periodo=date(2025, 3, 1))
+        self.assertEqual((marzo.debe, marzo.haber), (Decimal('140'), Decimal('0')))
+        self.assertEqual(saldos_por_cuenta(), sumas_por_cuenta())
+        self.assertEqual(saldos_por_cuenta(desde=date(2025, 4, 1)), sumas_por_cuenta(desde=date(2025, 4, 1)))
+
+        # Reconstruir desde los renglones da lo mismo que lo mantenido en cada registro
+        mantenido = set(SaldoCuenta.objects.values_list('cuenta', 'periodo', 'debe', 'haber'))
+        self.assertEqual(reconstruir_saldos(), len(mantenido))
+        self.assertEqual(set(SaldoCuenta.objects.values_list('cuenta', 'periodo', 'debe', 'haber')), mantenido)
+        self.assertEqual(ItemAsiento.objects.count(), 8)
+
+
+class ProductoPorCodigoTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        Producto.objects.filter(pk=self.lapiz.pk).update(codigo_barras='7790001', marca='Faber')
+
+    def test_devuelve_los_datos_actuales_del_producto(self):
+        url = reverse('producto_por_codigo', args=['7790001'])
+        self.assertEqual(self.client.get(url).json(), {'id': self.lapiz.pk, 'nombre': 'Lápiz (Faber)', 'precio': 100.0, 'stock': 10})
+
+        # Editado con update() (como haría otro proceso o una venta): la lectora lo ve en el acto
+        Producto.objects.filter(pk=self.lapiz.pk).update(precio=Decimal('120'), stock_actual=4)
+        with self.assertNumQueries(3):  # sesión, usuario y el producto
+            datos = self.client.get(url).json()
+        self.assertEqual((datos['precio'], datos['stock']), (120.0, 4))
+
+    def test_codigo_inexistente_es_404(self):
+        respuesta = self.client.get(reverse('producto_por_codigo', args=['000']))
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class VentaDiariaTests(VentasTestMixin, TestCase):
+    def por_group_by(self):
+        """El acumulado calculado en el momento sobre Venta y DetalleVenta."""
+        dias = {
+            fila.pop('dia'): fila for fila in
+            Venta.objects.annotate(dia=TruncDate('fecha')).values('dia').annotate(
+                cantidad_tickets=Count('id'), total=Sum('total'), efectivo=Sum('monto_efectivo'),
+                mercadopago=Sum('monto_mercadopago'), vuelto=Sum('vuelto'),
+            ).order_by()
+        }
+        for fila in DetalleVenta.objects.annotate(dia=TruncDate('venta__fecha')).values('dia') \
+                .annotate(unidades=Sum('cantidad')).order_by():
+            dias[fila['dia']]['unidades'] = fila['unidades']
+        return dias
+
+    def acumulado(self):
+        return {
+            fila.pop('fecha'): fila for fila in
+            VentaDiaria.objects.values('fecha', 'cantidad_tickets', 'total', 'efectivo', 'mercadopago', 'vuelto', 'unidades')
+        }
+
+    def test_coincide_con_un_group_by_sobre_las_ventas(self):
+        ahora = timezone.now()
+        CajaDiaria.objects.filter(pk=self.caja.pk).update(fecha_apertura=ahora - timedelta(days=2))
+        self.lapiz.stock_actual = 100
+        self.lapiz.save()
+        resultados = registrar_lote([
+            self.venta((self.lapiz, 2), monto_efectivo='250'),
+            self.venta((self.lapiz, 1), (self.goma, 1), monto_efectivo='0', monto_mercadopago='150'),
+            self.venta((self.lapiz, 3), fecha=(ahora - timedelta(days=1)).isoformat()),
+        ], self.caja)
+        self.assertTrue(all(r['ok'] for r in resultados))
+        self.assertEqual(len(self.acumulado()), 2)
+        self.assertEqual(self.acumulado(), self.por_group_by())
+
+        # Editadas o borradas por fuera de registrar_venta: el comando las vuelve a alinear
+        Venta.objects.filter(pk=resultados[0]['venta']).update(total=Decimal('180'), vuelto=Decimal('70'))
+        Venta.objects.filter(pk=resultados[2]['venta']).delete()
+        self.assertNotEqual(self.acumulado(), self.por_group_by())
+        call_command('reconstruir_ventas_diarias', stdout=StringIO())
+        self.assertEqual(len(self.acumulado()), 1)
+        self.assertEqual(self.acumulado(), self.por_group_by())
+
+    def test_fecha_inexistente_es_un_error_del_comando(self):
+        for valor in ('2024-13-01', 'ayer'):
+            with self.assertRaisesMessage(CommandError, f"Fecha inválida para --desde: {valor}"):
+                call_command('reconstruir_ventas_diarias', desde=valor, stdout=StringIO())
+
+
+@mock.patch('inventario.views.VENTAS_POR_PAGINA', 2)
+class VentaListTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        ahora = timezone.now()
+        # Tres ventas en el mismo instante: el id desempata dentro de la misma fecha
+        fechas = [ahora - timedelta(days=1), ahora, ahora, ahora, ahora - timedelta(days=2)]
+        self.ventas = [Venta.objects.create(fecha=fecha, total=Decimal('10'), caja=self.caja) for fecha in fechas]
+
+    def test_el_cursor_recorre_todas_las_ventas_una_vez(self):
+        vistas, url = [], reverse('venta_list')
+        while url:
+            respuesta = self.client.get(url)
+            vistas.extend(venta.pk for venta in respuesta.context['ventas'])
+            siguiente = respuesta.context['pagina_siguiente']
+            url = f"{reverse('venta_list')}?{siguiente}" if siguiente else None
+
+        esperadas = [v.pk for v in sorted(self.ventas, key=lambda v: (v.fecha, v.pk), reverse=True)]
+        self.assertEqual(vistas, esperadas)
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        primera = [v.pk for v in self.client.get(reverse('venta_list')).context['ventas']]
+        for cursor in ('basura', 'WyJubyBlcyBmZWNoYSIsIDFd'):  # no es base64 JSON / fecha inválida
+            respuesta = self.client.get(reverse('venta_list'), {'cursor': cursor})
+            self.assertEqual([v.pk for v in respuesta.context['ventas']], primera)
+            self.assertContains(respuesta, 'El enlace de paginación no es válido')
+
+    def test_fechas_mal_escritas_no_filtran(self):
+        for inicio, fin in (('2024-13-01', '2024-12-31'), ('ayer', 'hoy')):
+            respuesta = self.client.get(reverse('venta_list'), {'fecha_inicio': inicio, 'fecha_fin': fin})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.context['fecha_inicio'], '')
+
+
+class BalanceSumasSaldosTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        mercaderias, proveedores, ventas = (plan_cuentas.por_codigo(c) for c in ('1.02', '2.01', '4.01'))
+        asientos = []
+        # Movimientos en las puntas de cada mes y en el medio, de diciembre a abril
+        for numero, fecha in enumerate([date(2024, 12, 31), date(2025, 1, 1), date(2025, 1, 10), date(2025, 1, 31),
+                                         date(2025, 2, 1), date(2025, 2, 14), date(2025, 2, 28), date(2025, 3, 1),
+                                         date(2025, 3, 15), date(2025, 3, 31), date(2025, 4, 1), date(2025, 4, 20)], start=1):
+            asientos.append(armar_asiento(f"Compra {numero}", [(mercaderias, numero * 10, 0), (proveedores, 0, numero * 10)], fecha=fecha))
+            asientos.append(armar_asiento(f"Venta {numero}", [(proveedores, numero, 0), (ventas, 0, numero)], fecha=fecha))
+        registrar_asientos(asientos)
+
+    def por_renglones(self, desde, hasta):
+        """Las sumas directo de los renglones, sin SaldoCuenta."""
+        return {
+            fila['cuenta']: (fila['debe'], fila['haber']) for fila in
+            ItemAsiento.objects.filter(asiento__fecha__range=[desde, hasta]).values('cuenta')
+            .annotate(debe=Sum('debe'), haber=Sum('haber')).order_by()
+        }
+
+    def balance(self, desde, hasta):
+        filas, totales = balance_sumas_y_saldos(desde, hasta)
+        return {fila['cuenta'].id: (fila['debe'], fila['haber']) for fila in filas}, totales
+
+    def test_coincide_con_sumar_los_renglones(self):
+        rangos = [
+            (date(2025, 1, 10), date(2025, 4, 12)),  # empieza y termina a mitad de mes
+            (date(2025, 2, 1), date(2025, 3, 31)),   # meses completos
+            (date(2025, 1, 31), date(2025, 3, 1)),   # un día de cada punta
+            (date(2025, 2, 15), date(2025, 2, 20)),  # dentro de un mes
+            (date(2024, 12, 2), date(2025, 2, 28)),
+        ]
+        for desde, hasta in rangos:
+            with self.subTest(desde=desde, hasta=hasta):
+                sumas, totales = self.balance(desde, hasta)
+                self.assertEqual(sumas, self.por_renglones(desde, hasta))
+                self.assertEqual(totales['debe'], totales['haber'])
+
+    def test_los_meses_completos_salen_de_saldo_cuenta(self):
+        mercaderias = plan_cuentas.por_codigo('1.02')
+        # Se desfasa febrero a propósito: solo se nota cuando el rango lo cubre entero
+        SaldoCuenta.objects.filter(cuenta=mercaderias, periodo=date(2025, 2, 1)).update(debe=0)
+
+        completo, _ = self.balance(date(2025, 1, 15), date(2025, 3, 10))
+        esperado = self.por_renglones(date(2025, 1, 15), date(2025, 3, 10))[mercaderias.id][0] - Decimal(50 + 60 + 70)
+        self.assertEqual(completo[mercaderias.id][0], esperado)
+
+        parcial, _ = self.balance(date(2025, 2, 1), date(2025, 2, 27))
+        self.assertEqual(parcial[mercaderias.id], self.por_renglones(date(2025, 2, 1), date(2025, 2, 27))[mercaderias.id])
+
+
+class CierreEjercicioTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('contador', password='x'))
+        caja, mercaderias, ventas, cmv = (plan_cuentas.por_codigo(c) for c in ('1.01', '1.02', '4.01', '5.01'))
+        registrar_asientos([
+            armar_asiento('Venta', [(caja, 500, 0), (ventas, 0, 500)]),
+            armar_asiento('Costo', [(cmv, 200, 0), (mercaderias, 0, 200)]),
+        ])
+
+    def contenido(self):
+        return [
+            (Asiento.objects.count(), ItemAsiento.objects.count()),
+            list(SaldoCuenta.objects.values_list('cuenta', 'periodo', 'debe', 'haber')),
+        ]
+
+    @staticmethod
+    def renglones(asientos):
+        return [
+            (asiento.descripcion, asiento.tipo, sorted((item.cuenta_id, item.debe, item.haber) for item in items))
+            for asiento, items in asientos
+        ]
+
+    def test_la_simulacion_no_graba_y_muestra_lo_mismo_que_el_cierre(self):
+        antes = self.contenido()
+        simulacion = self.client.post(reverse('generar_cierre'), {'simular': '1'})
+        self.assertEqual(self.contenido(), antes)
+        previstos = self.renglones(simulacion.context['asientos'])
+
+        self.client.post(reverse('generar_cierre'))
+
+        registrados = Asiento.objects.filter(tipo__in=['REFUNDICION', 'NORMAL'], descripcion__in=[
+            'Refundición de Cuentas de Resultado', 'Traslado a Resultados Acumulados',
+        ]).order_by('id').prefetch_related('items')
+        self.assertEqual(self.renglones((asiento, asiento.items.all()) for asiento in registrados), previstos)
+        self.assertEqual(len(previstos), 2)
+        # Cuentas de resultado en cero y la ganancia en Resultados Acumulados
+        saldos = saldos_por_cuenta()
+        for codigo in ('4.01', '5.01', '3.02'):
+            debe, haber = saldos[plan_cuentas.por_codigo(codigo).id]
+            self.assertEqual(debe, haber)
+        self.assertEqual(saldos[plan_cuentas.por_codigo('3.03').id], (0, Decimal('300')))
+
+
+class CatalogoPreciosTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        self.url = reverse('catalogo_precios')
+
+    def test_304_si_el_navegador_tiene_la_version_actual(self):
+        primera = self.client.get(self.url)
+        self.assertEqual(primera.json()['precios'], {str(self.lapiz.pk): 100.0, str(self.goma.pk): 50.0})
+
+        repetida = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida.content, b'')
+
+    def test_editar_un_precio_cambia_la_version(self):
+        primera = self.client.get(self.url)
+        self.goma.precio = Decimal('55')
+        self.goma.save()
+
+        segunda = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertNotEqual(segunda['ETag'], primera['ETag'])
+        self.assertGreater(segunda.json()['version'], primera.json()['version'])
+        self.assertEqual(segunda.json()['precios'][str(self.goma.pk)], 55.0)
+
+    def test_modo_delta_solo_manda_lo_modificado(self):
+        version = self.client.get(self.url).json()['version']
+        self.goma.precio = Decimal('60')
+        self.goma.save()
+        nuevo = Producto.objects.create(nombre='Regla', precio=Decimal('30'))
+
+        datos = self.client.get(self.url, {'desde': version}).json()
+        self.assertFalse(datos['completo'])
+        self.assertEqual(datos['precios'], {str(self.goma.pk): 60.0, str(nuevo.pk): 30.0})
+        self.assertEqual(datos['total'], 3)
+
+        # Una versión que no es un número pide el catálogo completo
+        self.assertTrue(self.client.get(self.url, {'desde': 'x'}).json()['completo'])
+
+
+class NuevaVentaConsultasTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        self.productos = [self.lapiz, self.goma] + [
+            Producto.objects.create(nombre=f"Producto {n}", precio=Decimal('10'), precio_costo=Decimal('4'), stock_actual=10)
+            for n in range(3)
+        ]
+
+    def datos(self, productos):
+        datos = {
+            'cliente': '', 'monto_efectivo': '1000', 'monto_mercadopago': '0', 'monto_transferencia': '0',
+            'descuento_global': '0', 'descuento_global_porcentaje': '0', 'clave_idempotencia': str(uuid.uuid4()),
+            'detalles-TOTAL_FORMS': str(len(productos)), 'detalles-INITIAL_FORMS': '0',
+            'detalles-MIN_NUM_FORMS': '0', 'detalles-MAX_NUM_FORMS': '1000',
+        }
+        for i, producto in enumerate(productos):
+            datos.update({f'detalles-{i}-producto': str(producto.pk), f'detalles-{i}-cantidad': '1',
+                          f'detalles-{i}-descuento_porcentaje': '0'})
+        return datos
+
+    def test_el_formset_valida_con_una_sola_consulta(self):
+        for cantidad in (1, len(self.productos)):
+            with self.subTest(lineas=cantidad), self.assertNumQueries(1):  # el in_bulk de los productos
+                self.assertTrue(DetalleVentaFormSet(self.datos(self.productos[:cantidad])).is_valid())
+
+    def test_la_venta_cuesta_lo_mismo_con_una_linea_que_con_varias(self):
+        # La primera venta además carga el plan de cuentas y crea la fila del día en VentaDiaria
+        self.client.post(reverse('nueva_venta'), self.datos(self.productos[:1]))
+        for cantidad in (1, len(self.productos)):
+            # sesión, usuario, caja, clave, productos; venta, stock, detalles, día, caja, outbox y 4 de savepoints
+            with self.subTest(lineas=cantidad), self.assertNumQueries(15):
+                respuesta = self.client.post(reverse('nueva_venta'), self.datos(self.productos[:cantidad]))
+            self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(DetalleVenta.objects.count(), 2 + len(self.productos))
+
+
+class PlanDeCuentasTests(VentasTestMixin, TestCase):
+    def test_en_este_proceso_las_señales_lo_mantienen_al_dia(self):
+        self.assertEqual(plan_cuentas.por_codigo('4.01').nombre, 'Ventas')
+        cuenta = Cuenta.objects.get(codigo='4.01')
+        cuenta.nombre = 'Ventas de mostrador'
+        cuenta.save()
+        with self.assertNumQueries(1):  # la recarga que provocó la señal, después nada
+            self.assertEqual(plan_cuentas.por_codigo('4.01').nombre, 'Ventas de mostrador')
+            self.assertEqual(plan_cuentas.por_nombre('Ventas de mostrador').codigo, '4.01')
+
+    def test_lo_editado_en_otro_proceso_llega_al_vencer(self):
+        plan_cuentas.por_codigo('1.01')
+        # update() no dispara señales: es lo que ve este proceso cuando la edita otro
+        Cuenta.objects.filter(codigo='3.03').update(tipo='INGRESO')
+        self.assertNotIn('3.03', [c.codigo for c in plan_cuentas.por_tipo('INGRESO')])
+
+        despues = time.monotonic() + contabilidad.PLAN_CUENTAS_VIGENCIA + 1
+        with mock.patch.object(contabilidad.time, 'monotonic', return_value=despues):
+            self.assertIn('3.03', [c.codigo for c in plan_cuentas.por_tipo('INGRESO')])
+
+    def test_el_cierre_lee_el_plan_de_la_base(self):
+        plan_cuentas.por_codigo('1.01')
+        otros = Cuenta.objects.bulk_create([Cuenta(codigo='4.02', nombre='Otros ingresos', tipo='INGRESO')])
+        registrar_asientos([armar_asiento('Intereses', [(plan_cuentas.por_codigo('1.01'), 70, 0), (otros[0], 0, 70)])])
+
+        [refundicion, _] = armar_cierre_ejercicio()
+        self.assertIn((otros[0].id, Decimal('70'), 0), [(i.cuenta.id, i.debe, i.haber) for i in refundicion[1]])
+
+
+class ProductoBuscarTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        # Nombres repetidos: el id desempata el cursor
+        for nombre, marca in [('Cuaderno', 'Rivadavia'), ('Cuaderno', 'Gloria'), ('Cuaderno', None), ('Carpeta', None)]:
+            Producto.objects.create(nombre=nombre, marca=marca, precio=Decimal('10'))
+
+    def paginas(self, **parametros):
+        resultados, cursor = [], None
+        while True:
+            datos = self.client.get(reverse('producto_buscar'), {**parametros, **({'cursor': cursor} if cursor else {})}).json()
+            resultados.append([r['text'] for r in datos['results']])
+            if not datos['pagination']['more']:
+                return resultados
+            cursor = datos['cursor']
+
+    def test_el_cursor_recorre_todo_sin_repetir(self):
+        self.assertEqual(self.paginas(limit=2), [
+            ['Carpeta', 'Cuaderno (Rivadavia)'], ['Cuaderno (Gloria)', 'Cuaderno'], ['Goma', 'Lápiz'],
+        ])
+
+    def test_busca_por_nombre_o_marca(self):
+        self.assertEqual(self.paginas(q='cuad', limit=2), [['Cuaderno (Rivadavia)', 'Cuaderno (Gloria)'], ['Cuaderno']])
+        self.assertEqual(self.paginas(q='glor'), [['Cuaderno (Gloria)']])
+
+    def test_cursor_invalido_es_400(self):
+        respuesta = self.client.get(reverse('producto_buscar'), {'cursor': 'basura'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class VentasPorTurnoTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+
+    def vender(self, producto, cantidad):
+        return self.client.post(reverse('nueva_venta'), {
+            'cliente': '', 'monto_efectivo': '1000', 'monto_mercadopago': '0', 'monto_transferencia': '0',
+            'descuento_global': '0', 'descuento_global_porcentaje': '0', 'clave_idempotencia': str(uuid.uuid4()),
+            'detalles-TOTAL_FORMS': '1', 'detalles-INITIAL_FORMS': '0',
+            'detalles-MIN_NUM_FORMS': '0', 'detalles-MAX_NUM_FORMS': '1000',
+            'detalles-0-producto': str(producto.pk), 'detalles-0-cantidad': str(cantidad), 'detalles-0-descuento_porcentaje': '0',
+        })
+
+    def test_cada_venta_queda_en_el_turno_abierto(self):
+        self.vender(self.lapiz, 2)
+        self.client.post(reverse('cerrar_caja'), {'monto_real': '200'})
+        self.client.post(reverse('abrir_caja'), {'saldo_inicial': '0'})
+        segunda = CajaDiaria.objects.get(estado=True)
+        self.vender(self.goma, 1)
+        self.vender(self.lapiz, 1)
+
+        self.assertEqual(self.caja.ventas.count(), 1)
+        self.assertEqual(segunda.ventas.count(), 2)
+
+        detalle = self.client.get(reverse('caja_detalle', args=[self.caja.pk]))
+        self.assertEqual([v.pk for v in detalle.context['ventas']], list(self.caja.ventas.values_list('pk', flat=True)))
+        self.assertEqual(
+            list(detalle.context['productos_vendidos'].values_list('producto__nombre', 'cantidad_total')),
+            [('Lápiz', 2)],
+        )
+        cierre = self.client.get(reverse('cerrar_caja'))
+        self.assertEqual(
+            sorted(cierre.context['productos_vendidos'].values_list('producto__nombre', 'cantidad_total')),
+            [('Goma', 1), ('Lápiz', 1)],
+        )
+
+
+@mock.patch('inventario.views.ASIENTOS_POR_PAGINA', 2)
+class LibroDiarioTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('contador', password='x'))
+        mercaderias, proveedores = plan_cuentas.por_codigo('1.02'), plan_cuentas.por_codigo('2.01')
+        registrar_asientos([
+            armar_asiento(f"Compra {dia}", [(mercaderias, dia, 0), (proveedores, 0, dia)], fecha=date(2025, 3, dia))
+            for dia in (1, 5, 10, 20, 31)
+        ])
+
+    def test_filtra_por_fechas_y_totaliza_el_rango_completo(self):
+        respuesta = self.client.get(reverse('libro_diario'), {'fecha_inicio': '2025-03-05', 'fecha_fin': '2025-03-20'})
+
+        self.assertEqual([a.descripcion for a in respuesta.context['asientos']], ['Compra 20', 'Compra 10'])
+        self.assertEqual(respuesta.context['pagina'].paginator.count, 3)
+        self.assertEqual((respuesta.context['total_debe'], respuesta.context['total_haber']), (35, 35))
+
+        siguiente = self.client.get(reverse('libro_diario'), {
+            'fecha_inicio': '2025-03-05', 'fecha_fin': '2025-03-20', 'page': 2,
+        })
+        self.assertEqual([a.descripcion for a in siguiente.context['asientos']], ['Compra 5'])
+
+    def test_la_pagina_trae_renglones_y_sumas_sin_consultas_por_asiento(self):
+        respuesta = self.client.get(reverse('libro_diario'))
+        asientos = list(respuesta.context['asientos'])
+        with self.assertNumQueries(0):
+            self.assertEqual([(a.total_debe(), sorted(i.cuenta.codigo for i in a.items.all())) for a in asientos],
+                             [(31, ['1.02', '2.01']), (20, ['1.02', '2.01'])])
+
+
+class ExportarCsvTests(VentasTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('contador', password='x'))
+
+    def leer(self, respuesta):
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('\ufeff'))
+        return list(csv.reader(StringIO(contenido[1:])))
+
+    def test_asientos_del_rango(self):
+        mercaderias, proveedores = plan_cuentas.por_codigo('1.02'), plan_cuentas.por_codigo('2.01')
+        registrar_asientos([
+            armar_asiento('Compra, con coma', [(mercaderias, 100, 0), (proveedores, 0, 100)], fecha=date(2025, 3, 5)),
+            armar_asiento('Fuera del rango', [(mercaderias, 7, 0), (proveedores, 0, 7)], fecha=date(2025, 4, 1)),
+        ])
+
+        respuesta = self.client.get(reverse('exportar_asientos'), {'fecha_inicio': '2025-03-01', 'fecha_fin': '2025-03-31'})
+
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="asientos_2025-03-01_2025-03-31.csv"')
+        encabezado, *filas = self.leer(respuesta)
+        self.assertEqual(encabezado, ['Fecha', 'Asiento', 'Tipo', 'Descripción', 'Código', 'Cuenta', 'Debe', 'Haber'])
+        asiento = str(Asiento.objects.get(descripcion='Compra, con coma').pk)
+        self.assertEqual(filas, [
+            ['05/03/2025', asiento, 'NORMAL', 'Compra, con coma', '1.02', 'Mercaderías', '100.00', '0.00'],
+            ['05/03/2025', asiento, 'NORMAL', 'Compra, con coma', '2.01', 'Proveedores', '0.00', '100.00'],
+        ])
+
+    def test_ventas_con_sus_renglones(self):
+        [resultado] = registrar_lote([self.venta((self.lapiz, 2), (self.goma, 1), monto_efectivo='250')], self.caja)
+        hoy = timezone.localdate().isoformat()
+
+        encabezado, *filas = self.leer(self.client.get(reverse('exportar_ventas'), {'fecha_inicio': hoy, 'fecha_fin': hoy}))
 
-# Create your tests here.
+        self.assertEqual(len(encabezado), 13)
+        self.assertEqual([(f[1], f[2], f[4], f[5], f[8], f[9]) for f in filas], [
+            (str(resultado['venta']), 'Consumidor Final', 'Lápiz', '2', '200.00', '250.00'),
+            (str(resultado['venta']), 'Consumidor Final', 'Goma', '1', '50.00', '250.00'),
+        ])
@@ -0,0 +1,399 @@
+import uuid
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Producto, Venta, DetalleVenta, Cuenta, ItemAsiento, VentaDiaria, CajaDiaria
+from .forms import VentaForm
+from .carrito import Carrito, CarritoInvalido, LineaCarrito
+from .contabilidad import plan_cuentas, armar_asiento, registrar_asientos, AsientoDesbalanceado, CODIGO_CAJA
+from .stock import descontar_stock
+from .outbox import lote, encolar, manejador, procesar_pendientes
+
+
+def registrar_venta(venta, carrito):
+    """
+    Registra una venta completa: cabecera, stock, detalles y acumulados. Los
+    asientos y la auditoría van en una sola fila del outbox (TareaPendiente)
+    que se procesa aparte; ver asentar_ventas().
+
+    `venta` es la cabecera SIN guardar (cliente, pagos, descuentos globales y
+    caja del turno ya cargados) y `carrito` un Carrito con sus líneas. Corre en su propio
+    transaction.atomic(): si falta stock (CarritoInvalido) o las cuentas no
+    están configuradas (Cuenta.DoesNotExist) no queda nada grabado.
+    """
+    with transaction.atomic(), lote():
+
+        # ======================
+        # CABECERA (totales ya calculados: un solo INSERT)
+        # ======================
+        total_final = carrito.total(venta.descuento_global_porcentaje, venta.descuento_global)
+        total_costo = carrito.costo
+        venta.total = total_final
+
+        # =====================================================
+        # VUELTO
+        # =====================================================
+        total_pagado = (
+            (venta.monto_efectivo or 0) +
+            (venta.monto_mercadopago or 0) +
+            (venta.monto_transferencia or 0)
+        )
+
+        venta.vuelto = total_pagado - total_final
+        venta.save()
+
+        # =====================================================
+        # DESCONTAR STOCK (un UPDATE condicional para todo el carrito)
+        # =====================================================
+        fallidos = descontar_stock(carrito.cantidades())
+        if fallidos:
+            nombres = ", ".join(
+                f"{linea.producto.nombre} (quedan {fallidos[linea.producto.pk]})"
+                for linea in carrito.lineas if linea.producto.pk in fallidos
+            )
+            raise CarritoInvalido(f"No hay stock suficiente de {nombres}")
+
+        # =====================================================
+        # DETALLES DE VENTA (un solo INSERT)
+        # =====================================================
+        DetalleVenta.objects.bulk_create(carrito.detalles(venta))
+
+        # =====================================================
+        # ASIENTOS CONTABLES — VENTA Y COSTO (diferidos al outbox)
+        # =====================================================
+        # Las cuentas se validan ahora (en memoria) para no aceptar una venta que después no se pueda asentar
+        for codigo in (CODIGO_CAJA, '4.01', '5.01', '1.02'):
+            plan_cuentas.por_codigo(codigo)
+        encolar('asientos_venta', {
+            'venta': venta.id,
+            'cliente': str(venta.cliente or 'Consumidor Final'),
+            'fecha': timezone.localdate(venta.fecha).isoformat(),
+            'total': str(total_final),
+            'costo': str(total_costo),
+            'caja': venta.caja_id,  # el turno de la venta, aunque el outbox asiente después del cierre
+        })
+
+        # =====================================================
+        # ACUMULADO DEL DÍA (reportes leen VentaDiaria, no las ventas sueltas)
+        # =====================================================
+        acumular_venta_diaria(venta, carrito)
+
+        # =====================================================
+        # CONTADORES DEL TURNO DE CAJA (el debe de Caja lo suma registrar_asientos al asentar)
+        # =====================================================
+        CajaDiaria.objects.filter(pk=venta.caja_id).update(
+            total_efectivo=F('total_efectivo') + (venta.monto_efectivo or 0),
+            total_mercadopago=F('total_mercadopago') + (venta.monto_mercadopago or 0),
+            total_transferencia=F('total_transferencia') + (venta.monto_transferencia or 0),
+            total_unidades=F('total_unidades') + carrito.unidades,
+        )
+
+    return venta
+
+
+@manejador('asientos_venta')
+def asentar_ventas(ventas):
+    """Asientos de venta y de costo de todas las ventas del lote, en un solo registrar_asientos()."""
+    asientos = []
+    for datos in ventas:
+        fecha = date.fromisoformat(datos['fecha'])
+        total, costo = Decimal(datos['total']), Decimal(datos['costo'])
+        asientos.append(armar_asiento(
+            f"Venta #{datos['venta']} - {datos['cliente']}",
+            [
+                (plan_cuentas.por_codigo(CODIGO_CAJA), total, 0),  # Caja
+                (plan_cuentas.por_codigo('4.01'), 0, total),  # Ventas
+            ],
+            fecha=fecha,
+            caja_id=datos.get('caja'),
+        ))
+        if costo > 0:
+            asientos.append(armar_asiento(
+                f"Costo por Venta #{datos['venta']}",
+                [
+                    (plan_cuentas.por_codigo('5.01'), costo, 0),  # CMV
+                    (plan_cuentas.por_codigo('1.02'), 0, costo),  # Mercaderías
+                ],
+                fecha=fecha,
+                caja_id=datos.get('caja'),
+            ))
+    registrar_asientos(asientos)
+
+
+def recalcular_contadores_caja(caja):
+    """
+    Contadores del turno calculados desde cero con las ventas de la caja y los
+    asientos de Caja imputados a ella. Sirve para verificar o corregir la fila
+    de CajaDiaria. Los asientos que siguen en el outbox no cuentan en ninguno
+    de los dos lados: la fila los suma recién al registrarlos.
+    """
+    ventas = caja.ventas.all()
+    pagos = ventas.aggregate(
+        total_efectivo=Sum('monto_efectivo'),
+        total_mercadopago=Sum('monto_mercadopago'),
+        total_transferencia=Sum('monto_transferencia'),
+    )
+    unidades = DetalleVenta.objects.filter(venta__in=ventas).aggregate(total=Sum('cantidad'))['total']
+
+    caja_ledger = ItemAsiento.objects.filter(cuenta__codigo=CODIGO_CAJA, asiento__caja=caja).aggregate(
+        debe=Sum('debe'), haber=Sum('haber'),
+    )
+
+    return {
+        'total_efectivo': pagos['total_efectivo'] or 0,
+        'total_mercadopago': pagos['total_mercadopago'] or 0,
+        'total_transferencia': pagos['total_transferencia'] or 0,
+        'total_unidades': unidades or 0,
+        'debe_caja': caja_ledger['debe'] or 0,
+        'haber_caja': caja_ledger['haber'] or 0,
+    }
+
+
+# =====================================================
+# ACUMULADO DIARIO DE VENTAS
+# =====================================================
+
+def acumular_venta_diaria(venta, carrito):
+    """Suma la venta a la fila de su día con un UPDATE atómico (F), creándola si no existe."""
+    incrementos = dict(
+        cantidad_tickets=F('cantidad_tickets') + 1,
+        unidades=F('unidades') + carrito.unidades,
+        total=F('total') + venta.total,
+        costo=F('costo') + carrito.costo,
+        efectivo=F('efectivo') + (venta.monto_efectivo or 0),
+        mercadopago=F('mercadopago') + (venta.monto_mercadopago or 0),
+        transferencia=F('transferencia') + (venta.monto_transferencia or 0),
+        vuelto=F('vuelto') + venta.vuelto,
+    )
+    dia = timezone.localdate(venta.fecha)
+
+    if VentaDiaria.objects.filter(fecha=dia).update(**incrementos):
+        return
+    try:
+        # Primera venta del día. Si otra la crea a la vez, el UNIQUE salta y sumamos encima.
+        with transaction.atomic():
+            VentaDiaria.objects.create(fecha=dia)
+    except IntegrityError:
+        pass
+    VentaDiaria.objects.filter(fecha=dia).update(**incrementos)
+
+
+def reconstruir_ventas_diarias(desde=None, hasta=None):
+    """
+    Rehace VentaDiaria desde las ventas, sus detalles y los asientos de costo
+    (cuenta 5.01) para el rango de fechas dado (ambos opcionales, inclusive).
+    Devuelve la cantidad de días escritos.
+    """
+    procesar_pendientes()  # los costos salen de los asientos
+    ventas = Venta.objects.all()
+    detalles = DetalleVenta.objects.all()
+    costos = ItemAsiento.objects.filter(cuenta__codigo='5.01', asiento__descripcion__startswith='Costo por Venta #')
+    if desde:
+        ventas = ventas.filter(fecha__date__gte=desde)
+        detalles = detalles.filter(venta__fecha__date__gte=desde)
+        costos = costos.filter(asiento__fecha__gte=desde)
+    if hasta:
+        ventas = ventas.filter(fecha__date__lte=hasta)
+        detalles = detalles.filter(venta__fecha__date__lte=hasta)
+        costos = costos.filter(asiento__fecha__lte=hasta)
+
+    dias = {}
+    for fila in ventas.annotate(dia=TruncDate('fecha')).values('dia').annotate(
+        cantidad_tickets=Count('id'), total=Sum('total'), efectivo=Sum('monto_efectivo'),
+        mercadopago=Sum('monto_mercadopago'), transferencia=Sum('monto_transferencia'), vuelto=Sum('vuelto'),
+    ).order_by():
+        dia = fila.pop('dia')
+        dias[dia] = VentaDiaria(fecha=dia, **fila)
+    for fila in detalles.annotate(dia=TruncDate('venta__fecha')).values('dia').annotate(unidades=Sum('cantidad')).order_by():
+        dias[fila['dia']].unidades = fila['unidades']
+    for fila in costos.values('asiento__fecha').annotate(costo=Sum('debe')).order_by():
+        if fila['asiento__fecha'] in dias:
+            dias[fila['asiento__fecha']].costo = fila['costo']
+
+    with transaction.atomic():
+        existentes = VentaDiaria.objects.all()
+        if desde:
+            existentes = existentes.filter(fecha__gte=desde)
+        if hasta:
+            existentes = existentes.filter(fecha__lte=hasta)
+        existentes.delete()
+        VentaDiaria.objects.bulk_create(dias.values())
+
+    return len(dias)
+
+
+# =====================================================
+# LOTE DE VENTAS (terminales sin conexión)
+# =====================================================
+
+CAMPOS_MONTOS = ['monto_efectivo', 'monto_mercadopago', 'monto_transferencia',
+                 'descuento_global', 'descuento_global_porcentaje']
+
+
+def _cabecera(datos):
+    # Los montos vacíos valen 0, igual que en el formulario de nueva_venta
+    cabecera = {campo: datos.get(campo) or 0 for campo in CAMPOS_MONTOS}
+    cabecera['cliente'] = datos.get('cliente') or ''
+    cabecera['clave_idempotencia'] = datos.get('clave_idempotencia') or ''
+    return cabecera
+
+
+def _armar_carrito(lineas, productos):
+    if not isinstance(lineas, list):
+        raise CarritoInvalido("'lineas' debe ser una lista.")
+
+    resultado = []
+    for numero, linea in enumerate(lineas, start=1):
+        try:
+            producto = productos[int(linea['producto'])]
+            cantidad = int(linea['cantidad'])
+            descuento = Decimal(str(linea.get('descuento_porcentaje') or 0))
+        except KeyError:
+            raise CarritoInvalido(f"Línea {numero}: producto inexistente o datos incompletos.")
+        except (TypeError, ValueError, InvalidOperation):
+            raise CarritoInvalido(f"Línea {numero}: datos inválidos.")
+        if cantidad < 1 or not (0 <= descuento <= 100):
+            raise CarritoInvalido(f"Línea {numero}: cantidad o descuento fuera de rango.")
+        resultado.append(LineaCarrito(producto, cantidad, descuento))
+    return Carrito(resultado)
+
+
+def _fecha_de_venta(valor, ahora):
+    # ISO 8601; sin zona horaria se toma la hora local
+    try:
+        fecha = parse_datetime(str(valor))
+    except ValueError:  # bien formada pero inexistente (ej: mes 13)
+        fecha = None
+    if fecha is None:
+        raise CarritoInvalido("'fecha' debe ser fecha y hora ISO (AAAA-MM-DDTHH:MM).")
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    if fecha > ahora:
+        raise CarritoInvalido("'fecha' no puede ser posterior a ahora.")
+    return fecha
+
+
+def _caja_del_momento(fecha, cajas):
+    # El turno que estaba abierto a esa hora (cajas ordenadas de la más nueva a la más vieja).
+    # Si ya se cerró no se toca: sus contadores y su saldo_final quedaron arqueados.
+    for caja in cajas:
+        if caja.fecha_apertura <= fecha and (caja.fecha_cierre is None or fecha <= caja.fecha_cierre):
+            if not caja.estado:
+                raise CarritoInvalido(
+                    f"El turno de caja del {timezone.localtime(caja.fecha_apertura):%d/%m/%Y %H:%M} ya está cerrado."
+                )
+            return caja
+    raise CarritoInvalido(f"No hay un turno de caja abierto el {timezone.localtime(fecha):%d/%m/%Y %H:%M}.")
+
+
+def registrar_lote(ventas, caja):
+    """
+    Registra una lista de ventas (dicts con la misma cabecera que VentaForm
+    más 'lineas': [{producto, cantidad, descuento_porcentaje}]) en una sola
+    transacción, con las mismas reglas de descuentos, vuelto y asientos que
+    nueva_venta. Van al turno `caja`, salvo las que traen 'fecha' (ventas en
+    papel cargadas después): esas toman esa hora, no posterior a ahora, y
+    van al turno que estaba abierto en ese momento, igual que su asiento y
+    su día en VentaDiaria. Si ese turno ya se cerró la venta se rechaza: las
+    ventas en papel se cargan antes de cerrar la caja en la que se cobraron.
+
+    Cada venta va en su propio savepoint: si una falla por sus datos (stock,
+    productos, montos) se informa y las demás se graban igual. Un error de la
+    base o del programa no es de la venta: sale de acá y revierte el lote.
+    Los productos de todo el lote se traen con un solo in_bulk() y las
+    claves de idempotencia repetidas devuelven la venta que ya existía.
+    Devuelve un resultado por venta, en el mismo orden.
+    """
+    ids = set()
+    for datos in ventas:
+        for linea in (datos.get('lineas') or []) if isinstance(datos, dict) else []:
+            if isinstance(linea, dict) and str(linea.get('producto', '')).isdigit():
+                ids.add(int(linea['producto']))
+    productos = Producto.objects.in_bulk(ids)
+
+    claves = [datos.get('clave_idempotencia') for datos in ventas if isinstance(datos, dict)]
+    registradas = {
+        str(clave): pk for clave, pk in
+        Venta.objects.filter(clave_idempotencia__in=[c for c in claves if _es_uuid(c)])
+        .values_list('clave_idempotencia', 'pk')
+    }
+
+    # Turnos que pueden cubrir las fechas atrasadas del lote: una sola consulta
+    ahora = timezone.now()
+    fechas = []
+    for datos in ventas:
+        if isinstance(datos, dict) and datos.get('fecha'):
+            try:
+                fechas.append(_fecha_de_venta(datos['fecha'], ahora))
+            except CarritoInvalido:
+                pass  # se informa en su venta
+    cajas = list(
+        CajaDiaria.objects.filter(fecha_apertura__lte=ahora)
+        .exclude(fecha_cierre__lt=min(fechas))
+        .order_by('-fecha_apertura')
+    ) if fechas else []
+
+    resultados = []
+    with transaction.atomic():
+        for indice, datos in enumerate(ventas):
+            resultado = {'indice': indice}
+            try:
+                if not isinstance(datos, dict):
+                    raise CarritoInvalido("Cada venta debe ser un objeto.")
+
+                form = VentaForm(_cabecera(datos))
+                if not form.is_valid():
+                    raise CarritoInvalido("; ".join(f"{campo}: {' '.join(errores)}" for campo, errores in form.errors.items()))
+
+                clave = form.cleaned_data.get('clave_idempotencia')
+                if clave and str(clave) in registradas:
+                    resultado.update(ok=True, venta=registradas[str(clave)], duplicada=True)
+                    resultados.append(resultado)
+                    continue
+
+                carrito = _armar_carrito(datos.get('lineas'), productos)
+                carrito.validar()
+
+                venta = form.save(commit=False)
+                venta.clave_idempotencia = clave
+                venta.caja = caja
+                if datos.get('fecha'):
+                    venta.fecha = _fecha_de_venta(datos['fecha'], ahora)
+                    venta.caja = _caja_del_momento(venta.fecha, cajas)
+                registrar_venta(venta, carrito)
+
+                if clave:
+                    registradas[str(clave)] = venta.pk
+                resultado.update(ok=True, venta=venta.pk, total=str(venta.total), vuelto=str(venta.vuelto))
+            except Cuenta.DoesNotExist:
+                resultado.update(ok=False, error="Error contable: faltan cuentas configuradas.")
+            except IntegrityError:
+                # Otra terminal registró la misma clave a la vez: devolvemos esa venta.
+                # Cualquier otra violación es un error del servidor y aborta el lote.
+                previa = Venta.objects.filter(clave_idempotencia=clave).values_list('pk', flat=True).first() if clave else None
+                if previa is None:
+                    raise
+                registradas[str(clave)] = previa
+                resultado.update(ok=True, venta=previa, duplicada=True)
+            except ValidationError as e:
+                resultado.update(ok=False, error=" ".join(e.messages))
+            except (CarritoInvalido, AsientoDesbalanceado) as e:
+                resultado.update(ok=False, error=str(e))
+            resultados.append(resultado)
+
+    return resultados
+
+
+def _es_uuid(valor):
+    try:
+        uuid.UUID(str(valor))
+        return True
+    except ValueError:
+        return False
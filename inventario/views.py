@@ -1,19 +1,32 @@
 # views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.views.decorators.http import condition, require_POST
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from .models import (Producto, Categoria, Cliente, Venta, DetalleVenta, DetallePresupuesto, 
-                        Presupuesto, Cuenta, Asiento, ItemAsiento, CajaDiaria, Proveedor, Compra, DetalleCompra) 
+                        Presupuesto, Cuenta, Asiento, ItemAsiento, CajaDiaria, Proveedor, Compra, DetalleCompra,
+                        VentaDiaria) 
 from .forms import (ProductoForm, ClienteForm, VentaForm, 
                     DetalleVentaFormSet, PresupuestoForm, DetallePresupuestoFormSet, AperturaCajaForm,
                     CierreCajaForm, ProveedorForm, CompraForm, DetalleCompraFormSet)
-from django.db import transaction
+from .carrito import Carrito
+from .ventas import registrar_venta, registrar_lote, recalcular_contadores_caja
+from .contabilidad import (plan_cuentas, armar_asiento, registrar_asientos, armar_cierre_ejercicio,
+                           balance_sumas_y_saldos, movimientos_mayor)
+from .exportar import respuesta_csv, filas_asientos, filas_ventas, filas_compras
+from .outbox import contar_pendientes, asentar_pendientes
+from django.db import transaction, IntegrityError
 from decimal import Decimal
-from django.db.models import Sum, Count, F
-from datetime import date, timedelta
+from django.db.models import Sum, Count, F, Max, Q
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.utils.dateparse import parse_date
 from django.utils import timezone
 import json
+import uuid
 
 # 1. EL MENÚ PRINCIPAL (GRIDS)
 @login_required
@@ -64,6 +77,111 @@ def producto_editar(request, pk):
         'titulo': f'Editar {producto.nombre}' 
     })
 
+@login_required
+def producto_por_codigo(request, codigo):
+    # Lectora de código de barras en caja: codigo_barras es UNIQUE (tiene índice), una sola consulta
+    fila = Producto.objects.filter(codigo_barras=codigo).values_list(
+        'id', 'nombre', 'marca', 'precio', 'stock_actual'
+    ).first()
+    if fila is None:
+        return JsonResponse({'error': f"No existe un producto con código '{codigo}'"}, status=404)
+
+    pk, nombre, marca, precio, stock = fila
+    return JsonResponse({
+        'id': pk,
+        'nombre': f"{nombre} ({marca})" if marca else nombre,
+        'precio': float(precio),
+        'stock': stock,
+    })
+
+def _version_catalogo(request):
+    # Versión = última modificación de un producto (en microsegundos) + cantidad de productos.
+    # Se guarda en el request para no repetir la consulta dentro de la vista.
+    if not hasattr(request, '_version_catalogo'):
+        datos = Producto.objects.aggregate(ultima=Max('fecha_actualizacion'), total=Count('id'))
+        version = int(datos['ultima'].timestamp() * 1_000_000) if datos['ultima'] else 0
+        request._version_catalogo = (version, datos['total'])
+    return request._version_catalogo
+
+
+def _etag_catalogo(request):
+    version, total = _version_catalogo(request)
+    return f"{version}-{total}"
+
+
+@login_required
+@condition(etag_func=_etag_catalogo)
+def catalogo_precios(request):
+    """
+    Precios para la pantalla de ventas: {version, total, completo, precios: {id: precio}}.
+    Con ?desde=<version> solo manda los productos modificados desde esa versión.
+    Si el navegador ya tiene la versión actual (If-None-Match) responde 304 sin cuerpo.
+    """
+    version, total = _version_catalogo(request)
+    productos = Producto.objects.all()
+
+    desde = request.GET.get('desde', '')
+    completo = not desde.isdigit()
+    if not completo:
+        # >= para no perder productos guardados en el mismo microsegundo; repetirlos no molesta
+        fecha_desde = datetime.fromtimestamp(int(desde) / 1_000_000, tz=dt_timezone.utc)
+        productos = productos.filter(fecha_actualizacion__gte=fecha_desde)
+
+    precios = {pk: float(precio) for pk, precio in productos.order_by().values_list('id', 'precio')}
+
+    response = JsonResponse({'version': version, 'total': total, 'completo': completo, 'precios': precios})
+    # Que el navegador lo guarde pero revalide siempre con el ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def producto_buscar(request):
+    """
+    Autocompletado de productos para los Select2 de ventas, presupuestos y compras.
+    Busca por nombre, marca o código de barras y pagina por cursor (nombre, id),
+    así cada página cuesta lo mismo sin importar el tamaño del catálogo.
+    Respuesta en formato Select2: {results: [{id, text}], pagination: {more}, cursor}.
+    """
+    termino = request.GET.get('q', '').strip()
+    try:
+        limite = min(max(int(request.GET.get('limit', 20)), 1), 50)
+    except ValueError:
+        limite = 20
+
+    productos = Producto.objects.order_by('nombre', 'id')
+    if termino:
+        productos = productos.filter(
+            Q(nombre__icontains=termino) | Q(marca__icontains=termino) | Q(codigo_barras__istartswith=termino)
+        )
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            nombre, pk = json.loads(urlsafe_base64_decode(cursor))
+            if not isinstance(nombre, str):
+                raise TypeError(nombre)
+            pk = int(pk)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Cursor inválido'}, status=400)
+        productos = productos.filter(Q(nombre__gt=nombre) | Q(nombre=nombre, id__gt=pk))
+
+    filas = list(productos.values_list('id', 'nombre', 'marca', 'precio')[:limite + 1])
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    siguiente = None
+    if hay_mas:
+        siguiente = urlsafe_base64_encode(json.dumps([filas[-1][1], filas[-1][0]]).encode())
+
+    return JsonResponse({
+        'results': [
+            {'id': pk, 'text': f"{nombre} ({marca})" if marca else nombre, 'precio': float(precio)}
+            for pk, nombre, marca, precio in filas
+        ],
+        'pagination': {'more': hay_mas},
+        'cursor': siguiente,
+    })
+
 @login_required
 def cliente_lista(request):
     clientes = Cliente.objects.all()
@@ -96,148 +214,70 @@ def cliente_editar(request, pk):
     
     return render(request, 'partners/cliente_form.html', {'form': form, 'titulo': f'Editar {cliente.nombre}'})
 
+def avisar_pendientes(request, conteo=None):
+    """
+    Avisa en la página que hay ventas cuyos asientos (y auditoría) siguen en
+    el outbox: los reportes todavía no las incluyen. `conteo` es
+    (pendientes, trabadas) si ya se tiene; si no, se cuenta. Lo devuelve.
+    """
+    pendientes, trabadas = conteo or contar_pendientes()
+    if pendientes:
+        messages.info(request, f"{pendientes} venta(s) con asientos pendientes de registrar: todavía no figuran en los saldos.")
+    if trabadas:
+        messages.error(
+            request,
+            f"{trabadas} venta(s) sin asentar por errores repetidos: los saldos de caja no las incluyen. "
+            "Revisar 'ultimo_error' en el admin y reencolarlas con `manage.py procesar_pendientes --reencolar`."
+        )
+    return pendientes, trabadas
+
+def _venta_por_clave(clave):
+    """Id de la venta ya registrada con esa clave de idempotencia, o None."""
+    if not clave:
+        return None
+    try:
+        clave = uuid.UUID(str(clave))
+    except ValueError:
+        return None
+    return Venta.objects.filter(clave_idempotencia=clave).values_list('pk', flat=True).first()
+
+
 @login_required
 def nueva_venta(request):
-    if not CajaDiaria.objects.filter(estado=True).exists():
+    caja = CajaDiaria.objects.filter(estado=True).last()
+    if not caja:
         messages.error(request, "⚠️ DEBES ABRIR LA CAJA ANTES DE VENDER")
         return redirect('gestion_caja')
 
-    lista_precios = {p.id: float(p.precio) for p in Producto.objects.all()}
-    precios_json = json.dumps(lista_precios)
-
     if request.method == 'POST':
+        # Reenvío del mismo formulario (doble clic / reintento): devolvemos el ticket original
+        venta_previa = _venta_por_clave(request.POST.get('clave_idempotencia'))
+        if venta_previa:
+            return redirect('ticket_venta', pk=venta_previa)
+
         form = VentaForm(request.POST)
         formset = DetalleVentaFormSet(request.POST)
 
         if form.is_valid() and formset.is_valid():
             try:
-                with transaction.atomic():
-
-                    # ======================
-                    # CABECERA
-                    # ======================
-                    venta = form.save(commit=False)
-                    venta.total = Decimal(0)
-                    venta.save()
-
-                    total_acumulado = Decimal(0)
-                    total_costo = Decimal(0)
-
-                    detalles = formset.save(commit=False)
-
-                    # =====================================================
-                    # DETALLES DE VENTA
-                    # =====================================================
-                    for detalle in detalles:
-                        producto = detalle.producto
-
-                        # -------- VALIDAR STOCK --------
-                        if producto.stock_actual < detalle.cantidad:
-                            raise Exception(f"No hay stock suficiente de {producto.nombre}")
-
-                        producto.stock_actual -= detalle.cantidad
-                        producto.save()
-
-                        # -------- DESCUENTO POR PRODUCTO --------
-                        detalle.venta = venta
-                        detalle.precio_unitario = producto.precio
-
-                        bruto = detalle.cantidad * detalle.precio_unitario
-                        descuento_item = bruto * (detalle.descuento_porcentaje / Decimal(100))
-                        detalle.subtotal = bruto - descuento_item
-
-                        detalle.save()
-                        total_acumulado += detalle.subtotal
-
-                        # -------- COSTO --------
-                        costo_unitario = producto.precio_costo or Decimal(0)
-                        total_costo += costo_unitario * detalle.cantidad
-
-                    # =====================================================
-                    # NUEVA LÓGICA DE DESCUENTOS GLOBALES
-                    # =====================================================
-
-                    # 1️⃣ Descuento global PORCENTAJE
-                    if venta.descuento_global_porcentaje and venta.descuento_global_porcentaje > 0:
-                        monto_desc_porc = total_acumulado * (
-                            venta.descuento_global_porcentaje / Decimal(100)
-                        )
-                        total_acumulado -= monto_desc_porc
-
-                    # 2️⃣ Descuento global FIJO ($)
-                    total_final = total_acumulado - (venta.descuento_global or Decimal(0))
-
-                    if total_final < 0:
-                        total_final = Decimal(0)
-
-                    venta.total = total_final
-
-                    # =====================================================
-                    # VUELTO
-                    # =====================================================
-                    total_pagado = (
-                        (venta.monto_efectivo or 0) +
-                        (venta.monto_mercadopago or 0) +
-                        (venta.monto_transferencia or 0)
-                    )
-
-                    venta.vuelto = total_pagado - total_final
-                    venta.save()
-
-                    # =====================================================
-                    # ASIENTO CONTABLE — VENTA
-                    # =====================================================
-                    asiento_venta = Asiento.objects.create(
-                        fecha=date.today(),
-                        descripcion=f"Venta #{venta.id} - {venta.cliente or 'Consumidor Final'}",
-                        tipo='NORMAL'
-                    )
-
-                    cuenta_caja = Cuenta.objects.get(codigo='1.01')
-                    ItemAsiento.objects.create(
-                        asiento=asiento_venta,
-                        cuenta=cuenta_caja,
-                        debe=total_final,
-                        haber=0
-                    )
-
-                    cuenta_ventas = Cuenta.objects.get(codigo='4.01')
-                    ItemAsiento.objects.create(
-                        asiento=asiento_venta,
-                        cuenta=cuenta_ventas,
-                        debe=0,
-                        haber=total_final
-                    )
-
-                    # =====================================================
-                    # ASIENTO CONTABLE — COSTO
-                    # =====================================================
-                    if total_costo > 0:
-                        asiento_costo = Asiento.objects.create(
-                            fecha=date.today(),
-                            descripcion=f"Costo por Venta #{venta.id}",
-                            tipo='NORMAL'
-                        )
-
-                        cuenta_cmv = Cuenta.objects.get(codigo='5.01')
-                        ItemAsiento.objects.create(
-                            asiento=asiento_costo,
-                            cuenta=cuenta_cmv,
-                            debe=total_costo,
-                            haber=0
-                        )
-
-                        cuenta_mercaderias = Cuenta.objects.get(codigo='1.02')
-                        ItemAsiento.objects.create(
-                            asiento=asiento_costo,
-                            cuenta=cuenta_mercaderias,
-                            debe=0,
-                            haber=total_costo
-                        )
-
-                    messages.success(request, "Venta registrada con descuentos 🎉")
-                    return redirect('ticket_venta', pk=venta.id)
-
+                # Productos ya precargados por el formset (un solo in_bulk)
+                carrito = Carrito.desde_formset(formset)
+                carrito.validar()
+
+                venta = form.save(commit=False)
+                venta.clave_idempotencia = form.cleaned_data.get('clave_idempotencia')
+                venta.caja = caja
+                registrar_venta(venta, carrito)
+
+                messages.success(request, "Venta registrada con descuentos 🎉")
+                return redirect('ticket_venta', pk=venta.id)
+
+            except IntegrityError:
+                # Dos envíos simultáneos con la misma clave: el otro ya registró la venta
+                venta_previa = _venta_por_clave(form.cleaned_data.get('clave_idempotencia'))
+                if venta_previa:
+                    return redirect('ticket_venta', pk=venta_previa)
+                messages.error(request, "No se pudo registrar la venta. Intente nuevamente.")
             except Cuenta.DoesNotExist:
                 messages.error(
                     request,
@@ -254,28 +294,60 @@ def nueva_venta(request):
     return render(request, 'sales/nueva_venta.html', {
         'form': form,
         'formset': formset,
-        'precios_json': precios_json
     })
 
 
+@login_required
+@require_POST
+def ventas_lote(request):
+    # Carga de ventas hechas sin conexión: {"ventas": [{cabecera..., "lineas": [...]}, ...]}
+    caja = CajaDiaria.objects.filter(estado=True).last()
+    if not caja:
+        return JsonResponse({'error': 'Debés abrir la caja antes de vender.'}, status=409)
+
+    try:
+        ventas = json.loads(request.body)['ventas']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'JSON inválido: se espera {"ventas": [...]}.'}, status=400)
+    if not isinstance(ventas, list):
+        return JsonResponse({'error': "'ventas' debe ser una lista."}, status=400)
+
+    resultados = registrar_lote(ventas, caja)
+    return JsonResponse({
+        'registradas': sum(1 for r in resultados if r['ok']),
+        'fallidas': sum(1 for r in resultados if not r['ok']),
+        'resultados': resultados,
+    })
+
 
 @login_required
 def ticket_venta(request, pk):
     venta = get_object_or_404(Venta, pk=pk)
     return render(request, 'sales/ticket.html', {'venta': venta})
 
+def fecha_param(request, nombre):
+    # AAAA-MM-DD del query string; None si falta, está mal escrita o no existe (ej: mes 13).
+    # Lo usan también las vistas de auditoría
+    try:
+        return parse_date(request.GET.get(nombre) or '')
+    except ValueError:
+        return None
+
+VENTAS_POR_PAGINA = 50
+
+
 @login_required
 def venta_list(request):
-    #1. obtener los filtros de la url si existen
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
+    #1. obtener los filtros de la url si existen (una fecha inválida es como no filtrar)
+    fecha_inicio = fecha_param(request, 'fecha_inicio')
+    fecha_fin = fecha_param(request, 'fecha_fin')
     filtro_rapido = request.GET.get('filtro') # 'hoy', 'ayer', 'ultimos_7', 'ultimos_30'
-    #2. query base todas las ventas ordenadas por fecha descendente
-    ventas = Venta.objects.all().order_by('-fecha')
+    #2. query base todas las ventas ordenadas por fecha descendente (id desempata ventas del mismo instante)
+    ventas = Venta.objects.all().order_by('-fecha', '-id')
     #3. aplicar filtros si existen
-    hoy = date.today()
+    hoy = timezone.localdate()
     if filtro_rapido == 'hoy':
-        ventas = ventas.filter(fecha=hoy)
+        ventas = ventas.filter(fecha__date=hoy)
         fecha_inicio = hoy
         fecha_fin = hoy
     elif filtro_rapido == 'semana':
@@ -291,11 +363,46 @@ def venta_list(request):
     elif fecha_inicio and fecha_fin:
         #este es el filtro personalizado de rango de fechas elegidas
         ventas = ventas.filter(fecha__date__range=[fecha_inicio, fecha_fin])
-    total_periodo = sum(v.total for v in ventas)
+
+    #4. totales del período completo desde el acumulado diario (una fila por día, no por venta)
+    dias = VentaDiaria.objects.all()
+    if fecha_inicio and fecha_fin:
+        dias = dias.filter(fecha__range=[fecha_inicio, fecha_fin])
+    resumen = dias.aggregate(total=Sum('total'), cantidad=Sum('cantidad_tickets'))
+
+    #5. paginado por cursor (fecha, id): cada página es un rango del índice, sin OFFSET
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            fecha, pk = json.loads(urlsafe_base64_decode(cursor))
+            fecha, pk = datetime.fromisoformat(fecha), int(pk)
+        except (ValueError, TypeError):
+            messages.warning(request, "El enlace de paginación no es válido; se muestra la primera página.")
+            cursor = None
+        else:
+            ventas = ventas.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk))
+
+    pagina = list(
+        ventas.select_related('cliente')
+        .annotate(cantidad_items=Count('detalles'))[:VENTAS_POR_PAGINA + 1]
+    )
+    siguiente = None
+    if len(pagina) > VENTAS_POR_PAGINA:
+        pagina = pagina[:VENTAS_POR_PAGINA]
+        ultima = pagina[-1]
+        parametros = request.GET.copy()
+        parametros['cursor'] = urlsafe_base64_encode(json.dumps([ultima.fecha.isoformat(), ultima.id]).encode())
+        siguiente = parametros.urlencode()
+
+    primera = request.GET.copy()
+    primera.pop('cursor', None)
 
     context = {
-        'ventas': ventas,
-        'total_periodo': total_periodo, 
+        'ventas': pagina,
+        'total_periodo': resumen['total'] or 0,
+        'cantidad_ventas': resumen['cantidad'] or 0,
+        'pagina_siguiente': siguiente,
+        'pagina_primera': primera.urlencode() if cursor else None,
         'fecha_inicio': str(fecha_inicio) if fecha_inicio else '',
         'fecha_fin': str(fecha_fin) if fecha_fin else '',
     }
@@ -368,13 +475,15 @@ def presupuesto_list(request):
 def gestion_caja(request):
     # Buscamos si hay una caja abierta
     caja_abierta = CajaDiaria.objects.filter(estado=True).last()
+    # Últimos turnos cerrados, para revisar sus ventas
+    cajas_anteriores = CajaDiaria.objects.filter(estado=False).order_by('-fecha_apertura')[:10]
     
     if caja_abierta:
         # SI ESTÁ ABIERTA: Mostramos opción de cerrar
-        return render(request, 'sales/caja_status.html', {'caja': caja_abierta, 'estado': 'abierta'})
+        return render(request, 'sales/caja_status.html', {'caja': caja_abierta, 'estado': 'abierta', 'cajas_anteriores': cajas_anteriores})
     else:
         # SI ESTÁ CERRADA: Mostramos opción de abrir
-        return render(request, 'sales/caja_status.html', {'estado': 'cerrada'})
+        return render(request, 'sales/caja_status.html', {'estado': 'cerrada', 'cajas_anteriores': cajas_anteriores})
 
 @login_required
 def abrir_caja(request):
@@ -392,16 +501,15 @@ def abrir_caja(request):
                 # ASIENTO CONTABLE: Saldo Inicial
                 # (Entra a Caja, sale de "Aporte" o "Resultados Acumulados" momentáneamente)
                 if caja.saldo_inicial > 0:
-                    asiento = Asiento.objects.create(
-                        fecha=date.today(),
-                        descripcion=f"Apertura de Caja #{caja.id}",
-                        tipo='APERTURA'
-                    )
-                    cuenta_caja = Cuenta.objects.get(codigo='1.01')
-                    cuenta_capital = Cuenta.objects.get(codigo='3.01') # O la cuenta que uses para ajustar
-                    
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=caja.saldo_inicial, haber=0)
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_capital, debe=0, haber=caja.saldo_inicial)
+                    registrar_asientos([armar_asiento(
+                        f"Apertura de Caja #{caja.id}",
+                        [
+                            (plan_cuentas.por_codigo('1.01'), caja.saldo_inicial, 0),
+                            (plan_cuentas.por_codigo('3.01'), 0, caja.saldo_inicial), # O la cuenta que uses para ajustar
+                        ],
+                        tipo='APERTURA',
+                        caja_id=caja.id,
+                    )])
 
             messages.success(request, f"Caja abierta con ${caja.saldo_inicial}")
             return redirect('dashboard')
@@ -412,85 +520,51 @@ def abrir_caja(request):
 
 @login_required
 def cerrar_caja(request):
+    if request.method == 'POST':
+        # Los asientos de ventas que siguen en el outbox se registran ahora: saldo_sistema tiene que incluirlas
+        outbox_vacio = not any(avisar_pendientes(request, asentar_pendientes()))
+    else:
+        avisar_pendientes(request)
     caja = CajaDiaria.objects.filter(estado=True).last()
     if not caja:
         return redirect('gestion_caja')
-    
-    # 1. Obtenemos todas las ventas asociadas a este turno de caja
-    # (Desde que se abrió hasta ahora)
-    ventas_turno = Venta.objects.filter(fecha__gte=caja.fecha_apertura)
-
-    # 2. Sumamos los totales por medio de pago
-    resumen_pagos = ventas_turno.aggregate(
-        total_efectivo=Sum('monto_efectivo'),
-        total_mp=Sum('monto_mercadopago'),
-        total_transf=Sum('monto_transferencia')
-    )
-    # Limpiamos los None (si no hubo ventas devuelve None, lo pasamos a 0)
-    ingreso_efectivo = resumen_pagos['total_efectivo'] or 0
-    ingreso_mp = resumen_pagos['total_mp'] or 0
-    ingreso_transf = resumen_pagos['total_transf'] or 0
 
-    # >>> NUEVO: DETALLE DE PRODUCTOS AGRUPADOS
-    # Esto busca todos los items vendidos, los agrupa por nombre y marca, 
-    # y suma sus cantidades y subtotales.
-    productos_vendidos = DetalleVenta.objects.filter(venta__in=ventas_turno).values(
-        'producto__nombre', 
-        'producto__marca'
-    ).annotate(
-        cantidad_total=Sum('cantidad'),
-        subtotal_acumulado=Sum('subtotal')
-    ).order_by('-cantidad_total') # Ordenamos los más vendidos primero
-    
-    # Calculamos el total de unidades sumando la columna que acabamos de generar
-    total_unidades = 0
-    for item in productos_vendidos:
-        total_unidades += item['cantidad_total']
-    # <<< FIN NUEVO
-
-    # 4. Saldos esperados (Igual que antes)
-    saldo_esperado_efectivo = caja.saldo_inicial + ingreso_efectivo
-    total_vendido = ingreso_efectivo + ingreso_mp + ingreso_transf
-
-    # 3. Calculamos mercadería vendida (cantidad de items)
-    # Filtramos los detalles que pertenecen a las ventas de este turno
-    total_productos = DetalleVenta.objects.filter(venta__in=ventas_turno).aggregate(
-        total_items=Sum('cantidad')
-    )['total_items'] or 0
-
-    # 4. Calculamos el "Saldo Esperado en Efectivo"
-    # Saldo Inicial + Ventas Efectivo - (Gastos en efectivo si los hubiera)
-    # Nota: Aquí asumimos que los gastos salen de caja chica. Si no tienes gastos implementados, es solo suma.
-    saldo_esperado_efectivo = caja.saldo_inicial + ingreso_efectivo
+    # 1. Los totales del turno ya están en la fila de la caja (los suman ventas y asientos).
+    # Con ?verificar=1 se recalculan desde las ventas y asientos y se corrige si no coinciden.
+    if request.GET.get('verificar'):
+        recalculado = recalcular_contadores_caja(caja)
+        diferencias = [
+            f"{campo}: {getattr(caja, campo)} → {valor}"
+            for campo, valor in recalculado.items() if getattr(caja, campo) != valor
+        ]
+        if diferencias:
+            CajaDiaria.objects.filter(pk=caja.pk).update(**recalculado)
+            caja.refresh_from_db()
+            messages.warning(request, "Contadores corregidos: " + "; ".join(diferencias))
+        else:
+            messages.success(request, "Los contadores de la caja coinciden con las ventas y asientos.")
 
-    # Total general vendido (Digital + Físico)
-    total_vendido = ingreso_efectivo + ingreso_mp + ingreso_transf
+    # 2. Saldos esperados
+    # Nota: Aquí asumimos que los gastos salen de caja chica. Si no tienes gastos implementados, es solo suma.
+    saldo_esperado_efectivo = caja.saldo_inicial + caja.total_efectivo
 
-    # CALCULAR SALDO ESPERADO (Saldo Inicial + Ventas del día - Gastos del día)
-    # Por simplicidad, sumamos el Debe de la cuenta Caja desde la hora de apertura
-    cuenta_caja = Cuenta.objects.get(codigo='1.01')
-    
-    # Movimientos desde que se abrió esta caja específica
-    movimientos = ItemAsiento.objects.filter(
-        cuenta=cuenta_caja,
-        asiento__creado_at__gte=caja.fecha_apertura
-    ).aggregate(total_debe=Sum('debe'), total_haber=Sum('haber'))
-    
-    total_ingresos = movimientos['total_debe'] or 0
-    total_egresos = movimientos['total_haber'] or 0
-    # Nota: El saldo inicial ya se sumó como "total_debe" en el asiento de apertura
-    saldo_sistema = total_ingresos - total_egresos
+    # Saldo según la cuenta Caja (1.01) desde la apertura.
+    # Nota: El saldo inicial ya se sumó como debe en el asiento de apertura
+    saldo_sistema = caja.saldo_sistema
 
     if request.method == 'POST':
         form = CierreCajaForm(request.POST)
-        if form.is_valid():
+        if not outbox_vacio:
+            # saldo_sistema todavía no incluye esas ventas: la diferencia saldría mal
+            messages.warning(request, "La caja se puede cerrar cuando se registren los asientos pendientes.")
+        elif form.is_valid():
             monto_real = form.cleaned_data['monto_real']
             diferencia = monto_real - saldo_sistema
             
             caja.saldo_final = monto_real
             caja.fecha_cierre = timezone.now()
             caja.estado = False # Cerramos
-            caja.save()
+            caja.save(update_fields=['saldo_final', 'fecha_cierre', 'estado'])
             
             # Opcional: Registrar la diferencia (sobrante o faltante de caja)
             if diferencia != 0:
@@ -502,24 +576,97 @@ def cerrar_caja(request):
     else:
         form = CierreCajaForm()
 
+    # DETALLE DE PRODUCTOS AGRUPADOS (solo para mostrar: se consulta al renderizar)
+    # Busca todos los items vendidos en esta caja, los agrupa por nombre y marca,
+    # y suma sus cantidades y subtotales.
+    productos_vendidos = DetalleVenta.objects.filter(venta__caja=caja).values(
+        'producto__nombre', 
+        'producto__marca'
+    ).annotate(
+        cantidad_total=Sum('cantidad'),
+        subtotal_acumulado=Sum('subtotal')
+    ).order_by('-cantidad_total') # Ordenamos los más vendidos primero
+
     return render(request, 'sales/caja_cierre.html', {
         'form': form, 
         'caja': caja,
         'saldo_sistema': saldo_sistema,
-        'ingreso_efectivo': ingreso_efectivo,
-        'ingreso_mp': ingreso_mp,
-        'ingreso_transf': ingreso_transf,
+        'ingreso_efectivo': caja.total_efectivo,
+        'ingreso_mp': caja.total_mercadopago,
+        'ingreso_transf': caja.total_transferencia,
         'productos_vendidos': productos_vendidos, #
-        'total_unidades': total_unidades,
-        'total_productos': total_productos,
-        'total_vendido': total_vendido,
+        'total_unidades': caja.total_unidades,
+        'total_productos': caja.total_unidades,
+        'total_vendido': caja.total_vendido,
         'saldo_esperado_efectivo': saldo_esperado_efectivo
     })
 
+@login_required
+def caja_detalle(request, pk):
+    avisar_pendientes(request)
+    # Revisión de un turno (abierto o cerrado): totales de la fila y ventas por su FK a la caja
+    caja = get_object_or_404(CajaDiaria, pk=pk)
+    ventas = (
+        caja.ventas.select_related('cliente')
+        .annotate(cantidad_items=Count('detalles'))
+        .order_by('-fecha', '-id')
+    )
+    productos_vendidos = DetalleVenta.objects.filter(venta__caja=caja).values(
+        'producto__nombre',
+        'producto__marca'
+    ).annotate(
+        cantidad_total=Sum('cantidad'),
+        subtotal_acumulado=Sum('subtotal')
+    ).order_by('-cantidad_total')
+
+    return render(request, 'sales/caja_detail.html', {
+        'caja': caja,
+        'ventas': ventas,
+        'productos_vendidos': productos_vendidos,
+    })
+
+ASIENTOS_POR_PAGINA = 50
+
+
 @login_required
 def libro_diario(request):
+    avisar_pendientes(request)
+    fecha_inicio = fecha_param(request, 'fecha_inicio')
+    fecha_fin = fecha_param(request, 'fecha_fin')
+
     asientos = Asiento.objects.all().order_by('-fecha', '-id')
-    return render(request, 'accounting/libro_diario.html', {'asientos': asientos})
+    if fecha_inicio:
+        asientos = asientos.filter(fecha__gte=fecha_inicio)
+    if fecha_fin:
+        asientos = asientos.filter(fecha__lte=fecha_fin)
+
+    # Totales del rango completo en una sola consulta
+    totales = ItemAsiento.objects.filter(asiento__in=asientos.values('id')).aggregate(
+        debe=Sum('debe'), haber=Sum('haber')
+    )
+
+    # Solo la página pedida: sumas anotadas por la base y renglones + cuentas precargados
+    # (el conteo del Paginator va sobre la consulta sin anotar)
+    pagina = Paginator(asientos, ASIENTOS_POR_PAGINA).get_page(request.GET.get('page'))
+    desde = (pagina.number - 1) * ASIENTOS_POR_PAGINA
+    pagina.object_list = list(
+        asientos
+        .annotate(suma_debe=Sum('items__debe'), suma_haber=Sum('items__haber'))
+        .prefetch_related('items__cuenta')[desde:desde + ASIENTOS_POR_PAGINA]
+    )
+
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
+
+    return render(request, 'accounting/libro_diario.html', {
+        'asientos': pagina,
+        'pagina': pagina,
+        'parametros': parametros.urlencode(),
+        'total_debe': totales['debe'] or 0,
+        'total_haber': totales['haber'] or 0,
+        'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else '',
+        'fecha_fin': fecha_fin.isoformat() if fecha_fin else '',
+    })
 
 @login_required
 def nuevo_asiento_manual(request):
@@ -532,81 +679,99 @@ def nuevo_asiento_manual(request):
 def generar_cierre_contable(request):
     if request.method == 'POST':
         try:
-            with transaction.atomic():
-                fecha_cierre = date.today()
+            # Simulación: mostramos lo que se registraría sin grabar nada (con el aviso si faltan ventas)
+            if request.POST.get('simular'):
+                avisar_pendientes(request)
+                return render(request, 'accounting/cierre_simulacion.html', {'asientos': armar_cierre_ejercicio()})
 
-                # --- PASO 1: REFUNDICIÓN DE RESULTADOS ---
-                # Cancelamos Ingresos y Egresos contra "Resultado del Ejercicio"
-                
-                cuentas_ingreso = Cuenta.objects.filter(tipo='INGRESO')
-                cuentas_egreso = Cuenta.objects.filter(tipo='EGRESO')
-                
-                asiento_refundicion = Asiento.objects.create(
-                    fecha=fecha_cierre,
-                    descripcion="Refundición de Cuentas de Resultado",
-                    tipo='REFUNDICION'
-                )
+            # Con ventas sin asentar los saldos de resultado están incompletos
+            if any(avisar_pendientes(request, asentar_pendientes())):
+                messages.warning(request, "El cierre se genera cuando se registren los asientos pendientes.")
+                return redirect('libro_diario')
 
-                total_ingresos = 0
-                total_egresos = 0
-
-                # Debitamos los ingresos para dejarlos en 0
-                for c in cuentas_ingreso:
-                    saldo = ItemAsiento.objects.filter(cuenta=c).aggregate(
-                        d=Sum('debe'), h=Sum('haber')
-                    )
-                    saldo_neto = (saldo['h'] or 0) - (saldo['d'] or 0) # Saldo acreedor
-                    if saldo_neto > 0:
-                        ItemAsiento.objects.create(asiento=asiento_refundicion, cuenta=c, debe=saldo_neto, haber=0)
-                        total_ingresos += saldo_neto
-
-                # Acreditamos los egresos para dejarlos en 0
-                for c in cuentas_egreso:
-                    saldo = ItemAsiento.objects.filter(cuenta=c).aggregate(
-                        d=Sum('debe'), h=Sum('haber')
-                    )
-                    saldo_neto = (saldo['d'] or 0) - (saldo['h'] or 0) # Saldo deudor
-                    if saldo_neto > 0:
-                        ItemAsiento.objects.create(asiento=asiento_refundicion, cuenta=c, debe=0, haber=saldo_neto)
-                        total_egresos += saldo_neto
-
-                # La diferencia va a Resultado del Ejercicio
-                resultado = total_ingresos - total_egresos
-                cuenta_resultado = Cuenta.objects.get(nombre='Resultado del Ejercicio')
-                
-                if resultado > 0: # Ganancia (Acreditar PN)
-                    ItemAsiento.objects.create(asiento=asiento_refundicion, cuenta=cuenta_resultado, debe=0, haber=resultado)
-                else: # Pérdida (Debitar PN)
-                    ItemAsiento.objects.create(asiento=asiento_refundicion, cuenta=cuenta_resultado, debe=abs(resultado), haber=0)
+            # Refundición y traslado armados en memoria: saldos de una consulta agrupada
+            asientos = armar_cierre_ejercicio()
 
+            if not asientos:
+                messages.info(request, "No hay saldos en cuentas de resultado: no hay nada que cerrar.")
+                return redirect('libro_diario')
 
-                # --- PASO 2: PASAJE A RESULTADOS ACUMULADOS ---
-                # Movemos el Resultado del Ejercicio a Resultados Acumulados para iniciar el nuevo periodo limpio
-                
-                asiento_traslado = Asiento.objects.create(
-                    fecha=fecha_cierre,
-                    descripcion="Traslado a Resultados Acumulados",
-                    tipo='NORMAL'
-                )
-                
-                cuenta_acumulados = Cuenta.objects.get(nombre='Resultados Acumulados')
-                
-                if resultado > 0:
-                    # Debito el ejercicio (para cancelarlo) y Acredito Acumulados
-                    ItemAsiento.objects.create(asiento=asiento_traslado, cuenta=cuenta_resultado, debe=resultado, haber=0)
-                    ItemAsiento.objects.create(asiento=asiento_traslado, cuenta=cuenta_acumulados, debe=0, haber=resultado)
-                else:
-                    # Inverso
-                    ItemAsiento.objects.create(asiento=asiento_traslado, cuenta=cuenta_resultado, debe=0, haber=abs(resultado))
-                    ItemAsiento.objects.create(asiento=asiento_traslado, cuenta=cuenta_acumulados, debe=abs(resultado), haber=0)
-
-                messages.success(request, '¡Cierre de ejercicio y refundición generados correctamente!')
+            with transaction.atomic():
+                registrar_asientos(asientos)
+
+            messages.success(request, '¡Cierre de ejercicio y refundición generados correctamente!')
         
         except Exception as e:
             messages.error(request, f"Error en el cierre: {str(e)}")
             
     return redirect('libro_diario')
 
+def _rango_fechas(request):
+    # ?fecha_inicio=&fecha_fin= ; por defecto el mes en curso
+    hoy = timezone.localdate()
+    fecha_inicio = fecha_param(request, 'fecha_inicio') or hoy.replace(day=1)
+    fecha_fin = fecha_param(request, 'fecha_fin') or hoy
+    return fecha_inicio, fecha_fin
+
+@login_required
+def balance_sumas_saldos(request):
+    avisar_pendientes(request)
+    fecha_inicio, fecha_fin = _rango_fechas(request)
+    filas, totales = balance_sumas_y_saldos(fecha_inicio, fecha_fin)
+    return render(request, 'accounting/balance.html', {
+        'filas': filas,
+        'totales': totales,
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': fecha_fin.isoformat(),
+    })
+
+@login_required
+def libro_mayor(request, pk):
+    avisar_pendientes(request)
+    cuenta = get_object_or_404(Cuenta, pk=pk)
+    fecha_inicio, fecha_fin = _rango_fechas(request)
+    saldo_anterior, movimientos = movimientos_mayor(cuenta, fecha_inicio, fecha_fin)
+    return render(request, 'accounting/mayor.html', {
+        'cuenta': cuenta,
+        'cuentas': plan_cuentas.todas(),
+        'saldo_anterior': saldo_anterior,
+        'movimientos': movimientos,
+        'saldo_final': movimientos[-1]['saldo'] if movimientos else saldo_anterior,
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': fecha_fin.isoformat(),
+    })
+
+# --- EXPORTACIONES CSV (se generan mientras se descargan) ---
+
+@login_required
+def exportar_asientos(request):
+    fecha_inicio, fecha_fin = _rango_fechas(request)
+    return respuesta_csv(
+        f"asientos_{fecha_inicio}_{fecha_fin}.csv",
+        ['Fecha', 'Asiento', 'Tipo', 'Descripción', 'Código', 'Cuenta', 'Debe', 'Haber'],
+        filas_asientos(fecha_inicio, fecha_fin),
+    )
+
+@login_required
+def exportar_ventas(request):
+    fecha_inicio, fecha_fin = _rango_fechas(request)
+    return respuesta_csv(
+        f"ventas_{fecha_inicio}_{fecha_fin}.csv",
+        ['Fecha', 'Venta', 'Cliente', 'Código', 'Producto', 'Cantidad', 'Precio Unitario', 'Descuento %',
+         'Subtotal', 'Total Venta', 'Efectivo', 'Mercado Pago', 'Transferencia'],
+        filas_ventas(fecha_inicio, fecha_fin),
+    )
+
+@login_required
+def exportar_compras(request):
+    fecha_inicio, fecha_fin = _rango_fechas(request)
+    return respuesta_csv(
+        f"compras_{fecha_inicio}_{fecha_fin}.csv",
+        ['Fecha', 'Compra', 'Proveedor', 'CUIT', 'Comprobante', 'Código', 'Producto', 'Cantidad',
+         'Costo Unitario', 'Subtotal', 'Total Compra'],
+        filas_compras(fecha_inicio, fecha_fin),
+    )
+
 # --- PROVEEDORES ---
 
 @login_required
@@ -667,11 +832,12 @@ def nueva_compra(request):
                         producto = detalle.producto
                         
                         # 2. ACTUALIZAR STOCK Y COSTO
-                        # Aumentamos el stock
-                        producto.stock_actual += detalle.cantidad
+                        # Aumentamos el stock con un UPDATE relativo: un save() de la fila entera
+                        # pisaría los descuentos que las ventas hacen a la vez (ver stock.py)
+                        Producto.objects.filter(pk=producto.pk).update(stock_actual=F('stock_actual') + detalle.cantidad)
                         # Actualizamos el precio de costo al nuevo valor de compra
                         producto.precio_costo = detalle.precio_costo
-                        producto.save()
+                        producto.save(update_fields=['precio_costo'])
 
                         # Guardar detalle
                         detalle.compra = compra
@@ -685,29 +851,15 @@ def nueva_compra(request):
                     compra.save()
 
                     # 3. ASIENTO CONTABLE (Mercaderías a Proveedores)
-                    asiento = Asiento.objects.create(
-                        fecha=date.today(),
-                        descripcion=f"Compra #{compra.id} - {compra.proveedor.razon_social}",
-                        tipo='NORMAL'
-                    )
-
-                    # DEBE: Mercaderías (Activo aumenta)
-                    cuenta_mercaderias = Cuenta.objects.get(codigo='1.02')
-                    ItemAsiento.objects.create(
-                        asiento=asiento,
-                        cuenta=cuenta_mercaderias,
-                        debe=total_compra,
-                        haber=0
-                    )
-
-                    # HABER: Proveedores (Pasivo aumenta/Deuda)
-                    cuenta_proveedores = Cuenta.objects.get(codigo='2.01')
-                    ItemAsiento.objects.create(
-                        asiento=asiento,
-                        cuenta=cuenta_proveedores,
-                        debe=0,
-                        haber=total_compra
-                    )
+                    registrar_asientos([armar_asiento(
+                        f"Compra #{compra.id} - {compra.proveedor.razon_social}",
+                        [
+                            # DEBE: Mercaderías (Activo aumenta)
+                            (plan_cuentas.por_codigo('1.02'), total_compra, 0),
+                            # HABER: Proveedores (Pasivo aumenta/Deuda)
+                            (plan_cuentas.por_codigo('2.01'), 0, total_compra),
+                        ],
+                    )])
 
                     messages.success(request, f'Compra registrada. Stock actualizado. Total: ${total_compra}')
                     return redirect('dashboard') # O a una lista de compras si prefieres